@@ -1,9 +1,18 @@
 import configparser
 import ast
 import sys
-import pkg_resources
+from os import path
+from importlib import resources
 
-INI_CONFIG_PATH = pkg_resources.resource_filename('bfal', '/configs/config.ini')
+def resource_path(*parts) -> str:
+    # path of a file shipped within the bfal package
+    resource = resources.files('bfal')
+    for part in parts:
+        resource = resource / part
+    return str(resource)
+
+INI_CONFIG_PATH = resource_path('configs', 'config.ini')
+POSE_MODEL_PATH = resource_path('configs', 'models', 'yolov8-pose.pt')
 
 config = configparser.ConfigParser()
 
@@ -11,19 +20,66 @@ config = configparser.ConfigParser()
 __config_data = {}
 # map key to sections of config ini
 __config_section_map = {}
+# values as last read from the ini file, to know which keys changed on reload
+__file_data = {}
+__file_mtime = None
 
 def __load_config_data():
+    global __file_mtime
     ret = config.read(INI_CONFIG_PATH)
     if not ret:
         sys.exit(f'Error reading config file from {INI_CONFIG_PATH}.') 
+    __file_mtime = path.getmtime(INI_CONFIG_PATH)
     for section in config.sections():
         for key in config[section].keys():
             __config_section_map[key] = section
             __config_data[key] = ast.literal_eval(config[__config_section_map[key]][key])
+    __file_data.update(__config_data)
+
+def changed_on_disk() -> bool:
+    return path.exists(INI_CONFIG_PATH) and path.getmtime(INI_CONFIG_PATH) != __file_mtime
+
+def reload() -> dict:
+    """
+        reads the ini file again, returns the {key: value} that changed within the file.
+        runtime overrides are kept unless the file value of that key changed.
+    """
+    global __file_mtime
+    file_config = configparser.ConfigParser()
+    mtime = path.getmtime(INI_CONFIG_PATH)
+    file_config.read(INI_CONFIG_PATH)
+
+    # every value is parsed before anything is applied, a malformed file changes nothing
+    changes = {}
+    sections = {}
+    for section in file_config.sections():
+        for key in file_config[section].keys():
+            value = ast.literal_eval(file_config[section][key])
+            if key in __file_data and __file_data[key] == value:
+                continue
+            changes[key] = value
+            sections[key] = section
+
+    __file_mtime = mtime
+    for (key, section) in sections.items():
+        __config_section_map[key] = section
+        # keep the parser in sync so a later save doesn't write back the old value
+        if not config.has_section(section):
+            config.add_section(section)
+        config[section][key] = file_config[section][key]
+
+    __file_data.update(changes)
+    __config_data.update(changes)
+
+    return changes
 
 def get(key: str):
     return __config_data[key]
 
+def snapshot() -> dict:
+    # copy of the current config values (with runtime overrides) to be given to a pipeline
+    return dict(__config_data)
+
 def set(key: str, value, override=False):
     __config_data[key] = value # runtime override
     if override: # directly put value on config this will override the ini file when saved
@@ -34,7 +90,6 @@ def save():
     with open(INI_CONFIG_PATH, 'w') as ini_file:
         config.write(ini_file)
 
-print(f'Reading config file from {INI_CONFIG_PATH}')
 __load_config_data()
 
 # CONFIG KEYS
@@ -42,13 +97,24 @@ __load_config_data()
 CAM_WIDTH = 'width'
 CAM_HEIGHT = 'height'
 CAM_TARGET = 'target'
+CAM_SOURCE = 'source'
+CAM_HEADLESS = 'headless'
+CAM_CAMERAS = 'cameras'
+CAM_RING_SLOTS = 'ring_slots'
 # REFERENCE
 CNFD_CALIB_TOL = 'calibration_tolerance'
+CNFD_CALIB_CI = 'calibration_ci'
+CNFD_CALIB_MIN_SAMPLES = 'calibration_min_samples'
+CNFD_CALIB_BLOCK = 'calibration_block'
 CNFD_USE_LIVE_REF = 'use_live_ref'
 CNFD_UNIT = 'distance_unit'
 CNFD_VALUE = 'distance_value'
 CNFD_DIST_PIXEL = 'distance_pixel'
 CNFD_LINE_Y_AXIS = 'aruco_line_y_axis'
+CNFD_ROI_MARGIN = 'aruco_roi_margin'
+CNFD_LIVE_REF_INTERVAL = 'live_ref_interval'
+CNFD_LIVE_REF_TIMEOUT = 'live_ref_timeout'
+CNFD_LIVE_REF_DRIFT = 'live_ref_drift'
 # THRESHOLDS
 TH_BODY_VISIBILITY = 'body_visibility'
 TH_FACE_VISIBILITY = 'face_visibility'
@@ -61,9 +127,47 @@ TH_ARUCO_LINE = 'aruco_line'
 TH_ARUCO_BODY_LINE = 'aruco_body_line'
 TH_SERIAL_CONSISTENCY_REQ = 'serial_consistency_req'
 TH_SERIAL_WINDOW = 'serial_window'
+TH_FACE_MIN_SIZE = 'face_min_size'
+TH_FACE_MIN_SHARPNESS = 'face_min_sharpness'
+TH_FACE_MAX_YAW = 'face_max_yaw'
 # PATHS
 PATH_FACES = 'known_faces'
 PATH_BUILTS = 'builts_json'
+PATH_RESULTS_LOG = 'results_log'
+PATH_REPLAY_LOG = 'replay_log'
 # SERIAL CONNECTION
 SERIAL_PORT = 'port'
-SERIAL_BAUDRATE = 'baudrate'
\ No newline at end of file
+SERIAL_BAUDRATE = 'baudrate'
+# RUNTIME
+RT_DEVICE = 'device'
+RT_FACE_WORKERS = 'face_workers'
+RT_RELOAD_INTERVAL = 'reload_interval'
+RT_LOG_CHUNK_RECORDS = 'log_chunk_records'
+RT_PIPELINE_DEPTH = 'pipeline_depth'
+# INFERENCE
+INF_POSE_SCALE = 'pose_scale'
+INF_FACE_SCALE = 'face_scale'
+INF_FACE_QUALITY = 'face_quality'
+INF_CASCADE = 'cascade'
+INF_POSE_BACKEND = 'pose_backend'
+INF_POSE_ONNX = 'pose_onnx'
+INF_POSE_INT8 = 'pose_int8'
+INF_FACE_BACKEND = 'face_backend'
+INF_FACE_ONNX = 'face_onnx'
+INF_FACE_ONNX_TOLERANCE = 'face_onnx_tolerance'
+INF_IDLE_GATE = 'idle_gate'
+INF_MOTION_REGION = 'motion_region'
+INF_MOTION_THRESHOLD = 'motion_threshold'
+INF_MOTION_MIN_AREA = 'motion_min_area'
+INF_MOTION_WAKE_FRAMES = 'motion_wake_frames'
+INF_MOTION_IDLE_FRAMES = 'motion_idle_frames'
+INF_POSE_HALF = 'pose_half'
+INF_WARMUP_FRAMES = 'warmup_frames'
+# METRICS
+MT_WINDOW = 'metrics_window'
+MT_LOG_INTERVAL = 'metrics_log_interval'
+MT_PORT = 'metrics_port'
+MT_HOST = 'metrics_host'
+MT_MEMORY_INTERVAL = 'memory_interval'
+MT_MEMORY_TOP = 'memory_top'
+MT_MEMORY_TRACE = 'memory_trace'
\ No newline at end of file
@@ -0,0 +1,29 @@
+import importlib
+import types
+
+class LazyModule(types.ModuleType):
+    """
+        Module placeholder that imports the real module on first attribute access.
+
+        Once loaded the real module attributes are copied in so later accesses are
+        plain attribute lookups without any extra cost.
+    """
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+
+    def __load__(self):
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self.__load__(), attr)
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """
+        returns a module that is only imported when used, for heavy dependencies
+        (torch, ultralytics, face_recognition...) that some commands never need.
+    """
+    return LazyModule(name)
@@ -0,0 +1,311 @@
+import cv2 as cv
+import numpy as np
+import torch
+import click
+import json
+import platform
+import time
+from datetime import datetime
+from importlib import metadata
+
+from bfal.scripts.core import (
+    load_pose_model,
+    load_face_embedder,
+    FaceRecognition,
+    ArucoRef,
+    arucoDict,
+    ARUCO_REFS_ID,
+)
+
+from bfal.scripts.detect import downscale
+
+from bfal.specs import (
+    FaceSpec,
+    BodySpec,
+    BuiltSpec,
+)
+
+from bfal.utils import (
+    FileVideoCapture,
+    crop_9_16,
+    FrameBuffers,
+    synthetic_person,
+    Draw,
+    Metrics,
+)
+
+import bfal.config as cf
+from bfal.thresholds import Thresholds
+
+"""
+    Replays a recorded clip (or synthetic frames) through every stage of the detect pipeline
+    and times each stage separately.
+
+    When the clip has no person in it (or on synthetic frames) a synthetic standing person is
+    used for the posture checks, built estimation and drawing stages so they are still measured.
+"""
+
+BENCH_STAGES = (
+    'capture',
+    'color_conversion',
+    'pose_resize',
+    'face_resize',
+    'pose_inference',
+    'face_detection',
+    'face_encoding',
+    'face_landmarks',
+    'gallery_matching',
+    'aruco_reference',
+    'posture_checks',
+    'built_estimation',
+    'drawing',
+)
+
+SYNTHETIC_GALLERY_SIZE = 128
+FACE_ENCODING_SIZE = 128
+ARUCO_MARKER_SIZE = 64
+ARUCO_MARKER_BORDER = 16
+
+
+class SyntheticCapture:
+    """
+        Generates frames with the two aruco refs on a noisy background, used when no recorded clip is given.
+    """
+
+    def __init__(self, width: int, height: int, frames: int, seed=0) -> None:
+        self.frames = frames
+        self.__index__ = 0
+
+        rng = np.random.default_rng(seed)
+        frame = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+        frame = cv.GaussianBlur(frame, ksize=(0, 0), sigmaX=3)
+
+        # put the refs on both sides of the frame center, within the 9:16 crop
+        line_y = min(cf.get(cf.CNFD_LINE_Y_AXIS), height - ARUCO_MARKER_SIZE)
+        quiet_size = ARUCO_MARKER_SIZE + ARUCO_MARKER_BORDER * 2
+        for (id, x_offset) in zip(ARUCO_REFS_ID, (-1, 1)):
+            marker = cv.aruco.generateImageMarker(arucoDict, id, ARUCO_MARKER_SIZE)
+            marker = cv.copyMakeBorder(marker, *(ARUCO_MARKER_BORDER,) * 4, cv.BORDER_CONSTANT, value=255)
+            x = width // 2 + x_offset * (height // 6) - quiet_size // 2
+            y = line_y - quiet_size // 2
+            frame[y:y + quiet_size, x:x + quiet_size] = cv.cvtColor(marker, cv.COLOR_GRAY2BGR)
+
+        self.__frame__ = frame
+
+    def read(self):
+        if self.__index__ >= self.frames:
+            return (False, None)
+
+        self.__index__ += 1
+
+        # a new frame buffer each read like a real capture
+        return (True, self.__frame__.copy())
+
+    def begin(self) -> None:
+        pass
+
+    def release(self) -> None:
+        pass
+
+
+class StageClock(Metrics):
+    """
+        Metrics registry that also times plain calls, sized to keep every timed frame.
+    """
+
+    def time(self, stage: str, fn, *args, **kwargs):
+        with self.stage(stage):
+            return fn(*args, **kwargs)
+
+    def summary(self, stage: str) -> dict:
+        latency = self.stages.get(stage)
+        return latency.summary() if latency else {'count': 0}
+
+
+def __bfal_version__() -> str:
+    try:
+        return metadata.version('bfal')
+    except metadata.PackageNotFoundError:
+        return 'unknown'
+
+def __echo_results__(results: dict, baseline=None) -> None:
+    click.echo(f'Pose backend: {results["pose_backend"]}' + (f' (baseline: {baseline.get("pose_backend", "torch")})' if baseline else ''))
+    click.echo('-'*64)
+    click.echo(f'{"stage":<20}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"per sec":>12}')
+
+    rows = dict(results['stages'])
+    rows['frame'] = results['frame']
+
+    for (stage, stats) in rows.items():
+        if not stats['count']:
+            click.echo(f'{stage:<20}{"-":>10}{"-":>10}{"-":>10}{"-":>12}')
+            continue
+
+        line = f'{stage:<20}{stats["p50_ms"]:>10.2f}{stats["p95_ms"]:>10.2f}{stats["p99_ms"]:>10.2f}{stats["throughput"]:>12.1f}'
+
+        if baseline:
+            base_stats = baseline['frame'] if stage == 'frame' else baseline['stages'].get(stage)
+            if base_stats and base_stats.get('count'):
+                delta = (stats['p50_ms'] - base_stats['p50_ms']) / base_stats['p50_ms'] * 100
+                line += f'  ({delta:+.1f}% p50)'
+
+        click.echo(line)
+
+    click.echo('-'*64)
+    click.echo(f'Throughput: {results["throughput_fps"]:.2f} FPS over {results["frames"]} frames')
+    click.echo(f'Face encoding ({results["face_backend"]}): {results["face_encoding_fps"]:.1f} faces/s over {results["faces_encoded"]} faces')
+
+
+def run(frames: int, warmup: int, device: str, face_model: str, face_workers=0, pose_backend='torch', pose_int8=False, pose_half=False, face_backend='dlib', output=None, baseline=None) -> dict:
+    source = cf.get(cf.CAM_SOURCE)
+    width, height = cf.get(cf.CAM_WIDTH), cf.get(cf.CAM_HEIGHT)
+    line_y = cf.get(cf.CNFD_LINE_Y_AXIS)
+    pose_scale, face_scale = cf.get(cf.INF_POSE_SCALE), cf.get(cf.INF_FACE_SCALE)
+
+    cf.set(cf.RT_DEVICE, device)
+    cf.set(cf.INF_POSE_BACKEND, pose_backend)
+    cf.set(cf.INF_POSE_INT8, pose_int8)
+    cf.set(cf.INF_POSE_HALF, pose_half)
+    cf.set(cf.INF_FACE_BACKEND, face_backend)
+    torch.set_default_device(device)
+
+    pose_yolo = load_pose_model(cf.snapshot())
+    embedder = load_face_embedder(cf.snapshot())
+    face_recg = FaceRecognition(cf.get(cf.PATH_FACES), model=face_model, workers=face_workers, embedder=embedder, pool_slots=cf.get(cf.CAM_RING_SLOTS), device=device)
+    arc_ref = ArucoRef(line_y_axis=line_y)
+
+    if not face_recg.known_faces_encodings:
+        # random gallery so matching cost is still measured
+        rng = np.random.default_rng(0)
+        face_recg.gallery = (
+            list(rng.normal(0, 0.1, size=(SYNTHETIC_GALLERY_SIZE, embedder.size or FACE_ENCODING_SIZE))),
+            [f'synthetic-{i}' for i in range(SYNTHETIC_GALLERY_SIZE)],
+            embedder.name,
+        )
+
+    cap = FileVideoCapture(source) if source else SyntheticCapture(width, height, frames + warmup)
+    clock = StageClock(window=max(frames, 1))
+    buffers = FrameBuffers()
+    thresholds = Thresholds.from_config(cf.snapshot())
+
+    click.echo(f'Benchmarking {source or "synthetic frames"} on {device}, {warmup} warm-up and {frames} timed frames...')
+
+    # faces encoded by the warm-up frames are not counted
+    encoded_faces, encode_ns = embedder.faces, embedder.encode_ns
+
+    cap.begin()
+    for i in range(frames + warmup):
+        clock.enabled = i >= warmup
+        if i == warmup:
+            encoded_faces, encode_ns = embedder.faces, embedder.encode_ns
+        frame_start = time.perf_counter_ns()
+
+        ret, frame = clock.time('capture', cap.read)
+        if not ret:
+            break
+
+        buffers.next_frame()
+        frame = crop_9_16(frame)
+        rgb_frame = clock.time('color_conversion', buffers.cvt_color, 'rgb', frame, cv.COLOR_BGR2RGB)
+
+        scalers = {}
+        pose_frame, pose_scaler = clock.time('pose_resize', downscale, rgb_frame, pose_scale, scalers, buffers)
+        # the face frame is the pose one when both scales are the same
+        face_frame, face_scaler = clock.time('face_resize', downscale, rgb_frame, face_scale, scalers, buffers)
+
+        clock.time('pose_inference', pose_yolo.detect, pose_frame)
+        pose_results = pose_yolo.get_result()
+
+        face_locations = clock.time('face_detection', face_recg.locate, face_frame)
+        if face_recg.pool:
+            # workers compute both at once, timed as the encoding stage
+            face_encodings, faces_landmarks = clock.time('face_encoding', face_recg.__process_faces__, face_frame, face_locations)
+        else:
+            # landmarks first, the onnx backend aligns the faces on them
+            faces_landmarks = clock.time('face_landmarks', face_recg.__process_landmarks__, face_frame, face_locations)
+            face_encodings = clock.time('face_encoding', face_recg.__process_encodings__, face_frame, face_locations, faces_landmarks)
+        matches = clock.time('gallery_matching', lambda: [face_recg.match(encoding) for encoding in face_encodings])
+
+        clock.time('aruco_reference', arc_ref.ref_valid, frame, False)
+
+        # fallback to a synthetic person so the per person stages are still measured
+        bodies = []
+        if pose_results and len(pose_results[0]):
+            keypoints_data, boxes_data = pose_results[0].keypoints.data, pose_results[0].boxes.data
+            if pose_scaler is not None:
+                keypoints_data, boxes_data = pose_scaler.transform_points(keypoints_data), pose_scaler.transform_box(boxes_data)
+            bodies = list(zip(keypoints_data, boxes_data))
+
+        if face_scaler is not None:
+            face_locations = [face_scaler.transform_location(location) for location in face_locations]
+            faces_landmarks = [face_scaler.transform_landmarks(land_marks) for land_marks in faces_landmarks]
+
+        faces_spec = [
+            FaceSpec(location=location, land_marks=land_marks, is_known=is_known, label=label, distance_value=distance, device=device)
+            for ((is_known, label, distance), land_marks, location) in zip(matches, faces_landmarks, face_locations)
+        ]
+
+        if not bodies or not faces_spec:
+            keypoints, box, location, land_marks = synthetic_person(frame.shape, line_y)
+            bodies = bodies or [(keypoints, box)]
+            faces_spec = faces_spec or [FaceSpec(location=location, land_marks=land_marks, is_known=False, label='synthetic', distance_value=1.0, device=device)]
+
+        bodies_spec = [BodySpec(image=frame, imageLog=frame, keypoints=keypoints, box=box, thresholds=thresholds) for (keypoints, box) in bodies]
+        clock.time('posture_checks', lambda: [(bspec.body_is_firm(), bspec.head_is_firm()) for bspec in bodies_spec])
+
+        builts_spec = [BuiltSpec(bodySpec=bspec, faceSpec=faces_spec[0]) for bspec in bodies_spec]
+        clock.time('built_estimation', lambda: [blt_spec.getBuilt() for blt_spec in builts_spec])
+
+        def draw():
+            for fspec in faces_spec:
+                fspec.drawIn(frame)
+            for blt_spec in builts_spec:
+                blt_spec.drawIn(frame)
+            ArucoRef.__draw_ref_lines__(frame, line_y)
+            Draw.crosshairs(frame, color=Draw.ORANGE)
+
+        clock.time('drawing', draw)
+
+        if clock.enabled:
+            clock.record('frame', time.perf_counter_ns() - frame_start)
+
+    cap.release()
+    face_recg.release()
+
+    frame_stats = clock.summary('frame')
+    encoded_faces, encode_ns = embedder.faces - encoded_faces, embedder.encode_ns - encode_ns
+    results = {
+        'bfal_version': __bfal_version__(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'device': device,
+        'face_model': face_model,
+        'face_workers': face_workers,
+        'pose_backend': pose_backend + ('-int8' if pose_backend == 'onnx' and pose_int8 else '') + ('-half' if pose_backend == 'torch' and pose_half else ''),
+        'face_backend': face_backend,
+        'faces_encoded': encoded_faces,
+        'face_encoding_fps': encoded_faces * 1e9 / encode_ns if encode_ns else 0.0,
+        'source': source or 'synthetic',
+        'resolution': [width, height],
+        'pose_scale': pose_scale,
+        'face_scale': face_scale,
+        'frames': frame_stats['count'],
+        'throughput_fps': frame_stats.get('throughput') or 0.0,
+        'frame': frame_stats,
+        'buffer_bytes_per_frame': buffers.bytes_per_frame(),
+        'stages': {stage: clock.summary(stage) for stage in BENCH_STAGES},
+    }
+
+    baseline_results = None
+    if baseline:
+        with open(baseline, 'r') as baseline_file:
+            baseline_results = json.load(baseline_file)
+
+    __echo_results__(results, baseline_results)
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+        click.echo(f'Results saved to {output}')
+
+    return results
@@ -4,15 +4,19 @@ import bfal.config as cf
 @click.group()
 @click.option('--cam', '-c', type=int, default=cf.get(cf.CAM_TARGET), show_default=True, help='Target camera.')
 @click.option('--res', '-r', type=click.Tuple((int, int)), default=(cf.get(cf.CAM_WIDTH), cf.get(cf.CAM_HEIGHT)), show_default=True, help='Camera Resolution')
+@click.option('--source', '-s', type=str, default=cf.get(cf.CAM_SOURCE), help='Recorded video file or image sequence (directory, glob or printf pattern) to read instead of the camera.')
+@click.option('--headless/--display', '-hl', default=cf.get(cf.CAM_HEADLESS), show_default=True, help='Process frames as fast as possible without display.')
 @click.option('--override', '-o', is_flag=True, help='Save all overriden properties to config file.')
 # @click.option('--crop', '-c', is_flag=True, default=(cf.get(cf.CAM_WIDTH), cf.get(cf.CAM_HEIGHT)), show_default=True, help='Camera Resolution')
-def main(cam, res, override):
+def main(cam, res, source, headless, override):
     """
         Built and Face recognition
     """
     cf.set(cf.CAM_TARGET, cam, override=override)
     cf.set(cf.CAM_WIDTH, res[0], override=override)
     cf.set(cf.CAM_HEIGHT, res[1], override=override)
+    cf.set(cf.CAM_SOURCE, source, override=override)
+    cf.set(cf.CAM_HEADLESS, headless, override=override)
     global save_config
     save_config = override
 
@@ -24,7 +28,9 @@ def main(cam, res, override):
 @click.option('--tol', '-t', type=int, default=cf.get(cf.CNFD_CALIB_TOL), show_default=True, help='Required number of steady value.')
 @click.option('--dist', '-d', type=float, default=cf.get(cf.CNFD_VALUE), show_default=True, help='Value of real distance.')
 @click.option('--unit', '-u', type=str, default=cf.get(cf.CNFD_UNIT), show_default=True, help='Unit of measurement used for real distance.')
-def calibrate(tol, dist, unit):
+@click.option('--ci', type=float, default=cf.get(cf.CNFD_CALIB_CI), show_default=True, help='Maximum 95% confidence interval (pixels) of the mean distance to finish calibration.')
+@click.option('--min-samples', '-ms', type=int, default=cf.get(cf.CNFD_CALIB_MIN_SAMPLES), show_default=True, help='Minimum number of blocks of calibration_block valid frames before the confidence interval is considered.')
+def calibrate(tol, dist, unit, ci, min_samples):
     """
         Calibrate distance reference using two aruco card.
     """
@@ -33,11 +39,15 @@ def calibrate(tol, dist, unit):
     cf.set(cf.CNFD_CALIB_TOL, tol, override=save_config)
     cf.set(cf.CNFD_VALUE, dist, override=save_config)
     cf.set(cf.CNFD_UNIT, unit, override=save_config)
+    cf.set(cf.CNFD_CALIB_CI, ci, override=save_config)
+    cf.set(cf.CNFD_CALIB_MIN_SAMPLES, min_samples, override=save_config)
 
     if save_config:
         cf.save()
 
-    from bfal.scripts import calibrate
+    from bfal.scripts import calibrate as calibrate_script
+
+    calibrate_script.run(cf.snapshot())
 
 
 @main.command()
@@ -58,6 +68,25 @@ def calibrate(tol, dist, unit):
 @click.option('--aruco-body-line', '-abl', type=int, default=cf.get(cf.TH_ARUCO_BODY_LINE), show_default=True, help="Threshold for the maximum allowed distance between the bottom body point and the Aruco line reference")
 @click.option('--serial-consistency', '-sc', type=int, default=cf.get(cf.TH_SERIAL_CONSISTENCY_REQ), show_default=True, help="Number of constant messages required before sending a serial message")
 @click.option('--serial-window', '-sw', type=int, default=cf.get(cf.TH_SERIAL_WINDOW), show_default=True, help="Maximum time duration for a message to be considered valid as part of the constant message")
+@click.option('--multi-cam', '-mc', type=str, multiple=True, default=cf.get(cf.CAM_CAMERAS), help="Camera target or recorded source, repeat to detect on several cameras sharing the loaded models.")
+@click.option('--face-workers', '-fw', type=int, default=cf.get(cf.RT_FACE_WORKERS), show_default=True, help="Number of processes computing face encodings and landmarks, 0 to compute them within the detection process.")
+@click.option('--pose-scale', '-ps', type=click.FloatRange(0, 1, min_open=True), default=cf.get(cf.INF_POSE_SCALE), show_default=True, help="Scale of the frame given to the pose model.")
+@click.option('--face-scale', '-fs', type=click.FloatRange(0, 1, min_open=True), default=cf.get(cf.INF_FACE_SCALE), show_default=True, help="Scale of the frame given to the face detection and encoding.")
+@click.option('--reload-interval', '-ri', type=float, default=cf.get(cf.RT_RELOAD_INTERVAL), show_default=True, help="Seconds between checks of the known faces directory, builts file and config file for changes, 0 to never reload.")
+@click.option('--face-quality/--no-face-quality', '-fq', default=cf.get(cf.INF_FACE_QUALITY), show_default=True, help="Skip encoding of small, blurred or side on faces.")
+@click.option('--face-min-size', '-fms', type=int, default=cf.get(cf.TH_FACE_MIN_SIZE), show_default=True, help="Minimum pixels of the smallest side of a face to be encoded.")
+@click.option('--face-min-sharpness', '-fsh', type=float, default=cf.get(cf.TH_FACE_MIN_SHARPNESS), show_default=True, help="Minimum variance of the laplacian of a face to be encoded, 0 to not check.")
+@click.option('--face-max-yaw', '-fy', type=float, default=cf.get(cf.TH_FACE_MAX_YAW), show_default=True, help="Maximum offset of the nose from the mid eye point as a ratio of the eyes distance, 0 to not check.")
+@click.option('--cascade/--parallel', '-cs', default=cf.get(cf.INF_CASCADE), show_default=True, help="Run the pose and posture checks first and search faces only on the heads of valid bodies, instead of running face and pose in parallel.")
+@click.option('--pose-backend', '-pb', type=click.Choice(['torch', 'onnx']), default=cf.get(cf.INF_POSE_BACKEND), show_default=True, help="Runtime of the pose model, onnx runs it on cpu through ONNX Runtime (OpenVINO when installed).")
+@click.option('--pose-int8/--no-pose-int8', '-pi8', default=cf.get(cf.INF_POSE_INT8), show_default=True, help="Quantize the weights of the onnx pose model to int8.")
+@click.option('--pose-half/--no-pose-half', '-ph', default=cf.get(cf.INF_POSE_HALF), show_default=True, help="Run the torch pose model in half precision (fp16), cuda only.")
+@click.option('--face-backend', '-fb', type=click.Choice(['dlib', 'onnx']), default=cf.get(cf.INF_FACE_BACKEND), show_default=True, help="Face encoding backend, onnx encodes aligned faces in batches with the face_onnx model.")
+@click.option('--idle-gate/--no-idle-gate', '-ig', default=cf.get(cf.INF_IDLE_GATE), show_default=True, help="Skip the detection while there is no motion within the motion_region.")
+@click.option('--results-log', '-rl', type=click.Path(dir_okay=True, file_okay=False), default=cf.get(cf.PATH_RESULTS_LOG), help="Directory where the results of each frame are saved as .npz chunks.")
+@click.option('--record-replay', '-rr', type=click.Path(dir_okay=True, file_okay=False), default=cf.get(cf.PATH_REPLAY_LOG), help="Directory where the bodies, faces and reference of each frame are recorded for `bfal tune`.")
+@click.option('--pipeline-depth', '-pd', type=click.IntRange(min=0), default=cf.get(cf.RT_PIPELINE_DEPTH), show_default=True, help="Frames inferred ahead while a frame is post processed, 0 to process each frame at once.")
+@click.option('--warmup-frames', '-wu', type=click.IntRange(min=0), default=cf.get(cf.INF_WARMUP_FRAMES), show_default=True, help="Dummy frames pushed through every stage on start, 0 to load the models on the first frame.")
 def detect(port, baudrate, live_aref, faces_path, builts_path,
         # thresholds
         face_visibility,
@@ -71,6 +100,25 @@ def detect(port, baudrate, live_aref, faces_path, builts_path,
         aruco_body_line,
         serial_consistency,
         serial_window,
+        multi_cam,
+        face_workers,
+        pose_scale,
+        face_scale,
+        reload_interval,
+        face_quality,
+        face_min_size,
+        face_min_sharpness,
+        face_max_yaw,
+        cascade,
+        pose_backend,
+        pose_int8,
+        pose_half,
+        face_backend,
+        idle_gate,
+        results_log,
+        record_replay,
+        pipeline_depth,
+        warmup_frames,
     ):
     """
         Test built and face recognition.
@@ -94,8 +142,129 @@ def detect(port, baudrate, live_aref, faces_path, builts_path,
     cf.set(cf.TH_ARUCO_BODY_LINE, aruco_body_line, override=save_config)
     cf.set(cf.TH_SERIAL_CONSISTENCY_REQ, serial_consistency, override=save_config)
     cf.set(cf.TH_SERIAL_WINDOW, serial_window, override=save_config)
+    # camera targets are given as numbers, anything else is a recorded source
+    cameras = tuple(int(camera) if str(camera).isdigit() else camera for camera in multi_cam)
+    cf.set(cf.CAM_CAMERAS, cameras, override=save_config)
+    cf.set(cf.RT_FACE_WORKERS, face_workers, override=save_config)
+    cf.set(cf.INF_POSE_SCALE, pose_scale, override=save_config)
+    cf.set(cf.INF_FACE_SCALE, face_scale, override=save_config)
+    cf.set(cf.RT_RELOAD_INTERVAL, reload_interval, override=save_config)
+    cf.set(cf.INF_FACE_QUALITY, face_quality, override=save_config)
+    cf.set(cf.TH_FACE_MIN_SIZE, face_min_size, override=save_config)
+    cf.set(cf.TH_FACE_MIN_SHARPNESS, face_min_sharpness, override=save_config)
+    cf.set(cf.TH_FACE_MAX_YAW, face_max_yaw, override=save_config)
+    cf.set(cf.INF_CASCADE, cascade, override=save_config)
+    cf.set(cf.INF_POSE_BACKEND, pose_backend, override=save_config)
+    cf.set(cf.INF_POSE_INT8, pose_int8, override=save_config)
+    cf.set(cf.INF_POSE_HALF, pose_half, override=save_config)
+    cf.set(cf.INF_FACE_BACKEND, face_backend, override=save_config)
+    cf.set(cf.INF_IDLE_GATE, idle_gate, override=save_config)
+    cf.set(cf.PATH_RESULTS_LOG, results_log, override=save_config)
+    cf.set(cf.PATH_REPLAY_LOG, record_replay, override=save_config)
+    cf.set(cf.RT_PIPELINE_DEPTH, pipeline_depth, override=save_config)
+    cf.set(cf.INF_WARMUP_FRAMES, warmup_frames, override=save_config)
 
     if save_config:
         cf.save()
 
-    from bfal.scripts import detect
\ No newline at end of file
+    from bfal.scripts import detect as detect_script
+
+    detect_script.run(cf.snapshot())
+
+
+@main.command()
+@click.argument('json_path', type=click.Path(dir_okay=False, file_okay=True, exists=True))
+@click.argument('store_path', type=click.Path(dir_okay=False, file_okay=True))
+def import_builts(json_path, store_path):
+    """
+        Convert a builts JSON file into a .npy store, memory mapped when given as --builts-path.
+    """
+    from bfal.scripts.core import BuiltManager
+
+    count = BuiltManager.import_json(json_path, store_path)
+    click.echo(f'Imported {count} builts to {store_path}')
+
+
+@main.command()
+@click.option('--frames', '-n', type=int, default=300, show_default=True, help='Number of timed frames.')
+@click.option('--warmup', '-w', type=int, default=10, show_default=True, help='Number of untimed frames processed first.')
+@click.option('--device', '-dv', type=str, default=cf.get(cf.RT_DEVICE), show_default=True, help='Torch device used for inference (e.g. cuda, cpu).')
+@click.option('--face-model', '-fm', type=click.Choice(['cnn', 'hog']), default='cnn', show_default=True, help='Face detection model, hog is faster on cpu.')
+@click.option('--face-workers', '-fw', type=int, default=cf.get(cf.RT_FACE_WORKERS), show_default=True, help='Number of processes computing face encodings and landmarks.')
+@click.option('--pose-backend', '-pb', type=click.Choice(['torch', 'onnx']), default=cf.get(cf.INF_POSE_BACKEND), show_default=True, help='Runtime of the pose model.')
+@click.option('--pose-int8/--no-pose-int8', '-pi8', default=cf.get(cf.INF_POSE_INT8), show_default=True, help='Quantize the weights of the onnx pose model to int8.')
+@click.option('--pose-half/--no-pose-half', '-ph', default=cf.get(cf.INF_POSE_HALF), show_default=True, help='Run the torch pose model in half precision (fp16), cuda only.')
+@click.option('--face-backend', '-fb', type=click.Choice(['dlib', 'onnx']), default=cf.get(cf.INF_FACE_BACKEND), show_default=True, help='Face encoding backend.')
+@click.option('--output', '-out', type=click.Path(dir_okay=False, file_okay=True), default=None, help='Save results as JSON to this file.')
+@click.option('--baseline', '-bl', type=click.Path(dir_okay=False, file_okay=True, exists=True), default=None, help='Previous JSON results to compare with.')
+def bench(frames, warmup, device, face_model, face_workers, pose_backend, pose_int8, pose_half, face_backend, output, baseline):
+    """
+        Time each stage of the detection pipeline over a recorded clip (--source) or synthetic frames.
+    """
+    from bfal.scripts import bench as bench_script
+
+    bench_script.run(
+        frames=frames,
+        warmup=warmup,
+        device=device,
+        face_model=face_model,
+        face_workers=face_workers,
+        pose_backend=pose_backend,
+        pose_int8=pose_int8,
+        pose_half=pose_half,
+        face_backend=face_backend,
+        output=output,
+        baseline=baseline,
+    )
+
+
+@main.command()
+@click.argument('replay_path', type=click.Path(dir_okay=True, file_okay=False, exists=True))
+@click.option('--grid', '-g', type=str, multiple=True, required=True, help='Threshold values to try as key=v1,v2,... or key=start:stop:num, repeat for each tuned threshold.')
+@click.option('--builts-path', '-bp', type=click.Path(dir_okay=False, file_okay=True, exists=True), default=cf.get(cf.PATH_BUILTS), help='File location of persons builts.')
+@click.option('--workers', '-wk', type=int, default=0, show_default=True, help='Number of processes evaluating the grid, 0 to evaluate it within this process.')
+@click.option('--top', '-t', type=int, default=10, show_default=True, help='Number of best threshold combinations shown.')
+@click.option('--output', '-out', type=click.Path(dir_okay=False, file_okay=True), default=None, help='Save the scores of every combination as JSON to this file.')
+def tune(replay_path, grid, builts_path, workers, top, output):
+    """
+        Replay bodies recorded with `detect --record-replay` over a grid of thresholds.
+    """
+    from bfal.scripts import tune as tune_script
+
+    cf.set(cf.PATH_BUILTS, builts_path)
+
+    try:
+        tune_script.run(
+            replay_path=replay_path,
+            grid=grid,
+            workers=workers,
+            top=top,
+            output=output,
+        )
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--grid')
+
+
+@main.command()
+@click.option('--number', '-n', type=int, default=200, show_default=True, help='Number of calls per repeat.')
+@click.option('--repeat', '-rp', type=int, default=50, show_default=True, help='Number of timed repeats of each benchmark.')
+@click.option('--device', '-dv', type=str, default='cpu', show_default=True, help='Torch device of the synthetic keypoints.')
+@click.option('--only', '-k', type=str, default=None, help='Run only the benchmarks whose name contains this text.')
+@click.option('--output', '-out', type=click.Path(dir_okay=False, file_okay=True), default=None, help='Save results as JSON to this file.')
+@click.option('--baseline', '-bl', type=click.Path(dir_okay=False, file_okay=True, exists=True), default=None, help='Previous JSON results to compare with.')
+@click.option('--max-regression', '-mr', type=float, default=10.0, show_default=True, help='Fail if a benchmark p50 is slower than the baseline by more than this percent.')
+def microbench(number, repeat, device, only, output, baseline, max_regression):
+    """
+        Time the geometry helpers, specs and filters on synthetic inputs.
+    """
+    from bfal.scripts import microbench as microbench_script
+
+    microbench_script.run(
+        number=number,
+        repeat=repeat,
+        device=device,
+        only=only,
+        output=output,
+        baseline=baseline,
+        max_regression=max_regression,
+    )
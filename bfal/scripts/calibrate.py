@@ -2,113 +2,220 @@ import cv2 as cv
 import click
 import bfal.config as cf
 from bfal.utils import (
-    AsyncVideoCapture,
+    open_video_capture,
     FPS,
     MedianFilter,
+    RunningStats,
     Draw,
 )
-from bfal.scripts.core import ArucoRef
-
-cam_target = cf.get(cf.CAM_TARGET)
-cam_width = cf.get(cf.CAM_WIDTH)
-cam_height = cf.get(cf.CAM_HEIGHT)
-
-calibration_tolerance = cf.get(cf.CNFD_CALIB_TOL)
-ref_unit = cf.get(cf.CNFD_UNIT)
-distance_value = cf.get(cf.CNFD_VALUE)
-
-acap = AsyncVideoCapture(cam_target)
-acap.set(cv.CAP_PROP_FRAME_WIDTH, cam_width)
-acap.set(cv.CAP_PROP_FRAME_HEIGHT, cam_height)
-
-fps = FPS()
-
-mfilter = MedianFilter(64)
-aref = ArucoRef()
-
-# define req variables
-steady_count = 0
-max_steady_count = 0
-prev_distance = -1
-calib_success = False
+from bfal.scripts.core import (
+    ArucoRef,
+    ArucoRefCache,
+)
 
 # declare escape character
-UP = "\x1B[3A" # move cursor up X times
+UP = "\x1B[4A" # move cursor up X times
 CLR = "\x1B[0K"
 
-click.echo('\n')
 
-# begin capturing
-acap.begin()
-fps.init()
-while True:
-    ret, frame = acap.read()
-
-    if not ret:
-        break
-    
-    # frame = cv.flip(frame, flipCode=1)
-    # frame = crop_9_16(frame)
-    # frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
-
-    # draw crosshairs
-    Draw.crosshairs(image=frame, thickness=1)
+class CalibrateResult:
+    """
+        Reference values found by the calibration.
+    """
+
+    def __init__(self, distance_pixel, line_y_axis, distance_value, unit) -> None:
+        self.distance_pixel = distance_pixel
+        self.line_y_axis = line_y_axis
+        self.distance_value = distance_value
+        self.unit = unit
+
+
+class CalibratePipeline:
+    """
+        Finds the pixel distance of the two aruco refs and their line y axis.
+
+        usage:
+            pipeline = CalibratePipeline(cf.snapshot())
+            pipeline.start()
+            while pipeline.step():
+                ...
+            pipeline.stop()
+            pipeline.result # CalibrateResult, None if not finished
+
+        or pipeline.run() that also saves the result on the config file.
+    """
+
+    def __init__(self, config: dict, capture=None) -> None:
+        self.config = config
+        self.headless = config[cf.CAM_HEADLESS]
+
+        self.calibration_tolerance = config[cf.CNFD_CALIB_TOL]
+        self.calibration_ci = config[cf.CNFD_CALIB_CI]
+        self.calibration_min_samples = config[cf.CNFD_CALIB_MIN_SAMPLES]
+        self.ref_unit = config[cf.CNFD_UNIT]
+        self.distance_value = config[cf.CNFD_VALUE]
+
+        self.acap = capture
+        self.fps = FPS()
+
+        self.mfilter = MedianFilter(64)
+        # frames are averaged by blocks, their readings are not independent
+        self.dist_stats = RunningStats(block=config[cf.CNFD_CALIB_BLOCK])
+        self.aref = ArucoRef(subpixel=True, config=config)
+        # refs are detected on every frame, the drift check tells when they moved
+        self.ref_cache = ArucoRefCache(self.aref, interval=1, drift_th=config[cf.CNFD_LIVE_REF_DRIFT])
+
+        # define req variables
+        self.steady_count = 0
+        self.max_steady_count = 0
+        self.prev_distance = -1
+        self.result = None
+        self.frame = None
+
+    def start(self) -> None:
+        if self.acap is None:
+            self.acap = open_video_capture(self.config[cf.CAM_SOURCE], self.config[cf.CAM_TARGET])
+            self.acap.set(cv.CAP_PROP_FRAME_WIDTH, self.config[cf.CAM_WIDTH])
+            self.acap.set(cv.CAP_PROP_FRAME_HEIGHT, self.config[cf.CAM_HEIGHT])
+
+        # begin capturing
+        self.acap.begin()
+        self.fps.init()
+
+    def step(self) -> bool:
+        """
+            process the next frame, returns False once calibrated or the capture has no more frames.
+        """
+        ret, frame = self.acap.read()
+        self.frame = frame if ret else None
+
+        if not ret:
+            return False
+
+        # frame = cv.flip(frame, flipCode=1)
+        # frame = crop_9_16(frame)
+        # frame = cv.cvtColor(frame, cv.COLOR_BGR2GRAY)
+
+        # draw crosshairs
+        if not self.headless:
+            Draw.crosshairs(image=frame, thickness=1)
+
+        ref_valid = self.ref_cache.update(frame, verbose=not self.headless)
+
+        if self.ref_cache.reason in ('missing', 'drift'):
+            # the refs moved (or came back elsewhere), readings taken before no longer describe them
+            self.dist_stats.reset()
+            self.mfilter.clear()
+            self.steady_count = 0
+            self.prev_distance = -1
+
+        if ref_valid:
+            # every corner pair of the refs is a reading of the same distance
+            corners_dist = self.aref.get_corners_distances()
+            self.dist_stats.insert(float(corners_dist.mean()))
+
+            self.mfilter.insert(corners_dist[-1]) # mid points distance
+            fdist = self.mfilter.retrieve()
+
+            if self.prev_distance != fdist:
+                self.steady_count = 0 # reset count if prev value is not the same with new one
+
+            self.prev_distance = fdist
+            self.steady_count += 1
+            self.max_steady_count = max(self.max_steady_count, self.steady_count)
+
+        self.fps.stop()
+        self.fps.update()
+
+        # stop as soon as the mean estimate is tight enough, or the median is steady long enough
+        estimate_converged = self.dist_stats.count >= self.calibration_min_samples and self.dist_stats.ci_half_width() <= self.calibration_ci
+
+        if estimate_converged:
+            distance_pixel = round(self.dist_stats.mean, 2)
+        elif self.steady_count >= self.calibration_tolerance:
+            distance_pixel = int(self.prev_distance)
+        else:
+            return True
+
+        self.result = CalibrateResult(
+            distance_pixel=distance_pixel,
+            line_y_axis=self.aref.my,
+            distance_value=self.distance_value,
+            unit=self.ref_unit,
+        )
+
+        return False
+
+    def echo_status(self) -> None:
+        click.echo(UP)
+        click.echo(f'Pixel distance: {self.prev_distance:.4f}')
+        click.echo(f'Steady Count: {self.steady_count}, Max: {self.max_steady_count}{CLR}')
+        click.echo(f'Mean distance: {self.dist_stats.mean:.4f} +/- {self.dist_stats.ci_half_width():.4f} (n={self.dist_stats.count}){CLR}')
+
+    def show(self) -> bool:
+        """
+            shows the frame, returns False if quit (q) is pressed.
+        """
+        cv.putText(
+            self.frame,
+            text=f'FPS:{self.fps.value():.2f}',
+            fontFace=cv.FONT_HERSHEY_PLAIN,
+            org=(0, 16),
+            color=(0, 255, 0),
+            fontScale=1,
+            thickness=2,
+        )
+        cv.imshow('Calibrate Distance', self.frame)
+
+        return cv.waitKey(1) != ord('q')
+
+    def stop(self) -> None:
+        self.acap.release()
+        if not self.headless:
+            cv.destroyAllWindows()
+
+    def save(self) -> None:
+        cf.set(cf.CNFD_DIST_PIXEL, self.result.distance_pixel, override=True)
+        cf.set(cf.CNFD_UNIT, self.result.unit, override=True)
+        cf.set(cf.CNFD_VALUE, self.result.distance_value, override=True)
+        cf.set(cf.CNFD_LINE_Y_AXIS, self.result.line_y_axis, override=True)
+        cf.save()
 
-    ref_valid = aref.ref_valid(frame)
+    def run(self) -> CalibrateResult:
+        click.echo('\n')
 
-    fdist = None
-    if ref_valid:
-        ref_dist = aref.get_distance()
+        self.start()
+        try:
+            while True:
+                running = self.step()
+                if self.frame is None:
+                    break
 
-        mfilter.insert(ref_dist)
-        fdist = mfilter.retrieve()
+                self.echo_status()
 
-        if prev_distance != fdist:
-            steady_count = 0 # reset count if prev value is not the same with new one
+                if not running:
+                    break
 
-        prev_distance = fdist
-        steady_count += 1
-        max_steady_count = max(max_steady_count, steady_count)
-    
-    click.echo(UP)
-    click.echo(f'Pixel distance: {prev_distance:.4f}')
-    click.echo(f'Steady Count: {steady_count}, Max: {max_steady_count}{CLR}')
+                if not self.headless and not self.show():
+                    break
+        finally:
+            self.stop()
 
-    if steady_count >= calibration_tolerance:
-        prev_distance = int(prev_distance)
+        if self.result is None:
+            click.echo('\tNo config changes.')
+            return None
 
         click.echo('-'*64)
         click.echo('Calibration is finished with ff values.')
-        click.echo(f'\t{distance_value}{ref_unit} ~= {prev_distance}px')
+        click.echo(f'\t{self.result.distance_value}{self.result.unit} ~= {self.result.distance_pixel}px')
 
-        cf.set(cf.CNFD_DIST_PIXEL, prev_distance, override=True)
-        cf.set(cf.CNFD_UNIT, ref_unit, override=True)
-        cf.set(cf.CNFD_VALUE, distance_value, override=True)
-        cf.set(cf.CNFD_LINE_Y_AXIS, aref.my, override=True)
-        cf.save()
-        calib_success = True
-        break
-
-    fps.stop()
-    fps_val = fps.value()
-    cv.putText(
-        frame,
-        text=f'FPS:{fps_val:.2f}',
-        fontFace=cv.FONT_HERSHEY_PLAIN,
-        org=(0, 16),
-        color=(0, 255, 0),
-        fontScale=1,
-        thickness=2,
-    )
-    cv.imshow('Calibrate Distance', frame)
-
-    fps.update()
-
-    if cv.waitKey(1) == ord('q'):
-        break
-
-if not calib_success:
-    click.echo('\tNo config changes.')
-
-acap.release()
-cv.destroyAllWindows()
+        self.save()
+
+        return self.result
+
+
+def run(config: dict) -> CalibrateResult:
+    """
+        run the calibration of the `bfal calibrate` command.
+    """
+    return CalibratePipeline(config).run()
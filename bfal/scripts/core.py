@@ -1,18 +1,25 @@
-import face_recognition
 import numpy as np
 import imutils
 import click
-from threading import Thread
+import time
+from threading import (
+    Lock,
+    Thread,
+)
 from imutils import paths
 from os import (
     listdir,
     path,
+    replace,
 )
 from bfal.utils import (
     find_intersection,
     get_distance_of_2_points,
     is_value_within,
+    MedianFilter,
     Draw,
+    metrics,
+    timed,
 )
 
 from bfal.specs import (
@@ -21,113 +28,836 @@ from bfal.specs import (
 )
 
 import bfal.config as cf
+from bfal.lazy import lazy_import
+
+# heavy dependencies are only imported once used, calibration never needs them
+face_recognition = lazy_import('face_recognition')
 
 UNKNOWN_PERSON_LABEL = "unknown"
 FACES_IMAGE_READING_WIDTH = 420
+MIN_FACE_REGION_SIZE = 16
+
+class PendingFaces:
+    """
+        Faces of a frame submitted to FaceRecognition, frame_id is set while the face workers encode them.
+    """
+
+    def __init__(self, face_locations: list, scaler=None) -> None:
+        self.face_locations = face_locations
+        self.scaler = scaler
+        self.frame_id = None
+        self.encodings = []
+        self.landmarks = []
+
 
 class FaceRecognition:
 
-    def __init__(self, known_faces_path: str) -> None:
+    def __init__(self, known_faces_path: str, model='cnn', workers=0, embedder=None, pool_slots=None, device=None) -> None:
         self.root_path = known_faces_path
+        self.device = device # of the face spec tensors
+        self.model = model # face detection model, cnn or hog (faster on cpu)
+        self.embedder = embedder or DlibEmbedder()
+
+        # (encodings, labels, backend) swapped as a whole on reload so a match never sees them half updated
+        self.gallery = ([], [], self.embedder.name)
+        self.__faces__ = {} # image path -> (mtime, label, encoding)
+        self.__faces_backend__ = self.embedder.name # of the __faces__ encodings
         self.__load_known_faces_encodings__()
 
+        # encodings and landmarks are computed by worker processes when given, workers hold dlib models
+        self.pool = None
+        if workers and self.embedder.name != DlibEmbedder.name:
+            click.echo(f'Face workers are only used by the dlib backend, encoding with {self.embedder.name} in process.')
+        elif workers:
+            self.pool = FacePool(workers, slots=pool_slots or FACE_POOL_SLOTS, embedder=self.embedder)
+
+    @property
+    def known_faces_encodings(self) -> list:
+        return self.gallery[0]
+
+    @property
+    def labels(self) -> list:
+        return self.gallery[1]
+
     def __load_known_faces_encodings__(self) -> None:
-        self.known_faces_encodings = []
-        self.labels = []
+        if not self.root_path:
+            click.echo('No known faces directory given.')
+            return
+
         click.echo('Reading all known faces...')
+        self.reload(verbose=True)
+
+    def __scan__(self) -> dict:
+        """
+            returns the {image path: (mtime, label)} of the known faces directory, the label is the folder name.
+        """
+        images = {}
+        if not path.isdir(self.root_path):
+            return images
+
         for folder in listdir(self.root_path):
-            click.echo(f'Face for {folder}:')
             folder_path = path.join(self.root_path, folder)
             if path.isdir(folder_path):
                 for img_path in paths.list_images(folder_path):
-                    image = face_recognition.load_image_file(img_path)
-                    # resize if width is greater than min width required
-                    if image.shape[1] > FACES_IMAGE_READING_WIDTH:
-                        image = imutils.resize(image=image, width=FACES_IMAGE_READING_WIDTH)
-                    img_encoding = face_recognition.face_encodings(image)[0] # single face only
-                    self.known_faces_encodings.append(img_encoding)
-                    self.labels.append(folder)
-                    click.echo(f'\t{img_path}')
+                    images[img_path] = (path.getmtime(img_path), folder)
+
+        return images
+
+    def __encode__(self, img_path: str):
+        image = face_recognition.load_image_file(img_path)
+        # resize if width is greater than min width required
+        if image.shape[1] > FACES_IMAGE_READING_WIDTH:
+            image = imutils.resize(image=image, width=FACES_IMAGE_READING_WIDTH)
+
+        face_locations = face_recognition.face_locations(image)[:1] # single face only
+        faces_landmarks = face_recognition.face_landmarks(image, face_locations) if self.embedder.needs_landmarks else None
+        # known faces are not counted in the encoding throughput of the frames
+        img_encodings = self.embedder.encode(image, face_locations, faces_landmarks, record=False)
+        return img_encodings[0] if img_encodings else None
+
+    def reload(self, verbose=False) -> tuple:
+        """
+            encodes the added and changed images of the known faces directory and drops the removed ones,
+            returns the (added, changed, removed) image paths.
+        """
+        images = self.__scan__()
+        # encodings of another backend are never reused
+        faces = dict(self.__faces__) if self.__faces_backend__ == self.embedder.name else {}
+
+        added = [img_path for img_path in images if img_path not in faces]
+        changed = [img_path for img_path in images if img_path in faces and faces[img_path][0] != images[img_path][0]]
+        removed = [img_path for img_path in faces if img_path not in images]
+
+        for img_path in removed:
+            del faces[img_path]
+
+        for img_path in added + changed:
+            mtime, label = images[img_path]
+            encoding = self.__encode__(img_path)
+            faces[img_path] = (mtime, label, encoding)
+            if verbose:
+                click.echo(f'\t{img_path}' if encoding is not None else f'\t{img_path} (no face found)')
+
+        if added or changed or removed or self.gallery[2] != self.embedder.name:
+            known = [(label, encoding) for (_, label, encoding) in faces.values() if encoding is not None]
+            self.__faces__ = faces
+            self.__faces_backend__ = self.embedder.name
+            self.gallery = ([encoding for (_, encoding) in known], [label for (label, _) in known], self.embedder.name)
+
+        return (added, changed, removed)
     
-    def __process_encodings__(self, rgb_image, face_locations) -> None:
-        self.face_encodings = face_recognition.face_encodings(rgb_image, face_locations)
+    def __process_encodings__(self, rgb_image, face_locations, faces_landmarks=None) -> list:
+        return self.embedder.encode(rgb_image, face_locations, faces_landmarks if self.embedder.needs_landmarks else None)
 
-    def __process_landmarks__(self, rgb_image, face_locations) -> None:
-        self.faces_landmarks = face_recognition.face_landmarks(rgb_image, face_locations)
+    def __process_landmarks__(self, rgb_image, face_locations) -> list:
+        return face_recognition.face_landmarks(rgb_image, face_locations)
 
-    def process(self, rgb_image) -> [FaceSpec]:
-        face_locations = face_recognition.face_locations(rgb_image, model='cnn')
+    def __process_faces__(self, rgb_image, face_locations) -> tuple:
+        """
+            returns the (encodings, landmarks) of the face locations.
+        """
+        if self.pool:
+            return self.pool.process(rgb_image, face_locations)
 
-        t1 = Thread(target=self.__process_encodings__, args=(rgb_image, face_locations, ))
-        t2 = Thread(target=self.__process_landmarks__, args=(rgb_image, face_locations, ))
+        if self.embedder.needs_landmarks:
+            # faces are aligned on their landmarks before being encoded
+            faces_landmarks = self.__process_landmarks__(rgb_image, face_locations)
+            return (self.__process_encodings__(rgb_image, face_locations, faces_landmarks), faces_landmarks)
 
-        t1.start()
-        t2.start()
-        
-        t1.join()
-        t2.join()
+        # dlib encodings and landmarks are computed at the same time
+        faces_landmarks = []
+        landmarks_thread = Thread(target=lambda: faces_landmarks.extend(self.__process_landmarks__(rgb_image, face_locations)))
+        landmarks_thread.start()
+        face_encodings = self.__process_encodings__(rgb_image, face_locations)
+        landmarks_thread.join()
 
-        faces_spec = []
+        return (face_encodings, faces_landmarks)
+
+    def locate(self, rgb_image) -> list:
+        return face_recognition.face_locations(rgb_image, model=self.model)
+
+    def locate_regions(self, rgb_image, regions) -> list:
+        """
+            locates faces within the (x1, y1, x2, y2) regions only, returns their locations on the whole image.
+        """
+        image_h, image_w = rgb_image.shape[:2]
+        face_locations = []
+
+        for (x1, y1, x2, y2) in regions:
+            x1, y1 = max(x1, 0), max(y1, 0)
+            x2, y2 = min(x2, image_w), min(y2, image_h)
+            if min(x2 - x1, y2 - y1) < MIN_FACE_REGION_SIZE:
+                continue
+
+            for (top, right, bottom, left) in self.locate(np.ascontiguousarray(rgb_image[y1:y2, x1:x2])):
+                location = (top + y1, right + x1, bottom + y1, left + x1)
+
+                # regions of close bodies can overlap, keep a face once
+                center_y, center_x = (location[0] + location[2]) // 2, (location[1] + location[3]) // 2
+                if not any(t <= center_y <= b and l <= center_x <= r for (t, r, b, l) in face_locations):
+                    face_locations.append(location)
+
+        return face_locations
+
+    def match(self, face_encoding) -> tuple:
+        """
+            find the closest known face of the encoding, returns (is_known, label, distance)
+        """
+        known_faces_encodings, labels, backend = self.gallery
+
+        if backend != self.embedder.name:
+            raise ValueError(f'Gallery encoded by {backend} can not be matched with {self.embedder.name} encodings')
+
+        if len(known_faces_encodings) == 0:
+            return (False, UNKNOWN_PERSON_LABEL, 1.0)
+
+        # same as face_recognition.face_distance and compare_faces, with the tolerance of the backend
+        face_distances = np.linalg.norm(np.asarray(known_faces_encodings) - face_encoding, axis=1)
+        nlabel = UNKNOWN_PERSON_LABEL
+        min_indx = np.argmin(face_distances)
+
+        is_known = face_distances[min_indx] <= self.embedder.tolerance
+
+        if is_known:
+            nlabel = labels[min_indx]
+
+        return (is_known, nlabel, face_distances[min_indx])
+
+    @timed('face')
+    def submit(self, rgb_image, scaler=None, quality=None, get_keypoints=None, regions=None) -> 'PendingFaces':
+        """
+            locates the faces and starts their encoding, on the face workers it goes on in the background
+            while the next frames are submitted. collect returns their face specs.
 
-        for (face_encoding, land_marks, location) in zip(self.face_encodings, self.faces_landmarks, face_locations):
-            matches = face_recognition.compare_faces(self.known_faces_encodings, face_encoding)
-            face_distances = face_recognition.face_distance(self.known_faces_encodings, face_encoding)
-            nlabel = UNKNOWN_PERSON_LABEL
-            min_indx = np.argmin(face_distances)
+            rgb_image can be a downscaled frame, its ImageScaler is then given to map the faces back to the frame.
 
-            is_known = matches[min_indx]
+            located faces not accepted by the FaceQuality are not encoded, get_keypoints returns the pose keypoints
+            (on the frame) used for the yaw, it is only called once faces are located so the pose can run meanwhile.
 
-            if is_known:
-                nlabel = self.labels[min_indx]
+            faces are only searched within the (x1, y1, x2, y2) regions of rgb_image when given.
+        """
+        face_locations = self.locate(rgb_image) if regions is None else self.locate_regions(rgb_image, regions)
+
+        if quality is not None and face_locations:
+            keypoints = get_keypoints() if get_keypoints is not None else None
+            face_locations = quality.filter(rgb_image, face_locations, keypoints, scaler)
+
+        pending = PendingFaces(face_locations, scaler)
+        if self.pool and face_locations:
+            pending.frame_id = self.pool.submit(rgb_image, face_locations)
+        else:
+            pending.encodings, pending.landmarks = self.__process_faces__(rgb_image, face_locations)
+
+        return pending
+
+    def process(self, rgb_image, scaler=None, quality=None, get_keypoints=None, regions=None) -> [FaceSpec]:
+        """
+            submit and collect the faces of the image at once, see submit.
+        """
+        return self.collect(self.submit(rgb_image, scaler=scaler, quality=quality, get_keypoints=get_keypoints, regions=regions))
+
+    @timed('face_match')
+    def collect(self, pending: 'PendingFaces') -> [FaceSpec]:
+        """
+            waits for the encodings of the submitted faces, returns their matched face specs.
+        """
+        if pending.frame_id is not None:
+            pending.encodings, pending.landmarks = self.pool.result(pending.frame_id)
+            pending.frame_id = None
+
+        scaler = pending.scaler
+        faces_spec = []
+
+        for (face_encoding, land_marks, location) in zip(pending.encodings, pending.landmarks, pending.face_locations):
+            is_known, nlabel, distance = self.match(face_encoding)
+
+            if scaler is not None:
+                location = scaler.transform_location(location)
+                land_marks = scaler.transform_landmarks(land_marks)
 
             fspec = FaceSpec(
                 location=location,
                 land_marks=land_marks,
                 is_known=is_known,
                 label=nlabel,
-                distance_value=face_distances[min_indx],
+                distance_value=distance,
+                device=self.device,
             )
 
             faces_spec.append(fspec)
 
         return faces_spec
 
+    def warm_up(self, rgb_image, face_locations) -> None:
+        """
+            runs the face detection, landmarks and encoding once so their models are loaded (within the
+            workers too) before the first frame. the locations are encoded whatever the image holds.
+        """
+        faces, encode_ns = self.embedder.faces, self.embedder.encode_ns
 
-from threading import (
-    Event,
-    Thread,
-)
-from ultralytics import YOLO
+        self.locate(rgb_image)
+        self.__process_faces__(rgb_image, face_locations)
+
+        # not counted in the encoding throughput
+        self.embedder.faces, self.embedder.encode_ns = faces, encode_ns
+
+    def release(self) -> None:
+        if self.pool:
+            self.pool.release()
+            self.pool = None
+
+
+import cv2 as cv
+import multiprocessing as mp
+from bfal.utils import FrameRing
+
+"""
+    Face encodings and landmarks computed by worker processes, each holding its own dlib models.
+
+    Faces are located on the main process. The frame is written once on a FrameRing (shared memory)
+    and only the ring name, the frame sequence number and the face location are sent to the workers.
+    Workers read the frame from the ring without copying it and encode the face at the frame resolution,
+    like the in process encoding does.
+
+    Each face is its own task and a frame is submitted without waiting for the previous ones, so the faces
+    of consecutive frames are spread over the workers. Results are collected by frame id, in the order of
+    the given locations. A ring slot is only written again once the faces of its previous frame are done.
+"""
+FACE_POOL_SLOTS = 4 # frames handed to the workers at once
+
+__worker_rings__ = {} # ring name -> FrameRing attached by a worker, only the current ring is kept
+
+def __face_worker_init__() -> None:
+    face_recognition.api # load the dlib models once per worker
+
+def __face_worker_task__(task: tuple) -> tuple:
+    ring_name, seq, location = task
+
+    ring = __worker_rings__.get(ring_name)
+    if ring is None:
+        # the pool is done with its previous ring (see FacePool.__ring_for__), its memory is unmapped
+        for previous in __worker_rings__.values():
+            previous.close()
+        __worker_rings__.clear()
+        ring = __worker_rings__[ring_name] = FrameRing.attach(ring_name)
+
+    frame = ring.read(seq)
+    if frame is None:
+        raise RuntimeError(f'Frame {seq} was overwritten before its faces were encoded')
+
+    start = time.perf_counter_ns()
+    encoding = face_recognition.face_encodings(frame, [location])[0]
+    encode_ns = time.perf_counter_ns() - start
+    land_marks = face_recognition.face_landmarks(frame, [location])[0]
+
+    return (encoding, land_marks, encode_ns)
+
+class FacePool:
+
+    def __init__(self, workers: int, slots=FACE_POOL_SLOTS, embedder=None) -> None:
+        self.workers = workers
+        self.slots = slots
+        self.embedder = embedder # counts the faces encoded by the workers and their encoding time
+        self.ring = None # created on the first frame, of its shape
+        self.__pending__ = {} # frame id -> (ring seq, face tasks)
+        self.__frame_id__ = 0
+
+        # spawn so the workers don't inherit the torch/cuda state of this process
+        self.pool = mp.get_context('spawn').Pool(
+            processes=workers,
+            initializer=__face_worker_init__,
+        )
+
+    def __wait__(self, ring_seq=None) -> None:
+        """
+            waits for the faces of the frame on the ring seq to be done, of every pending frame when None.
+        """
+        for (seq, tasks) in list(self.__pending__.values()):
+            if ring_seq is None or seq == ring_seq:
+                for task in tasks:
+                    task.wait()
+
+    def __ring_for__(self, rgb_image) -> FrameRing:
+        if self.ring is None or self.ring.shape != rgb_image.shape:
+            if self.ring is not None:
+                # workers may still read the frames of the previous ring
+                self.__wait__()
+                self.ring.close()
+            self.ring = FrameRing(rgb_image.shape, slots=self.slots)
+
+        return self.ring
+
+    def submit(self, rgb_image, face_locations) -> int:
+        """
+            hands the faces of the frame to the workers without waiting for them, returns the frame id
+            to get their results with result.
+        """
+        ring = self.__ring_for__(rgb_image)
+
+        # the slot written next must be done with its previous frame
+        self.__wait__(ring.write_seq + 1 - ring.slots)
+        seq = ring.write(rgb_image)
+
+        self.__frame_id__ += 1
+        self.__pending__[self.__frame_id__] = (seq, [
+            self.pool.apply_async(__face_worker_task__, ((ring.name, seq, location), ))
+            for location in face_locations
+        ])
+
+        return self.__frame_id__
+
+    def result(self, frame_id: int) -> tuple:
+        """
+            waits for the faces of the submitted frame, returns their (encodings, landmarks) in the order of the locations.
+        """
+        _, tasks = self.__pending__.pop(frame_id)
+        results = [task.get() for task in tasks]
+
+        if self.embedder is not None and results:
+            self.embedder.record(len(results), sum(encode_ns for (_, _, encode_ns) in results))
+
+        return ([encoding for (encoding, _, _) in results], [land_marks for (_, land_marks, _) in results])
+
+    def process(self, rgb_image, face_locations) -> tuple:
+        """
+            returns the (encodings, landmarks) of the face locations, in the same order.
+        """
+        if not face_locations:
+            return ([], [])
+
+        return self.result(self.submit(rgb_image, face_locations))
+
+    def release(self) -> None:
+        self.pool.close()
+        self.pool.join()
+        self.__pending__ = {}
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+"""
+    Cheap checks of a located face, faces that would never give a reliable match are not encoded.
+"""
+FACE_YAW_KEYPOINTS = 3 # nose, left eye, right eye
+
+class FaceQuality:
+
+    def __init__(self, min_size: int, min_sharpness: float, max_yaw: float, visibility_th=0.0) -> None:
+        self.min_size = min_size # pixels of the smallest side of the face box
+        self.min_sharpness = min_sharpness # variance of the laplacian of the face
+        self.max_yaw = max_yaw # nose offset from the mid eye point, ratio of the eyes distance
+        self.visibility_th = visibility_th # nose and eyes at or below it give no yaw, as on head_is_firm
+
+        self.passed = 0
+        self.skipped = 0
+
+    @staticmethod
+    def sharpness(rgb_image, location) -> float:
+        (top, right, bottom, left) = location
+        face = cv.cvtColor(rgb_image[max(top, 0):bottom, max(left, 0):right], cv.COLOR_RGB2GRAY)
+        return float(cv.Laplacian(face, cv.CV_64F).var()) if face.size else 0.0
+
+    @staticmethod
+    def yaw(keypoints, location, visibility_th=0.0):
+        """
+            yaw of the body whose nose is within the face location, None if there is none.
+            keypoints are (x, y, visibility) of each body within the same coordinates of the location,
+            bodies whose nose or eyes are not visible (at or below visibility_th) are skipped.
+        """
+        (top, right, bottom, left) = location
+
+        for ((nose_x, nose_y, nose_v), (left_eye_x, _, left_eye_v), (right_eye_x, _, right_eye_v)) in keypoints[:, :FACE_YAW_KEYPOINTS, :3].tolist():
+            if min(nose_v, left_eye_v, right_eye_v) <= visibility_th:
+                continue
+
+            if left <= nose_x <= right and top <= nose_y <= bottom:
+                eyes_distance = abs(left_eye_x - right_eye_x)
+                if eyes_distance < 1:
+                    return float('inf') # side on, both eyes at the same point
+                return abs(nose_x - (left_eye_x + right_eye_x) / 2) / eyes_distance
+
+        return None
+
+    def accept(self, rgb_image, location, keypoints=None, scaler=None) -> bool:
+        (top, right, bottom, left) = location
+
+        if min(bottom - top, right - left) < self.min_size:
+            return False
+
+        if self.min_sharpness and self.sharpness(rgb_image, location) < self.min_sharpness:
+            return False
+
+        if self.max_yaw and keypoints is not None and len(keypoints):
+            # keypoints are on the frame, the location may be on a downscaled one
+            frame_location = scaler.transform_location(location) if scaler is not None else location
+            yaw = self.yaw(keypoints, frame_location, self.visibility_th)
+            if yaw is not None and yaw > self.max_yaw:
+                return False
+
+        return True
+
+    def filter(self, rgb_image, face_locations, keypoints=None, scaler=None) -> list:
+        accepted = [location for location in face_locations if self.accept(rgb_image, location, keypoints, scaler)]
+
+        self.passed += len(accepted)
+        self.skipped += len(face_locations) - len(accepted)
+
+        return accepted
+
+
+onnxruntime = lazy_import('onnxruntime')
+
+"""
+    Face embedding backends of FaceRecognition, the gallery is tagged with the name of the backend that
+    encoded it so encodings of different backends are never compared.
+
+    encode(rgb_image, face_locations, faces_landmarks) returns one encoding per location, backends that
+    align the faces (needs_landmarks) are given the landmarks of the same locations. An embedder encodes
+    one image at a time, the known faces reloaded by the GalleryWatcher thread wait for the frame.
+"""
+DLIB_TOLERANCE = 0.6 # face_recognition.compare_faces default
+DLIB_ENCODING_SIZE = 128
+ONNX_FACE_SIZE = 112 # arcface crops, used when the model input size is dynamic
+ONNX_FACE_EYES_Y = 0.46 # mid eye point height on the aligned crop, ratio of its size
+ONNX_FACE_EYES_DISTANCE = 0.31 # eyes distance on the aligned crop, ratio of its size
+ONNX_PROVIDERS = ('OpenVINOExecutionProvider', 'CPUExecutionProvider') # first available is used
+
+class FaceEmbedder:
+
+    name = None
+    needs_landmarks = False
+
+    def __init__(self, tolerance: float, size: int) -> None:
+        self.tolerance = tolerance # maximum euclidean distance of a match
+        self.size = size # of an encoding
+        self.faces = 0 # encoded since start
+        self.encode_ns = 0
+        self.__lock__ = Lock()
+
+    def __encode__(self, rgb_image, face_locations, faces_landmarks) -> list:
+        raise NotImplementedError
+
+    def encode(self, rgb_image, face_locations, faces_landmarks=None, record=True) -> list:
+        """
+            record=False leaves the encoding out of the faces, encode_ns and encoding metrics.
+        """
+        if not face_locations:
+            return []
+
+        with self.__lock__:
+            start = time.perf_counter_ns()
+            encodings = self.__encode__(rgb_image, face_locations, faces_landmarks)
+            duration_ns = time.perf_counter_ns() - start
+
+        if record:
+            self.record(len(face_locations), duration_ns)
+
+        return encodings
+
+    def record(self, faces: int, duration_ns: int) -> None:
+        """
+            counts faces encoded in duration_ns, by encode or by the face workers.
+        """
+        self.faces += faces
+        self.encode_ns += duration_ns
+        if metrics.enabled:
+            metrics.record(f'encoding_{self.name}', duration_ns)
+
+    def throughput(self) -> float:
+        # faces encoded per second of encoding
+        return self.faces * 1e9 / self.encode_ns if self.encode_ns else 0.0
+
+
+class DlibEmbedder(FaceEmbedder):
+
+    name = 'dlib'
+
+    def __init__(self, tolerance=DLIB_TOLERANCE) -> None:
+        super().__init__(tolerance, DLIB_ENCODING_SIZE)
+
+    def __encode__(self, rgb_image, face_locations, faces_landmarks) -> list:
+        return face_recognition.face_encodings(rgb_image, face_locations)
+
+
+class OnnxEmbedder(FaceEmbedder):
+    """
+        Encodes aligned face crops in batches with an ONNX Runtime model (arcface like, (n, 3, size, size)
+        rgb input normalized to [-1, 1]), the encodings are l2 normalized.
+    """
+
+    name = 'onnx'
+    needs_landmarks = True
+
+    def __init__(self, model_path: str, tolerance: float) -> None:
+        providers = [provider for provider in ONNX_PROVIDERS if provider in onnxruntime.get_available_providers()]
+        self.session = onnxruntime.InferenceSession(model_path, providers=providers)
+
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.crop_size = model_input.shape[2] if isinstance(model_input.shape[2], int) else ONNX_FACE_SIZE
+        self.batch_size = model_input.shape[0] if isinstance(model_input.shape[0], int) else None # None when dynamic
+
+        size = self.session.get_outputs()[0].shape[-1]
+        super().__init__(tolerance, size if isinstance(size, int) else None)
+
+    def align(self, rgb_image, location, land_marks=None):
+        """
+            crop of the face rotated so its eyes are level, the face box is stretched on the crop when
+            there are no eyes landmarks.
+        """
+        size = self.crop_size
+
+        if land_marks and land_marks.get('left_eye') and land_marks.get('right_eye'):
+            left_eye = np.mean(land_marks['left_eye'], axis=0)
+            right_eye = np.mean(land_marks['right_eye'], axis=0)
+            (dx, dy) = right_eye - left_eye
+            center = (left_eye + right_eye) / 2
+
+            scale = ONNX_FACE_EYES_DISTANCE * size / max(float(np.hypot(dx, dy)), 1.0)
+            matrix = cv.getRotationMatrix2D((float(center[0]), float(center[1])), float(np.degrees(np.arctan2(dy, dx))), scale)
+            matrix[0, 2] += size * 0.5 - center[0]
+            matrix[1, 2] += size * ONNX_FACE_EYES_Y - center[1]
+        else:
+            (top, right, bottom, left) = location
+            scale = size / max(right - left, bottom - top, 1)
+            matrix = np.float32([[scale, 0, -left * scale], [0, scale, -top * scale]])
+
+        return cv.warpAffine(rgb_image, matrix, (size, size), flags=cv.INTER_LINEAR, borderMode=cv.BORDER_REPLICATE)
+
+    def __encode__(self, rgb_image, face_locations, faces_landmarks) -> list:
+        faces_landmarks = faces_landmarks or [None] * len(face_locations)
+        crops = np.stack([self.align(rgb_image, location, land_marks) for (location, land_marks) in zip(face_locations, faces_landmarks)])
+
+        blob = (crops.astype(np.float32) - 127.5) / 128.0
+        blob = np.ascontiguousarray(blob.transpose(0, 3, 1, 2))
+
+        # models exported with a fixed batch are run once per batch, the last one is padded with zeros
+        batch_size = self.batch_size or len(blob)
+        outputs = []
+        for i in range(0, len(blob), batch_size):
+            batch = blob[i:i + batch_size]
+            if len(batch) < batch_size:
+                batch = np.concatenate((batch, np.zeros((batch_size - len(batch), ) + batch.shape[1:], dtype=batch.dtype)))
+            outputs.append(self.session.run(None, {self.input_name: batch})[0][:len(blob) - i])
+        encodings = np.concatenate(outputs).reshape(len(blob), -1)
+        encodings /= np.maximum(np.linalg.norm(encodings, axis=1, keepdims=True), 1e-12)
+
+        return list(encodings)
+
+
+def load_face_embedder(config: dict) -> FaceEmbedder:
+    if config[cf.INF_FACE_BACKEND] == 'dlib':
+        return DlibEmbedder()
+    if config[cf.INF_FACE_BACKEND] != 'onnx':
+        raise ValueError(f'Unknown face backend {config[cf.INF_FACE_BACKEND]!r}, expected dlib or onnx')
+    if not config[cf.INF_FACE_ONNX]:
+        raise ValueError('The onnx face backend needs a model, set face_onnx')
+
+    return OnnxEmbedder(config[cf.INF_FACE_ONNX], tolerance=config[cf.INF_FACE_ONNX_TOLERANCE])
+
+
+from queue import Queue
+from threading import Event
+ultralytics = lazy_import('ultralytics')
 
 class PoseYOLO:
 
-    def __init__(self, model_path: str) -> None:
-        self.model = YOLO(model_path)
-        
+    def __init__(self, model_path: str, device=None, half=False) -> None:
+        self.device = device
+        self.half = half # fp16 inference, ignored by ultralytics on cpu
+        self.model = self.__load__(model_path)
+
         self.__detect_evet__ = Event()
         self.__detect_thread__ = None
+        self.__detect_error__ = None # raised by get_result, of the last async detect
 
         self.__detect_evet__.set()
     
+    def __load__(self, model_path: str):
+        return ultralytics.YOLO(model_path)
+
+    @timed('pose')
     def detect(self, image) -> None:
-        self.results = self.model(image, verbose=False)
+        # inference mode is per thread, detect also runs on the async worker
+        with torch.inference_mode():
+            self.results = self.model(image, verbose=False, device=self.device, half=self.half)
         if not self.__detect_evet__.is_set():
             self.__detect_evet__.set()
  
     def detect_async(self, image) -> None:
         self.__detect_evet__.clear()
-        self.__detect_thread__ = Thread(target=self.detect, args=(image,))
-        self.__detect_thread__.start()
+        # one worker thread for the lifetime of the model rather than a thread per frame
+        if self.__detect_thread__ is None:
+            self.__detect_images__ = Queue(maxsize=1)
+            self.__detect_thread__ = Thread(target=self.__detect_loop__, daemon=True)
+            self.__detect_thread__.start()
+        self.__detect_images__.put(image)
+
+    def __detect_loop__(self) -> None:
+        while True:
+            image = self.__detect_images__.get()
+            try:
+                self.detect(image)
+            except Exception as e:
+                # forwarded to the caller of get_result, the worker keeps serving the next frames
+                self.__detect_error__ = e
+                self.__detect_evet__.set()
 
     def get_result(self):
         if not self.__detect_evet__.is_set():
             self.__detect_evet__.wait()
+
+        if self.__detect_error__ is not None:
+            error, self.__detect_error__ = self.__detect_error__, None
+            raise error
+
         return self.results
-    
 
 
-import cv2 as cv
-import torch
+import shutil
+
+"""
+    Pose model exported to ONNX and run on cpu through ONNX Runtime (OpenVINO when installed),
+    ultralytics is only imported to export it. The output is decoded with numpy and opencv.
+
+    Results have the same structure as the ultralytics ones used by detect: results[0].keypoints.data
+    of (n, 17, 3) and results[0].boxes.data of (n, 6) torch tensors on the frame coordinates, on the
+    configured device.
+"""
+POSE_ONNX_IMGSZ = 640
+POSE_CONF_TH = 0.25 # same defaults as ultralytics predict
+POSE_IOU_TH = 0.7
+POSE_MAX_DET = 300
+LETTERBOX_COLOR = (114, 114, 114)
+
+class PoseData:
+
+    def __init__(self, data) -> None:
+        self.data = data
+
+class PoseResult:
+
+    def __init__(self, keypoints, boxes) -> None:
+        self.keypoints = PoseData(keypoints)
+        self.boxes = PoseData(boxes)
+
+    def __len__(self) -> int:
+        return len(self.boxes.data)
+
+def decode_pose_output(output, ratio=1.0, pad=(0, 0), device=None) -> PoseResult:
+    """
+        decodes the (1, 4 box + 1 conf + 17 * 3 keypoints, anchors) output of the exported pose model,
+        boxes and keypoints are mapped from the letterboxed input back to the image by ratio and pad.
+    """
+    # (1, 56, anchors) -> (anchors, 56)
+    predictions = output[0].T
+    predictions = predictions[predictions[:, 4] > POSE_CONF_TH]
+
+    cx, cy, w, h = predictions[:, 0], predictions[:, 1], predictions[:, 2], predictions[:, 3]
+    boxes_xywh = np.stack((cx - w / 2, cy - h / 2, w, h), axis=1)
+    keep = cv.dnn.NMSBoxes(boxes_xywh.tolist(), predictions[:, 4].tolist(), POSE_CONF_TH, POSE_IOU_TH, top_k=POSE_MAX_DET)
+    keep = np.array(keep, dtype=np.intp).reshape(-1)
+    predictions, boxes_xywh = predictions[keep], boxes_xywh[keep]
+
+    pad_x, pad_y = pad
+    boxes = np.zeros((len(keep), 6), dtype=np.float32)
+    boxes[:, 0] = (boxes_xywh[:, 0] - pad_x) / ratio
+    boxes[:, 1] = (boxes_xywh[:, 1] - pad_y) / ratio
+    boxes[:, 2] = (boxes_xywh[:, 0] + boxes_xywh[:, 2] - pad_x) / ratio
+    boxes[:, 3] = (boxes_xywh[:, 1] + boxes_xywh[:, 3] - pad_y) / ratio
+    boxes[:, 4] = predictions[:, 4] # class 0 (person) only
+
+    keypoints = predictions[:, 5:].reshape(-1, 17, 3).astype(np.float32)
+    keypoints[..., 0] = (keypoints[..., 0] - pad_x) / ratio
+    keypoints[..., 1] = (keypoints[..., 1] - pad_y) / ratio
+
+    return PoseResult(
+        keypoints=torch.from_numpy(keypoints).to(device),
+        boxes=torch.from_numpy(boxes).to(device),
+    )
+
+class PoseONNX(PoseYOLO):
+
+    def __init__(self, onnx_path: str, device=None) -> None:
+        # device of the result tensors, inference itself runs on cpu
+        super().__init__(onnx_path, device=device)
+
+    def __load__(self, onnx_path: str):
+        providers = [provider for provider in ONNX_PROVIDERS if provider in onnxruntime.get_available_providers()]
+        self.session = onnxruntime.InferenceSession(onnx_path, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+        self.imgsz = self.session.get_inputs()[0].shape[2]
+        return self.session
+
+    @staticmethod
+    def export(model_path: str, onnx_path: str, imgsz=POSE_ONNX_IMGSZ, int8=False) -> str:
+        """
+            exports the pytorch model to onnx once, int8 quantizes the weights (dynamic quantization).
+        """
+        exported_path = ultralytics.YOLO(model_path).export(format='onnx', imgsz=imgsz, dynamic=False)
+
+        if int8:
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+            quantize_dynamic(exported_path, onnx_path, weight_type=QuantType.QUInt8)
+        elif path.abspath(exported_path) != path.abspath(onnx_path):
+            shutil.move(exported_path, onnx_path)
+
+        return onnx_path
+
+    def __letterbox__(self, image) -> tuple:
+        """
+            resized to fit imgsz keeping the ratio and padded on both sides, returns (blob, ratio, (pad_x, pad_y)).
+        """
+        height, width = image.shape[:2]
+        ratio = min(self.imgsz / height, self.imgsz / width)
+        new_width, new_height = round(width * ratio), round(height * ratio)
+        pad_x, pad_y = (self.imgsz - new_width) / 2, (self.imgsz - new_height) / 2
+
+        resized = cv.resize(image, (new_width, new_height), interpolation=cv.INTER_LINEAR)
+        top, bottom = round(pad_y - 0.1), round(pad_y + 0.1)
+        left, right = round(pad_x - 0.1), round(pad_x + 0.1)
+        padded = cv.copyMakeBorder(resized, top, bottom, left, right, cv.BORDER_CONSTANT, value=LETTERBOX_COLOR)
+
+        # ultralytics takes numpy images as bgr and flips them, flipped the same way so both backends agree
+        blob = cv.dnn.blobFromImage(padded, scalefactor=1 / 255, swapRB=True)
+
+        return (blob, ratio, (left, top))
+
+    @timed('pose')
+    def detect(self, image) -> None:
+        blob, ratio, pad = self.__letterbox__(image)
+        output = self.session.run(None, {self.input_name: blob})[0]
+
+        self.results = [decode_pose_output(output, ratio, pad, device=self.device)]
+        if not self.__detect_evet__.is_set():
+            self.__detect_evet__.set()
+
+
+def load_pose_model(config: dict):
+    """
+        returns the pose model of the configured backend on the configured device, the onnx model
+        is exported on first use.
+    """
+    device = config[cf.RT_DEVICE]
+    if config[cf.INF_POSE_BACKEND] == 'torch':
+        return PoseYOLO(cf.POSE_MODEL_PATH, device=device, half=config[cf.INF_POSE_HALF])
+    if config[cf.INF_POSE_BACKEND] != 'onnx':
+        raise ValueError(f'Unknown pose backend {config[cf.INF_POSE_BACKEND]!r}, expected torch or onnx')
+
+    if config[cf.INF_POSE_HALF]:
+        click.echo('Half precision is only used by the torch pose backend, see pose_int8 for the onnx one.')
+
+    onnx_path = config[cf.INF_POSE_ONNX] or path.splitext(cf.POSE_MODEL_PATH)[0] + ('-int8.onnx' if config[cf.INF_POSE_INT8] else '.onnx')
+    if not path.exists(onnx_path):
+        click.echo(f'Exporting pose model to {onnx_path}...')
+        PoseONNX.export(cf.POSE_MODEL_PATH, onnx_path, int8=config[cf.INF_POSE_INT8])
+
+    return PoseONNX(onnx_path, device=device)
+
+
+
+torch = lazy_import('torch')
 
 """
     This will run the detection of aruco (2 aruco) that will serve as a reference distance
@@ -141,29 +871,110 @@ arucoParams = cv.aruco.DetectorParameters()
 
 class ArucoRef:
 
-    def __init__(self) -> None:
+    def __init__(self, line_y_axis=None, roi_margin=None, subpixel=False, config=None) -> None:
+        config = cf.snapshot() if config is None else config
+        self.line_th = config[cf.TH_ARUCO_LINE]
+        self.body_line_th = config[cf.TH_ARUCO_BODY_LINE]
         
-        self.detector = cv.aruco.ArucoDetector(dictionary=arucoDict, detectorParams=arucoParams)
+        params = arucoParams
+        if subpixel:
+            # refine detected corners up to subpixel accuracy (slower, used on calibration)
+            params = cv.aruco.DetectorParameters()
+            params.cornerRefinementMethod = cv.aruco.CORNER_REFINE_SUBPIX
+
+        self.detector = cv.aruco.ArucoDetector(dictionary=arucoDict, detectorParams=params)
 
         self.arc0 = None
         self.arc1 = None
         self.valid = False
+        # float corners and mid points of the refs by id
+        self.ref_corners = {}
+        self.ref_midpoints = {}
 
-    def find_aruco_ref(self, image, verbose=True) -> bool:
+        # roi tracking, search only around the last known markers (or the calibrated line)
+        self.line_y_axis = line_y_axis
+        self.roi_margin = config[cf.CNFD_ROI_MARGIN] if roi_margin is None else roi_margin
+        self.last_corners = None
+        self.roi = None
+
+    def __search_roi__(self, image):
+        """
+            returns the region (x1, y1, x2, y2) where the aruco refs are expected to be.
+
+            the region is the box of the last known marker corners expanded by the roi margin,
+            or a horizontal band around the calibrated line if markers are not known yet.
+            None means the whole frame must be searched.
+        """
+        if self.roi_margin <= 0:
+            return None
+
+        height, width = image.shape[:2]
+
+        if self.last_corners is not None:
+            x1, y1 = np.min(self.last_corners, axis=0) - self.roi_margin
+            x2, y2 = np.max(self.last_corners, axis=0) + self.roi_margin
+        elif self.line_y_axis is not None:
+            x1, x2 = 0, width
+            y1, y2 = self.line_y_axis - self.roi_margin, self.line_y_axis + self.roi_margin
+        else:
+            return None
+
+        x1, y1 = max(int(x1), 0), max(int(y1), 0)
+        x2, y2 = min(int(x2), width), min(int(y2), height)
+
+        if x2 <= x1 or y2 <= y1:
+            return None
+
+        return (x1, y1, x2, y2)
+
+    def __detect__(self, image):
         corners, markerIDs, _ = self.detector.detectMarkers(image)
+
+        # ids as (n, 1) whatever the opencv version, opencv 5 gives them as (n, )
+        if markerIDs is not None:
+            markerIDs = np.asarray(markerIDs).reshape(-1, 1)
+
+        return corners, markerIDs
+
+    def __detect_markers__(self, image):
+        self.roi = self.__search_roi__(image)
+
+        if self.roi is not None:
+            x1, y1, x2, y2 = self.roi
+            corners, markerIDs = self.__detect__(image[y1:y2, x1:x2])
+
+            if markerIDs is not None and np.isin(ARUCO_REFS_ID, markerIDs).all():
+                # move roi corners back to frame coordinates
+                offset = np.array((x1, y1), dtype=np.float32)
+                corners = tuple(corner + offset for corner in corners)
+                return corners, markerIDs
+
+            # markers are lost within the roi, fallback to full frame detection
+            self.roi = None
+
+        return self.__detect__(image)
+
+    def find_aruco_ref(self, image, verbose=True) -> bool:
+        corners, markerIDs = self.__detect_markers__(image)
         self.corners = corners
         self.markerIDs = markerIDs
 
         self.arc0 = None
         self.arc1 = None
         self.valid = False
+        self.ref_corners = {}
+        self.ref_midpoints = {}
 
         if verbose:
             cv.aruco.drawDetectedMarkers(image, corners)
 
+            if self.roi is not None:
+                x1, y1, x2, y2 = self.roi
+                cv.rectangle(image, pt1=(x1, y1), pt2=(x2, y2), color=Draw.ORANGE, thickness=1)
+
         if len(corners) > 0:
             
-            if np.in1d(ARUCO_REFS_ID, markerIDs).all():
+            if np.isin(ARUCO_REFS_ID, markerIDs).all():
                 self.valid = True
 
             for (corner, id) in zip(corners, markerIDs):
@@ -173,6 +984,11 @@ class ArucoRef:
                 p0, p1, p2, p3 = corner
 
                 midp = find_intersection(p0, p2, p1, p3)
+
+                if id in ARUCO_REFS_ID and midp is not None:
+                    self.ref_corners[id] = corner
+                    self.ref_midpoints[id] = np.array(midp)
+
                 midp = np.int_(midp)
                 
                 if id == 0:
@@ -217,6 +1033,13 @@ class ArucoRef:
                     thickness=1,
                 )
 
+        # remember where the refs are for the next search
+        if self.valid:
+            ref_corners = [corner[0] for (corner, id) in zip(corners, markerIDs) if id[0] in ARUCO_REFS_ID]
+            self.last_corners = np.concatenate(ref_corners)
+        else:
+            self.last_corners = None
+
         return self.valid
 
 
@@ -229,20 +1052,23 @@ class ArucoRef:
         *_, y2 = self.arc1
 
         self.my = int((y1 + y2) / 2)
-        th = cf.get(cf.TH_ARUCO_LINE)
+        th = self.line_th
 
         aligned = is_value_within(y1, self.my, th) and is_value_within(y2, self.my, th)
 
         if verbose:
-            ArucoRef.__draw_ref_lines__(image, self.my, aligned)
+            self.draw_ref_lines(image, self.my, aligned)
 
         return aligned
 
+    def draw_ref_lines(self, image, line_y_axis, isAligned=True) -> None:
+        ArucoRef.__draw_ref_lines__(image, line_y_axis, isAligned, th=self.line_th, body_line_th=self.body_line_th)
+
     @staticmethod
-    def __draw_ref_lines__(image, line_y_axis, isAligned=True):
+    def __draw_ref_lines__(image, line_y_axis, isAligned=True, th=None, body_line_th=None):
         _, width = image.shape[:2]
-        body_line_th = cf.get(cf.TH_ARUCO_BODY_LINE)
-        th = cf.get(cf.TH_ARUCO_LINE)
+        body_line_th = cf.get(cf.TH_ARUCO_BODY_LINE) if body_line_th is None else body_line_th
+        th = cf.get(cf.TH_ARUCO_LINE) if th is None else th
 
         # draw boundary line for aruco ref alignment
         line_bound_1 = (0, line_y_axis + th), (width, line_y_axis + th)
@@ -281,6 +1107,7 @@ class ArucoRef:
             lineType=cv.LINE_AA,
         )
 
+    @timed('aruco')
     def ref_valid(self, image, verbose=True) -> bool:
         arc_present = self.find_aruco_ref(image, verbose)
         if not arc_present:
@@ -292,13 +1119,166 @@ class ArucoRef:
 
     def get_distance(self) -> float:
         return get_distance_of_2_points(torch.from_numpy(self.arc0), torch.from_numpy(self.arc1))
+
+    def get_corners_distances(self):
+        """
+            distances between the corresponding corners (and mid points) of the two refs.
+
+            both cards are printed the same and hung the same way so each corner pair is
+            an independent reading of the same reference distance.
+        """
+        arc0, arc1 = ARUCO_REFS_ID
+
+        corners0 = np.vstack([self.ref_corners[arc0], self.ref_midpoints[arc0]])
+        corners1 = np.vstack([self.ref_corners[arc1], self.ref_midpoints[arc1]])
+
+        return np.linalg.norm(corners1 - corners0, axis=1)
     
     @staticmethod
-    def body_is_within_ref(builtSpec: BuiltSpec, my) -> bool:
+    def body_is_within_ref(builtSpec: BuiltSpec, my, th=None) -> bool:
         # check if bottom point of body is aligned to the aruco reference line
-        body_bottom = builtSpec.bot_bpoint
+        return ArucoRef.point_is_within_ref(builtSpec.bot_bpoint, my, th)
+
+    @staticmethod
+    def point_is_within_ref(point, my, th=None) -> bool:
+        th = cf.get(cf.TH_ARUCO_BODY_LINE) if th is None else th
+
+        return is_value_within(point[1], my, th)
+
+
+REF_PATCH_SIZE = (64, 16) # size of the downscaled gray patch used on drift check
+REF_PATCH_PAD = 8
+REF_FILTER_SIZE = 5 # refreshes the distance is filtered over, one sample each
+
+class ArucoRefCache:
+    """
+        Holds the live aruco reference (filtered pixel distance and line y axis) between refreshes.
+
+        The aruco refs are fixed to the wall so they are only detected every `interval` frames
+        or after `timeout` ms, whichever comes first. In between, a cheap drift check compares a
+        small gray patch around the markers with the one taken on the last refresh and forces a
+        re-detection if it differs more than `drift_th` (markers moved or got covered).
+
+        The filter holds one distance per refresh. It is cleared when a refresh comes from a drift or
+        follows a failed one, the previous distances no longer describe the markers. `reason` keeps why
+        the last refresh happened, refs found again where they were lost are 'recovered' rather than
+        'missing' so estimates built on every detection (see CalibratePipeline) only start over on a move.
+    """
+
+    def __init__(self, aruco_ref: ArucoRef, interval=30, timeout=1000, drift_th=12.0, filter_size=REF_FILTER_SIZE) -> None:
+        self.aruco_ref = aruco_ref
+        self.interval = interval
+        self.timeout = timeout
+        self.drift_th = drift_th
+        self.mfilter = MedianFilter(filter_size)
+
+        self.distance = None
+        self.my = None
+        self.reason = None # of the last refresh
+
+        self.__frames_since_refresh__ = 0
+        self.__last_refresh_time__ = 0
+        self.__patch__ = None
+        self.__patch_roi__ = None
+
+    def __get_ms_time__(self) -> float:
+        return time.monotonic() * 1000
+
+    def __ref_patch__(self, image):
+        x1, y1, x2, y2 = self.__patch_roi__
+        patch = image[y1:y2, x1:x2]
+
+        if patch.ndim == 3:
+            patch = cv.cvtColor(patch, cv.COLOR_BGR2GRAY)
+
+        return cv.resize(patch, REF_PATCH_SIZE, interpolation=cv.INTER_AREA)
+
+    def __is_drifted__(self, image) -> bool:
+        if self.__patch__ is None:
+            return True
+
+        patch = self.__ref_patch__(image)
+        mean_diff = cv.norm(patch, self.__patch__, cv.NORM_L1) / patch.size
+
+        return mean_diff > self.drift_th
+
+    def needs_refresh(self, image) -> bool:
+        return self.__refresh_reason__(image) is not None
+
+    def __refresh_reason__(self, image):
+        """
+            returns why the reference needs a refresh ('missing', 'recovered', 'scheduled' or 'drift'), None if it doesn't.
+        """
+        if self.distance is None:
+            # the patch of the last found refs is kept, refs not moved since they were lost are recovered
+            return 'recovered' if self.__patch__ is not None and not self.__is_drifted__(image) else 'missing'
+
+        # checked first, a drift on a scheduled refresh still resets the filter
+        if self.__is_drifted__(image):
+            return 'drift'
 
-        return is_value_within(body_bottom[1], my, cf.get(cf.TH_ARUCO_BODY_LINE))
+        if self.__frames_since_refresh__ >= self.interval:
+            return 'scheduled'
+
+        if (self.__get_ms_time__() - self.__last_refresh_time__) >= self.timeout:
+            return 'scheduled'
+
+        return None
+
+    def refresh(self, image, verbose=True, reset=False) -> bool:
+        """
+            re-detects the markers, reset drops the filtered distances first.
+        """
+        self.__frames_since_refresh__ = 0
+        self.__last_refresh_time__ = self.__get_ms_time__()
+
+        if reset:
+            self.mfilter.clear()
+
+        # detect without drawing so the patch is taken from the clean image
+        if not self.aruco_ref.ref_valid(image, verbose=False):
+            self.distance = None
+            self.my = None
+            return False
+
+        self.mfilter.insert(float(self.aruco_ref.get_distance()))
+        self.distance = self.mfilter.retrieve()
+        self.my = self.aruco_ref.my
+
+        height, width = image.shape[:2]
+        (x1, y1), (x2, y2) = np.min(self.aruco_ref.last_corners, axis=0), np.max(self.aruco_ref.last_corners, axis=0)
+        self.__patch_roi__ = (
+            max(int(x1) - REF_PATCH_PAD, 0),
+            max(int(y1) - REF_PATCH_PAD, 0),
+            min(int(x2) + REF_PATCH_PAD, width),
+            min(int(y2) + REF_PATCH_PAD, height),
+        )
+        self.__patch__ = self.__ref_patch__(image)
+
+        if verbose:
+            cv.aruco.drawDetectedMarkers(image, self.aruco_ref.corners)
+
+        return True
+
+    def update(self, image, verbose=True) -> bool:
+        """
+            refresh the reference if needed and returns whether a valid reference is held.
+        """
+        self.__frames_since_refresh__ += 1
+
+        reason = self.__refresh_reason__(image)
+        if reason is not None:
+            # after a drift or a failed refresh the markers (or camera) may have moved
+            self.reason = reason
+            self.refresh(image, verbose, reset=reason != 'scheduled')
+
+        if self.distance is None:
+            return False
+
+        if verbose:
+            self.aruco_ref.draw_ref_lines(image, self.my)
+
+        return True
 
 import json
 
@@ -317,58 +1297,245 @@ class BuiltManager:
                 .,
                 .,
             ]
+
+        Builts are kept as columns (labels, widths, heights) sorted by label, the sorted labels are the index
+        searched to find a label. A builts file can be converted once (see import_json) to a .npy store that is
+        memory mapped on load, so large registries are neither parsed nor fully read on start.
+
+        The columns are swapped as a whole on reload so a verify never sees them half updated.
     """
 
-    def __init__(self, builts_path) -> None:
+    def __init__(self, builts_path, tolerance=None) -> None:
         self.builts_path = builts_path
-        self.builts_indx = {}
+        self.tolerance = cf.get(cf.TH_BUILT_TOLERANCE) if tolerance is None else tolerance
+        self.mtime = None # of the builts file when loaded
+        self.columns = (np.array([], dtype=str), np.array([]), np.array([]))
 
-    def __indexized__(self) -> None:
+    @property
+    def labels(self):
+        return self.columns[0]
+
+    @property
+    def widths(self):
+        return self.columns[1]
+
+    @property
+    def heights(self):
+        return self.columns[2]
+
+    @staticmethod
+    def __read_columns__(builts_path) -> tuple:
+        if builts_path.endswith('.npy'):
+            store = np.load(builts_path, mmap_mode='r')
+            return (store['label'], store['width'], store['height'])
+
+        return BuiltManager.__columns_from_json__(builts_path)
+
+    @staticmethod
+    def __columns_from_json__(builts_path) -> tuple:
+        with open(builts_path, 'r') as builts_file:
+            builts = json.load(builts_file)
+
+        # the last built of a label is kept
+        builts_map = {built.get('label'): built for built in builts}
+        labels = sorted(builts_map.keys())
+
+        widths = np.array([builts_map[label].get('width') or 0 for label in labels], dtype=np.float64)
+        heights = np.array([builts_map[label].get('height') or 0 for label in labels], dtype=np.float64)
+
+        return (np.array(labels, dtype=str), widths, heights)
+
+    @staticmethod
+    def import_json(json_path, store_path) -> int:
         """
-            re arranged builts (array of objects) to be accessible easily
-            searchable via label by mapping its index into another object
-            containing label along its index position within the builts
-            array of objects
+            converts a builts json file into a .npy store, returns the number of builts.
         """
+        labels, widths, heights = BuiltManager.__columns_from_json__(json_path)
 
-        builts_indx = {} # label index map
+        store = np.empty(len(labels), dtype=[('label', labels.dtype), ('width', np.float64), ('height', np.float64)])
+        store['label'] = labels
+        store['width'] = widths
+        store['height'] = heights
 
-        for i in range(len(self.builts)):
-            built = self.builts[i]
-            builts_indx[built.get('label')] = i
+        # replaced at once, the previous store may still be memory mapped by a running detect
+        tmp_path = f'{store_path}.tmp.npy'
+        np.save(tmp_path, store)
+        replace(tmp_path, store_path)
 
-        self.builts_indx = builts_indx
+        return len(store)
 
     def load(self) -> None:
-        
-        with open(self.builts_path, 'r') as builts_file:
-            self.builts = json.load(builts_file)
+        self.mtime = path.getmtime(self.builts_path)
+        self.columns = self.__read_columns__(self.builts_path)
+
+    def changed_on_disk(self) -> bool:
+        return path.exists(self.builts_path) and path.getmtime(self.builts_path) != self.mtime
+
+    def reload(self) -> tuple:
+        """
+            reads the builts file again, returns the number of (added, changed, removed) builts.
+        """
+        mtime = path.getmtime(self.builts_path)
+        columns = self.__read_columns__(self.builts_path)
+        delta = self.__delta__(self.columns, columns)
+
+        self.mtime = mtime
+        self.columns = columns
+
+        return delta
+
+    @staticmethod
+    def __delta__(old_columns, new_columns) -> tuple:
+        old_labels, old_widths, old_heights = old_columns
+        new_labels, new_widths, new_heights = new_columns
+
+        kept = np.isin(new_labels, old_labels)
+        removed = int((~np.isin(old_labels, new_labels)).sum())
+
+        # both are sorted by label, compare the builts of the kept labels
+        old_indexes = np.searchsorted(old_labels, new_labels[kept])
+        changed = (np.asarray(old_widths[old_indexes]) != np.asarray(new_widths[kept])) | (np.asarray(old_heights[old_indexes]) != np.asarray(new_heights[kept]))
 
-        self.__indexized__()
+        return (int((~kept).sum()), int(changed.sum()), removed)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @staticmethod
+    def __indexes__(sorted_labels, labels) -> tuple:
+        """
+            returns the (indexes, found) of the labels within the sorted labels.
+        """
+        labels = np.asarray(labels, dtype=str)
+        if not len(sorted_labels):
+            return (np.zeros(len(labels), dtype=np.intp), np.zeros(len(labels), dtype=bool))
+
+        indexes = np.minimum(np.searchsorted(sorted_labels, labels), len(sorted_labels) - 1)
+        return (indexes, sorted_labels[indexes] == labels)
+
+    def verify_many(self, labels, widths, heights):
+        """
+            verify many (label, width, height) at once, returns a bool array.
+        """
+        rlabels, rwidths, rheights = self.columns
+        if not len(rlabels):
+            # no builts loaded, nothing to index
+            return np.zeros(len(labels), dtype=bool)
+
+        indexes, found = self.__indexes__(rlabels, labels)
+
+        rwidths = np.asarray(rwidths[indexes])
+        rheights = np.asarray(rheights[indexes])
+
+        # disregard floating value
+        widths = np.asarray(widths).astype(np.int64)
+        heights = np.asarray(heights).astype(np.int64)
+
+        return (
+            found & (rwidths > 0) & (rheights > 0)
+            & (np.abs(widths - rwidths) <= self.tolerance)
+            & (np.abs(heights - rheights) <= self.tolerance)
+        )
 
     def verify(self, label, built) -> bool:
-        bindx = self.builts_indx.get(label)
+        rlabels, rwidths, rheights = self.columns
+        indexes, found = self.__indexes__(rlabels, [label])
 
-        if bindx == None:
+        if not found[0]:
             return False
 
-        rbuilt = self.builts[bindx]
-        rwidth = rbuilt.get('width')
-        rheight = rbuilt.get('height')
+        bindx = indexes[0]
+        rwidth = rwidths[bindx]
+        rheight = rheights[bindx]
 
-        if rwidth and rwidth:
-            tolerance = cf.get(cf.TH_BUILT_TOLERANCE)
+        if rwidth and rheight:
+            tolerance = self.tolerance
             width, height = built
             # disregard floating value
             width = int(width)
             height = int(height)
             
-            return is_value_within(width, rwidth, tolerance) and is_value_within(height, rheight, tolerance)
+            return bool(is_value_within(width, rwidth, tolerance) and is_value_within(height, rheight, tolerance))
 
         return False
     
+
+class FileWatcher:
+    """
+        Calls poll every `interval` seconds on a background thread.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+
+        self.__stop_event__ = Event()
+        self.__thread__ = None
+
+    def poll(self) -> None:
+        pass
+
+    def __watch__(self) -> None:
+        while not self.__stop_event__.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as e:
+                # a file being written, try again on the next poll
+                click.echo(f'Reload failed: {e}')
+
+    def begin(self) -> None:
+        self.__thread__ = Thread(target=self.__watch__, daemon=True)
+        self.__thread__.start()
+
+    def release(self) -> None:
+        self.__stop_event__.set()
+        if self.__thread__:
+            self.__thread__.join()
+
+
+class GalleryWatcher(FileWatcher):
+    """
+        Polls the known faces directory and the builts file every `interval` seconds on a background thread,
+        added, changed and removed faces are encoded and swapped in the gallery (see FaceRecognition.reload)
+        and the builts are read again when the file changed. Known faces share the embedder of the frames,
+        a frame waits at most for the known face being encoded.
+    """
+
+    def __init__(self, face_recg: FaceRecognition, builtM: BuiltManager, interval: float) -> None:
+        super().__init__(interval)
+        self.face_recg = face_recg
+        self.builtM = builtM
+
+    def poll(self) -> None:
+        if self.face_recg.root_path:
+            added, changed, removed = self.face_recg.reload()
+            if added or changed or removed:
+                click.echo(f'Known faces reloaded: {len(added)} added, {len(changed)} changed, {len(removed)} removed')
+
+        if self.builtM.changed_on_disk():
+            added, changed, removed = self.builtM.reload()
+            click.echo(f'Builts reloaded: {added} added, {changed} changed, {removed} removed')
+
+
+class ConfigWatcher(FileWatcher):
+    """
+        Polls the config.ini file, the keys changed within the file are given to on_change.
+    """
+
+    def __init__(self, on_change, interval: float) -> None:
+        super().__init__(interval)
+        self.on_change = on_change
+
+    def poll(self) -> None:
+        if not cf.changed_on_disk():
+            return
+
+        changes = cf.reload()
+        if changes:
+            click.echo(f'Config reloaded: {", ".join(changes.keys())}')
+            self.on_change(changes)
+
+
 import serial
-import time
 
 class BFALSerialConn:
     """
@@ -388,6 +1555,7 @@ class BFALSerialConn:
         self.window = window
         self.end = end
         self.valid_count = 0
+        self.__last_evict__ = 0
         """
             queues storage contains ff structure
             {
@@ -400,7 +1568,12 @@ class BFALSerialConn:
         """
         self._queues = {}
 
+    @timed('serial')
     def queue(self, label: str, data) -> None:
+        now = self.__get_ms_time__()
+        if now - self.__last_evict__ >= self.window:
+            self.evict(now)
+
         if self._queues.get(label) == None:
             # queue new label with initial count
             self._queues[label] = {
@@ -426,6 +1599,23 @@ class BFALSerialConn:
             # remove to queues
             del self._queues[label]
 
+    def evict(self, now=None) -> int:
+        """
+            removes the labels not queued within the window, their count would be reset anyway.
+            returns the number of removed labels.
+        """
+        now = self.__get_ms_time__() if now is None else now
+        self.__last_evict__ = now
+
+        expired = [
+            label for (label, queue) in self._queues.items()
+            if queue[self.__TIME] and (now - queue[self.__TIME]) >= self.window
+        ]
+        for label in expired:
+            del self._queues[label]
+
+        return len(expired)
+
     def __get_ms_time__(self) -> int:
         return int(time.time() * 1000)
     
@@ -1,14 +1,29 @@
 import cv2 as cv
+import numpy as np
 import torch
 import click
 import serial
-import pkg_resources
+import time
+from queue import (
+    Queue,
+    Full,
+)
+from threading import (
+    Event,
+    Thread,
+)
 
 from bfal.scripts.core import (
-    PoseYOLO,
+    load_pose_model,
+    load_face_embedder,
     FaceRecognition,
+    PendingFaces,
+    FaceQuality,
     ArucoRef,
+    ArucoRefCache,
     BuiltManager,
+    GalleryWatcher,
+    ConfigWatcher,
     BFALSerialConn,
     UNKNOWN_PERSON_LABEL,
 )
@@ -20,230 +35,1128 @@ from bfal.specs import (
 )
 
 from bfal.utils import (
-    AsyncVideoCapture,
+    open_video_capture,
+    ImageScaler,
+    FrameBuffers,
     FPS,
+    metrics,
+    MetricsServer,
+    MemoryMonitor,
+    StageOccupancy,
     MedianFilter,
+    MotionGate,
+    ResultLog,
+    REPLAY_COLUMNS,
+    REPLAY_PREFIX,
+    landmarks_to_array,
     crop_9_16,
+    synthetic_person,
     Draw,
 )
 
 import bfal.config as cf
-
-torch.set_default_device('cuda')
-
-# camera defaults
-TARGET_CAMERA = cf.get(cf.CAM_TARGET)
-USE_LIVE_REF = cf.get(cf.CNFD_USE_LIVE_REF)
-# aruco ref line config
-REAL_DISTANCE = cf.get(cf.CNFD_VALUE)
-UNIT = cf.get(cf.CNFD_UNIT)
-PIXEL_DISTANCE = cf.get(cf.CNFD_DIST_PIXEL)
-REF_LINE_Y_AXIS = cf.get(cf.CNFD_LINE_Y_AXIS)
+from bfal.thresholds import Thresholds
 
 SERIAL_RECOGNIZE_MSG = b'1'
 SERIAL_NOT_RECOGNIZE_MSG = b'0'
 
-# core
-pose_yolo = PoseYOLO(pkg_resources.resource_filename('bfal', '/configs/models/yolov8-pose.pt'))
-face_recg = FaceRecognition(cf.get(cf.PATH_FACES))
-arc_ref = ArucoRef()
-builtM = BuiltManager(cf.get(cf.PATH_BUILTS))
-
-# load builts json
-builtM.load()
-
-# serial connection
-ser = None
-serial_conn = None
-try:
-    port = cf.get(cf.SERIAL_PORT)
-    click.echo(f'Connecting to PORT: {port}')
-    ser = serial.Serial()
-    ser.port = port
-    ser.baudrate = cf.get(cf.SERIAL_BAUDRATE)
-    ser.open()
-    serial_conn = BFALSerialConn(
-        serial=ser, 
-        th=cf.get(cf.TH_SERIAL_CONSISTENCY_REQ),
-        window=cf.get(cf.TH_SERIAL_WINDOW),
-    )
-    click.echo(f'Connected to port:{port}')
-except Exception as e:
-    click.echo(e)
-
-# initialize video capture
-cap = AsyncVideoCapture(TARGET_CAMERA)
-cap.set(cv.CAP_PROP_FRAME_WIDTH, cf.get(cf.CAM_WIDTH))
-cap.set(cv.CAP_PROP_FRAME_HEIGHT, cf.get(cf.CAM_HEIGHT))
-
-# define FPS
-fps = FPS()
-
-# filters
-arc_ref_mfilt = MedianFilter(50)
-width_mfilt = MedianFilter(16)
-height_mfilt = MedianFilter(16)
-
-# 
-last_person_width_read = 0
-last_person_height_read = 0
-last_person_label_read = None
-
-# begin capture
-cap.begin()
-fps.init()
-while True:
-    ret, frame = cap.read()
-
-    # init variables
-    faces_count = 0
-    known_faces_count = 0
-    body_count = 0
-    valid_body_count = 0
-    person_width = 0
-    person_height = 0
-    person_label = None
-    fdistance = None # filtered distance ref
-
-    if not ret:
-        break
-
-    # frame = cv.flip(frame, flipCode=1)
-    # frame = imutils.resize(frame, width=480)
-
-    frame = crop_9_16(frame)
-    insp_frame = frame.copy()
-    rgb_frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
-
-    # detect pose async
-    pose_yolo.detect_async(rgb_frame)
-
-    # detect face async
-    faces_spec = face_recg.process(rgb_frame) # return lists of face spec
-
-    # check for aruco distance reference
-    if USE_LIVE_REF:
-        arc_ref_valid = arc_ref.ref_valid(frame, filter=False)
-        if arc_ref_valid:
-            arc_ref_dist = arc_ref.get_distance()
-
-            arc_ref_mfilt.insert(arc_ref_dist)
-            fdistance = arc_ref_mfilt.retrieve() # get filtered distance
-    else:
-        fdistance = PIXEL_DISTANCE
-        ArucoRef.__draw_ref_lines__(frame, REF_LINE_Y_AXIS)
-
-    # draw face rect and landmarks
-    faces_count = len(faces_spec)
-    for fspec in faces_spec:
-        fspec.drawIn(frame, includeLandMarks=False)
-        
-        if fspec.label != UNKNOWN_PERSON_LABEL:
-            known_faces_count += 1
-
-    # get lists of pose results
-    pose_results = pose_yolo.get_result()
-
-    if pose_results:
-        pose_results = pose_results[0]
-        body_count = len(pose_results)
-
-        # analyze pose results check if body is aligned and match it to their corresponding faces
-        # if body is aligned and face is present, check if body built and face is known
-        for (keypoints, box) in zip(pose_results.keypoints.data, pose_results.boxes.data):
-            body_spec = BodySpec(image=insp_frame, imageLog=frame, verbose=True, keypoints=keypoints, box=box)
-            is_body_firm = body_spec.body_is_firm()
-            is_head_firm = body_spec.head_is_firm()
-
-            if is_body_firm and is_head_firm and faces_spec:
-                # check if detected body is inside the reference line
-                body_within_ref_line = ArucoRef.body_is_within_ref(blt_spec, arc_ref.my if USE_LIVE_REF else REF_LINE_Y_AXIS)
-                if not body_within_ref_line:
-                    break # ignore this detected person even has valid built
+WINDOW_NAME = 'Built-Face Detection'
 
-                # increment valid body count
-                valid_body_count += 1
+
+def downscale(image, scale: float, scalers: dict, buffers=None):
+    """
+        returns the (image, scaler) of the image downscaled by scale, (image, None) if not downscaled.
+        scalers holds the scalers of the current frame so a scale shared by stages is only resized once,
+        the downscaled image is written on a reused buffer when FrameBuffers are given.
+    """
+    if scale >= 1.0:
+        return (image, None)
+
+    scaler = scalers.get(scale)
+    if scaler is None:
+        scaler = scalers[scale] = ImageScaler(image)
+        if buffers is None:
+            scaler.scale_image_by_factor(scale)
+        else:
+            height, width = image.shape[:2]
+            scaled_width = int(width * scale)
+            scaled_height = int(height * scaled_width / width)
+            dst = buffers.get(f'scale_{scale}', (scaled_height, scaled_width) + image.shape[2:], image.dtype)
+            scaler.scaled_image = cv.resize(image, (scaled_width, scaled_height), dst=dst, interpolation=cv.INTER_AREA)
+            scaler.scale_factor = scaled_width / width
+
+    return (scaler.get_scaled_image(), scaler)
+
+
+def connect_serial(config: dict):
+    """
+        opens the configured serial port, returns None if it can't be opened.
+    """
+    try:
+        port = config[cf.SERIAL_PORT]
+        click.echo(f'Connecting to PORT: {port}')
+        ser = serial.Serial()
+        ser.port = port
+        ser.baudrate = config[cf.SERIAL_BAUDRATE]
+        ser.open()
+        click.echo(f'Connected to port:{port}')
+        return ser
+    except Exception as e:
+        click.echo(e)
+        return None
+
+
+def open_results_log(config: dict) -> ResultLog:
+    results_log = ResultLog(config[cf.PATH_RESULTS_LOG], chunk_records=config[cf.RT_LOG_CHUNK_RECORDS])
+    results_log.begin()
+    click.echo(f'Logging results to {config[cf.PATH_RESULTS_LOG]}')
+    return results_log
+
+
+def open_replay_log(config: dict) -> ResultLog:
+    replay_log = ResultLog(config[cf.PATH_REPLAY_LOG], chunk_records=config[cf.RT_LOG_CHUNK_RECORDS], prefix=REPLAY_PREFIX, columns=REPLAY_COLUMNS)
+    replay_log.begin()
+    click.echo(f'Recording bodies for `bfal tune` to {config[cf.PATH_REPLAY_LOG]}')
+    return replay_log
+
+
+class DetectResult:
+    """
+        Counts and measurement of a processed frame.
+    """
+
+    def __init__(self, frame) -> None:
+        self.frame = frame
+        self.faces_count = 0
+        self.known_faces_count = 0
+        self.body_count = 0
+        self.valid_body_count = 0
+        self.person_width = 0
+        self.person_height = 0
+        self.person_label = None
+        self.person_is_known = None
+        self.idle = False # no motion, the detection was skipped
+
+
+class FrameWork:
+    """
+        State of a frame handed from the inference stage to the post processing stage.
+    """
+
+    def __init__(self, frame, frame_start: int, thresholds: Thresholds, verbose=False) -> None:
+        self.frame = frame
+        self.frame_start = frame_start
+        self.thresholds = thresholds # snapshot the frame is processed with
+        self.verbose = verbose
+        self.result = DetectResult(frame)
+
+        self.face_frame = None
+        self.face_scaler = None
+        self.pending_faces = None # submitted on the infer stage, collected on the post stage (searched there with cascade)
+        self.keypoints_data = None
+        self.boxes_data = None
+        self.ref_line_y_axis = None
+        self.fdistance = None
+
+
+class DetectPipeline:
+    """
+        Built and face detection over a video capture.
+
+        All settings are read from the given config (see bfal.config.snapshot) so several
+        pipelines can run in one process. Models can be injected to share them.
+
+        usage:
+            pipeline = DetectPipeline(cf.snapshot())
+            pipeline.start()
+            while (result := pipeline.step()) is not None:
+                ...
+            pipeline.stop()
+
+        or pipeline.run() to process until the source ends (or q is pressed on the display).
+    """
+
+    def __init__(self, config: dict, pose_yolo=None, face_recg=None, builtM=None, capture=None, ser=None, results_log=None, replay_log=None, name=WINDOW_NAME) -> None:
+        self.config = config
+        self.name = name
+
+        self.headless = config[cf.CAM_HEADLESS]
+        self.__window_open__ = False # once shown, only this window is closed on stop
+        self.use_live_ref = config[cf.CNFD_USE_LIVE_REF]
+        # aruco ref line config
+        self.real_distance = config[cf.CNFD_VALUE]
+        self.unit = config[cf.CNFD_UNIT]
+        self.pixel_distance = config[cf.CNFD_DIST_PIXEL]
+        self.ref_line_y_axis = config[cf.CNFD_LINE_Y_AXIS]
+        # inference resolution, fractions of the frame width
+        self.pose_scale = config[cf.INF_POSE_SCALE]
+        self.face_scale = config[cf.INF_FACE_SCALE]
+        self.face_quality = None
+        # posture first, faces are only searched on the heads of valid bodies
+        self.cascade = config[cf.INF_CASCADE]
+        # dummy frames pushed through every stage on start
+        self.warmup_frames = config[cf.INF_WARMUP_FRAMES]
+        self.warmup_seconds = 0.0
+        self.first_frame_seconds = None # from start to the first frame with a valid body
+        self.__start_ns__ = None
+        # detection is skipped while there is no motion
+        self.motion_gate = None
+        if config[cf.INF_IDLE_GATE]:
+            self.motion_gate = MotionGate(
+                region=config[cf.INF_MOTION_REGION],
+                threshold=config[cf.INF_MOTION_THRESHOLD],
+                min_area=config[cf.INF_MOTION_MIN_AREA],
+                wake_frames=config[cf.INF_MOTION_WAKE_FRAMES],
+                idle_frames=config[cf.INF_MOTION_IDLE_FRAMES],
+            )
+
+        # core
+        self.pose_yolo = pose_yolo
+        self.face_recg = face_recg
+        self.__owns_face_recg__ = face_recg is None
+        self.builtM = builtM
+        self.cap = capture
+        self.arc_ref = None
+        self.arc_ref_cache = None
+        self.watchers = []
+
+        # thresholds snapshot, replaced between frames when the config file changes (see update_config)
+        self.thresholds = Thresholds.from_config(config)
+        self.__config_version__ = 0
+        self.__pending_config__ = (0, config, self.thresholds)
+        # thresholds the objects read by each stage were last set from, see __apply_thresholds__
+        self.__stage_thresholds__ = {'infer': self.thresholds, 'post': self.thresholds}
+
+        if config[cf.INF_FACE_QUALITY]:
+            self.face_quality = FaceQuality(
+                min_size=self.thresholds.face_min_size,
+                min_sharpness=self.thresholds.face_min_sharpness,
+                max_yaw=self.thresholds.face_max_yaw,
+                visibility_th=self.thresholds.face_visibility,
+            )
+
+        # pose output of the current frame, see __wait_pose__
+        self.__pose__ = None
+
+        # serial connection, a shared one can be given
+        self.ser = ser
+        self.serial_conn = None
+        self.__owns_serial__ = ser is None
+
+        # per frame results sink, a shared one can be given
+        self.results_log = results_log
+        self.__owns_results_log__ = results_log is None
+        # bodies, faces and reference of each frame, replayed by `bfal tune`
+        self.replay_log = replay_log
+        self.__owns_replay_log__ = replay_log is None
+
+        self.fps = FPS()
+
+        # with a depth, the inference of the next frames runs on its own thread while a frame is post processed,
+        # up to `depth` inferred frames wait in between
+        self.pipeline_depth = config[cf.RT_PIPELINE_DEPTH]
+        self.occupancy = StageOccupancy()
+        self.__work_queue__ = None
+        self.__infer_thread__ = None
+        self.__infer_stop__ = Event()
+
+        # frames in flight each need their own buffers, the queued ones plus one per stage
+        self.buffer_slots = [FrameBuffers() for _ in range(self.pipeline_depth + 2 if self.pipeline_depth else 1)]
+        self.buffers = self.buffer_slots[0]
+        self.__buffers_slot__ = -1
+
+        # filters
+        self.width_mfilt = MedianFilter(16)
+        self.height_mfilt = MedianFilter(16)
+
+        self.last_person_width_read = 0
+        self.last_person_height_read = 0
+        self.last_person_label_read = None
+
+    def start(self) -> None:
+        self.__start_ns__ = time.perf_counter_ns()
+        torch.set_default_device(self.config[cf.RT_DEVICE])
+
+        if self.pose_yolo is None:
+            self.pose_yolo = load_pose_model(self.config)
+
+        if self.face_recg is None:
+            self.face_recg = FaceRecognition(
+                self.config[cf.PATH_FACES],
+                workers=self.config[cf.RT_FACE_WORKERS],
+                embedder=load_face_embedder(self.config),
+                pool_slots=self.config[cf.CAM_RING_SLOTS],
+                device=self.config[cf.RT_DEVICE],
+            )
+
+        if self.builtM is None:
+            # load builts json
+            self.builtM = BuiltManager(self.config[cf.PATH_BUILTS], tolerance=self.config[cf.TH_BUILT_TOLERANCE])
+            self.builtM.load()
+
+        # injected models and config are reloaded by their owner
+        if self.__owns_face_recg__ and self.config[cf.RT_RELOAD_INTERVAL] > 0:
+            self.watchers = [
+                GalleryWatcher(self.face_recg, self.builtM, interval=self.config[cf.RT_RELOAD_INTERVAL]),
+                ConfigWatcher(self.update_config, interval=self.config[cf.RT_RELOAD_INTERVAL]),
+            ]
+            for watcher in self.watchers:
+                watcher.begin()
+
+        self.arc_ref = ArucoRef(line_y_axis=self.ref_line_y_axis, config=self.config)
+        self.arc_ref_cache = ArucoRefCache(
+            self.arc_ref,
+            interval=self.config[cf.CNFD_LIVE_REF_INTERVAL],
+            timeout=self.config[cf.CNFD_LIVE_REF_TIMEOUT],
+            drift_th=self.config[cf.CNFD_LIVE_REF_DRIFT],
+        )
+
+        if self.__owns_serial__:
+            self.ser = connect_serial(self.config)
+
+        if self.__owns_results_log__ and self.config[cf.PATH_RESULTS_LOG]:
+            self.results_log = open_results_log(self.config)
+
+        if self.__owns_replay_log__ and self.config[cf.PATH_REPLAY_LOG]:
+            self.replay_log = open_replay_log(self.config)
+
+        if self.ser:
+            # consensus state is per pipeline even on a shared port
+            self.serial_conn = BFALSerialConn(
+                serial=self.ser,
+                th=self.config[cf.TH_SERIAL_CONSISTENCY_REQ],
+                window=self.config[cf.TH_SERIAL_WINDOW],
+            )
+
+        if self.warmup_frames:
+            self.warm_up(self.warmup_frames)
+
+        # initialize video capture
+        if self.cap is None:
+            self.cap = open_video_capture(self.config[cf.CAM_SOURCE], self.config[cf.CAM_TARGET])
+            self.cap.set(cv.CAP_PROP_FRAME_WIDTH, self.config[cf.CAM_WIDTH])
+            self.cap.set(cv.CAP_PROP_FRAME_HEIGHT, self.config[cf.CAM_HEIGHT])
+
+        # begin capture
+        self.cap.begin()
+        self.fps.init()
+
+        if self.pipeline_depth:
+            self.__work_queue__ = Queue(maxsize=self.pipeline_depth)
+            self.__infer_thread__ = Thread(target=self.__infer_loop__, daemon=True)
+            self.__infer_thread__.start()
+
+    @torch.inference_mode()
+    def warm_up(self, frames: int) -> float:
+        """
+            pushes dummy frames of the capture resolution through every stage, so models are loaded and
+            kernels picked before the first real frame. returns the seconds it took.
+        """
+        start = time.perf_counter_ns()
+
+        frame = crop_9_16(np.full((self.config[cf.CAM_HEIGHT], self.config[cf.CAM_WIDTH], 3), 114, dtype=np.uint8))
+        rgb_frame = cv.cvtColor(frame, cv.COLOR_BGR2RGB)
+        scalers = {}
+        pose_frame, _ = downscale(rgb_frame, self.pose_scale, scalers)
+        face_frame, _ = downscale(rgb_frame, self.face_scale, scalers)
+
+        # a person is drawn by no model, its keypoints and face location are given to the later stages
+        keypoints, box, _, _ = synthetic_person(frame.shape, self.ref_line_y_axis)
+        face_location = synthetic_person(face_frame.shape)[2]
+
+        for _ in range(frames):
+            self.pose_yolo.detect(pose_frame)
+            self.face_recg.warm_up(face_frame, [face_location])
+            if self.use_live_ref:
+                self.arc_ref.find_aruco_ref(frame, verbose=False)
+
+            body_spec = BodySpec(image=frame, imageLog=frame, verbose=False, keypoints=keypoints, box=box, thresholds=self.thresholds)
+            body_spec.body_is_firm()
+            body_spec.head_is_firm()
+
+        # warm-up latencies are not frame latencies
+        metrics.reset()
+
+        self.warmup_seconds = (time.perf_counter_ns() - start) / 1e9
+        return self.warmup_seconds
+
+    def update_config(self, changes: dict) -> None:
+        """
+            validates the changed config values, they are applied before the next frame.
+            raises ValueError if a threshold is not valid, the current ones are then kept.
+        """
+        config = dict(self.config)
+        config.update(changes)
+        thresholds = Thresholds.from_config(config)
+
+        # a single assignment, step never sees a config without its thresholds
+        self.__pending_config__ = (self.__pending_config__[0] + 1, config, thresholds)
+
+    def __apply_config__(self) -> None:
+        """
+            swaps the config and thresholds snapshot between two steps, on the thread calling step.
+            the next inferred frame takes the new thresholds, each stage applies them when it gets to
+            that frame (see __apply_thresholds__) so a frame is processed with a single snapshot.
+        """
+        version, config, thresholds = self.__pending_config__
+        if version == self.__config_version__:
+            return
+
+        self.__config_version__ = version
+        self.config = config
+        self.thresholds = thresholds
+
+    def __apply_thresholds__(self, stage: str, thresholds: Thresholds) -> None:
+        """
+            sets the thresholds of the objects read by the stage (infer or post) from the snapshot of its
+            frame, only the stage reading an object writes it.
+        """
+        if self.__stage_thresholds__[stage] is thresholds:
+            return
+
+        self.__stage_thresholds__[stage] = thresholds
+
+        if stage == 'infer':
+            self.arc_ref.line_th = thresholds.aruco_line
+            self.arc_ref.body_line_th = thresholds.aruco_body_line
+        else:
+            self.builtM.tolerance = thresholds.built_tolerance
+            if self.serial_conn:
+                self.serial_conn.th = thresholds.serial_consistency_req
+                self.serial_conn.window = thresholds.serial_window
+
+        # faces are filtered on the post stage with cascade, on the infer stage otherwise
+        if self.face_quality and (stage == 'post') == self.cascade:
+            self.face_quality.min_size = thresholds.face_min_size
+            self.face_quality.min_sharpness = thresholds.face_min_sharpness
+            self.face_quality.max_yaw = thresholds.face_max_yaw
+            self.face_quality.visibility_th = thresholds.face_visibility
+
+    def __wait_pose__(self, pose_scaler) -> tuple:
+        """
+            waits for the pose inference of the current frame, returns its (keypoints, boxes) on the frame,
+            (None, None) if there are no results.
+        """
+        if self.__pose__ is None:
+            keypoints_data, boxes_data = None, None
+            pose_results = self.pose_yolo.get_result()
+
+            if pose_results:
+                keypoints_data = pose_results[0].keypoints.data
+                boxes_data = pose_results[0].boxes.data
+                if pose_scaler is not None:
+                    keypoints_data = pose_scaler.transform_points(keypoints_data)
+                    boxes_data = pose_scaler.transform_box(boxes_data)
+
+            self.__pose__ = (keypoints_data, boxes_data)
+
+        return self.__pose__
+
+    def __record_replay__(self, keypoints_data, boxes_data, faces_spec, ref_line_y_axis, fdistance) -> None:
+        """
+            records every body of the frame (not only the firm ones) with the face containing its nose.
+        """
+        now = time.time()
+        for (keypoints, box) in zip(keypoints_data.cpu().numpy(), boxes_data.cpu().numpy()):
+            (nose_x, nose_y) = keypoints[0, :2]
+            face_spec = next((
+                fspec for fspec in faces_spec
+                if fspec.location[3] <= nose_x <= fspec.location[1] and fspec.location[0] <= nose_y <= fspec.location[2]
+            ), None)
+
+            self.replay_log.append(
+                time=now,
+                frame=self.fps.frames,
+                camera=self.name,
+                keypoints=keypoints,
+                box=box[:4],
+                has_face=face_spec is not None,
+                face_label=face_spec.label if face_spec is not None else '',
+                landmarks=landmarks_to_array(face_spec.land_marks) if face_spec is not None else np.nan,
+                ref_y=ref_line_y_axis if ref_line_y_axis is not None else np.nan,
+                ref_distance=fdistance or np.nan,
+                real_distance=self.real_distance,
+            )
+
+    @torch.inference_mode()
+    def __infer__(self) -> 'FrameWork':
+        """
+            first stage of a frame: capture, inference and aruco reference, returns None once the capture
+            has no more frames.
+        """
+        frame_start = time.perf_counter_ns()
+        # swapped by step on the main thread, the frame keeps the snapshot read here
+        thresholds = self.thresholds
+        self.__apply_thresholds__('infer', thresholds)
+        self.__pose__ = None
+        ret, frame = self.cap.read()
+
+        if not ret:
+            return None
+
+        # frame = cv.flip(frame, flipCode=1)
+        # frame = imutils.resize(frame, width=480)
+
+        # crop is a view, the frame is only drawn on when displayed and no stage reads it after,
+        # the rgb frame and downscaled frames are written on reused buffers (a set per frame in flight)
+        self.__buffers_slot__ = (self.__buffers_slot__ + 1) % len(self.buffer_slots)
+        buffers = self.buffers = self.buffer_slots[self.__buffers_slot__]
+        buffers.next_frame()
+        frame = crop_9_16(frame)
+
+        work = FrameWork(frame, frame_start, thresholds, verbose=not self.headless)
+
+        if self.motion_gate is not None and not self.motion_gate.update(frame):
+            # empty scene, none of the inference stages run until motion is back
+            work.result.idle = True
+            return work
+
+        rgb_frame = buffers.cvt_color('rgb', frame, cv.COLOR_BGR2RGB)
+
+        # inference on downscaled frames, results are mapped back to the frame so builts stay in calibrated pixels
+        scalers = {}
+        pose_frame, pose_scaler = downscale(rgb_frame, self.pose_scale, scalers, buffers)
+        work.face_frame, work.face_scaler = downscale(rgb_frame, self.face_scale, scalers, buffers)
+
+        if self.cascade:
+            # faces are only searched on the heads of the bodies passing the posture checks, see __post__
+            self.pose_yolo.detect(pose_frame)
+        else:
+            # detect pose async
+            self.pose_yolo.detect_async(pose_frame)
+
+            # detect face async, the face workers encode them until the post stage
+            work.pending_faces = self.__process_faces__(work, get_keypoints=lambda: self.__wait_pose__(pose_scaler)[0])
+
+        # check for aruco distance reference
+        if self.use_live_ref:
+            # reference is held between refreshes, markers are only detected on schedule or on drift
+            if self.arc_ref_cache.update(frame, verbose=work.verbose):
+                work.fdistance = self.arc_ref_cache.distance # get filtered distance
+            work.ref_line_y_axis = self.arc_ref_cache.my
+        else:
+            work.fdistance = self.pixel_distance
+            work.ref_line_y_axis = self.ref_line_y_axis
+            if work.verbose:
+                self.arc_ref.draw_ref_lines(frame, self.ref_line_y_axis)
+
+        # get lists of pose results
+        work.keypoints_data, work.boxes_data = self.__wait_pose__(pose_scaler)
+
+        return work
+
+    def __process_faces__(self, work: 'FrameWork', get_keypoints=None, regions=None) -> PendingFaces:
+        return self.face_recg.submit(
+            work.face_frame,
+            scaler=work.face_scaler,
+            quality=self.face_quality,
+            get_keypoints=get_keypoints,
+            regions=regions,
+        ) # face specs are returned by face_recg.collect
+
+    @torch.inference_mode()
+    def __post__(self, work: 'FrameWork') -> DetectResult:
+        """
+            second stage of a frame: posture checks, face matching, built estimation, serial and logs.
+        """
+        result = work.result
+        frame = work.frame
+        verbose = work.verbose
+        thresholds = work.thresholds
+        self.__apply_thresholds__('post', thresholds)
+        ref_line_y_axis = work.ref_line_y_axis
+        fdistance = work.fdistance # filtered distance ref
+        keypoints_data, boxes_data = work.keypoints_data, work.boxes_data
+
+        if result.idle:
+            self.fps.stop()
+            self.fps.update()
+            metrics.record('idle_frame', time.perf_counter_ns() - work.frame_start)
+            metrics.tick()
+            return result
+
+        bodies_spec = []
+        if keypoints_data is not None:
+            result.body_count = len(boxes_data)
+
+            for (keypoints, box) in zip(keypoints_data, boxes_data):
+                body_spec = BodySpec(image=frame, imageLog=frame, verbose=verbose, keypoints=keypoints, box=box, thresholds=thresholds)
+                is_body_firm = body_spec.body_is_firm()
+                is_head_firm = body_spec.head_is_firm()
+
+                if is_body_firm and is_head_firm:
+                    bodies_spec.append(body_spec)
+
+        faces_spec = []
+        if self.cascade:
+            # heads of the firm bodies standing on the reference line, on the face frame
+            scale = work.face_scaler.scale_factor if work.face_scaler is not None else 1.0
+            regions = [
+                tuple(int(value * scale) for value in body_spec.get_head_region())
+                for body_spec in bodies_spec
+                if ref_line_y_axis is not None and ArucoRef.point_is_within_ref(body_spec.get_mid_bottom(), ref_line_y_axis, th=thresholds.aruco_body_line)
+            ]
+            if regions:
+                faces_spec = self.face_recg.collect(self.__process_faces__(work, get_keypoints=lambda: keypoints_data, regions=regions))
+        else:
+            faces_spec = self.face_recg.collect(work.pending_faces)
+
+        if self.replay_log and keypoints_data is not None:
+            self.__record_replay__(keypoints_data, boxes_data, faces_spec, ref_line_y_axis, fdistance)
+
+        # draw face rect and landmarks
+        result.faces_count = len(faces_spec)
+        for fspec in faces_spec:
+            if verbose:
+                fspec.drawIn(frame, includeLandMarks=False)
+
+            if fspec.label != UNKNOWN_PERSON_LABEL:
+                result.known_faces_count += 1
+
+        if bodies_spec:
+            # analyze pose results check if body is aligned and match it to their corresponding faces
+            # if body is aligned and face is present, check if body built and face is known
+            for body_spec in bodies_spec:
+                if not faces_spec:
+                    break
 
                 # find the face of body_spec
                 face_spec = FaceSpec.pop_fspec(faces_spec=faces_spec, bspec=body_spec)
-                
-                # body_spec face is present
-                if face_spec != None:
 
-                    person_label = face_spec.label
-                    blt_spec = BuiltSpec(bodySpec=body_spec, faceSpec=face_spec)
+                # body_spec face is not present
+                if face_spec == None:
+                    continue
+
+                blt_spec = BuiltSpec(bodySpec=body_spec, faceSpec=face_spec)
+
+                # check if detected body is inside the reference line
+                if ref_line_y_axis is None or not ArucoRef.body_is_within_ref(blt_spec, ref_line_y_axis, th=thresholds.aruco_body_line):
+                    continue # ignore this detected person even has valid built
+
+                # increment valid body count
+                result.valid_body_count += 1
+
+                result.person_label = face_spec.label
+                if verbose:
                     blt_spec.drawIn(frame)
 
-                    px_width, px_height = blt_spec.getBuilt()
-
-                    # filter built values
-                    width_mfilt.insert(px_width)
-                    height_mfilt.insert(px_height)
-
-                    fwidth = width_mfilt.retrieve()
-                    fheight = height_mfilt.retrieve()
-
-                    if fdistance:
-                        # do conversion
-                        rwdst_ratio = REAL_DISTANCE / fdistance
-
-                        # real world measurement
-                        rw_width = fwidth * rwdst_ratio
-                        rw_height = fheight * rwdst_ratio
-
-                        person_width = rw_width
-                        person_height = rw_height
-                        person_label = fspec.label              
-
-                        last_person_width_read = rw_width
-                        last_person_height_read = rw_height
-                        last_person_label_read = fspec.label
-
-                        # verify if face and builts is within the json builts
-                        person_is_known = builtM.verify(person_label, (rw_width, rw_height))
-
-                        if serial_conn:
-                            # send status signal to serial port
-                            message = SERIAL_RECOGNIZE_MSG if person_is_known else SERIAL_NOT_RECOGNIZE_MSG
-                            serial_conn.queue(person_label, data=message)
-
-    # log FPS
-    fps.stop()
-    fps_val = fps.value()
-    cv.putText(
-        frame,
-        text=f'FPS:{fps_val:.2f}',
-        fontFace=cv.FONT_HERSHEY_PLAIN,
-        org=(0, 16),
-        color=(0, 255, 0),
-        fontScale=1,
-        thickness=2,
-    )
-
-    # echo logs
-    click.clear()
-    click.echo(f'Face: Detected={faces_count}, Known={known_faces_count}')
-    click.echo(f'Body: Detected={body_count}, Valid={valid_body_count}')
-    click.echo('-'*64)
-    click.echo(f'Result: Width={person_width:.2f}{UNIT}, Height={person_height:.2f}{UNIT}, label={person_label}')
-    click.echo(f'Last Valid Result: Width={last_person_width_read:.2f}{UNIT}, Height={last_person_height_read:.2f}{UNIT}, label={last_person_label_read}')
-
-    # draw crosshairs
-    Draw.crosshairs(frame, color=Draw.ORANGE)
-    # draw ruler
-    # Draw.ruler(frame, org=(64, REF_LINE_Y_AXIS), gap=10)
-
-    # show image
-    cv.imshow('Built-Face Detection', frame)
-
-    fps.update()
-
-    key = cv.waitKey(1)
-    if key == ord('q'):
-        break
-
-# cleaning
-if ser:
-    ser.close()
-cap.release()
-cv.destroyAllWindows()
\ No newline at end of file
+                px_width, px_height = blt_spec.getBuilt()
+
+                # filter built values
+                self.width_mfilt.insert(px_width)
+                self.height_mfilt.insert(px_height)
+
+                fwidth = self.width_mfilt.retrieve()
+                fheight = self.height_mfilt.retrieve()
+
+                if fdistance:
+                    # do conversion
+                    rwdst_ratio = self.real_distance / fdistance
+
+                    # real world measurement
+                    rw_width = fwidth * rwdst_ratio
+                    rw_height = fheight * rwdst_ratio
+
+                    result.person_width = rw_width
+                    result.person_height = rw_height
+
+                    self.last_person_width_read = rw_width
+                    self.last_person_height_read = rw_height
+                    self.last_person_label_read = face_spec.label
+
+                    # verify if face and builts is within the json builts
+                    result.person_is_known = self.builtM.verify(face_spec.label, (rw_width, rw_height))
+
+                    if self.serial_conn:
+                        # send status signal to serial port
+                        message = SERIAL_RECOGNIZE_MSG if result.person_is_known else SERIAL_NOT_RECOGNIZE_MSG
+                        self.serial_conn.queue(face_spec.label, data=message)
+
+        if self.results_log:
+            self.results_log.append(
+                time=time.time(),
+                frame=self.fps.frames,
+                camera=self.name,
+                faces_count=result.faces_count,
+                known_faces_count=result.known_faces_count,
+                body_count=result.body_count,
+                valid_body_count=result.valid_body_count,
+                person_width=result.person_width,
+                person_height=result.person_height,
+                person_label=result.person_label or '',
+                person_is_known=-1 if result.person_is_known is None else int(result.person_is_known),
+            )
+
+        self.fps.stop()
+        self.fps.update()
+        metrics.record('frame', time.perf_counter_ns() - work.frame_start)
+        metrics.tick()
+
+        return result
+
+    def __infer_loop__(self) -> None:
+        """
+            runs the inference stage ahead of the post processing, frames are queued in order.
+        """
+        while not self.__infer_stop__.is_set():
+            stage_start = time.perf_counter_ns()
+            try:
+                work = self.__infer__()
+            except Exception as e:
+                work = e # raised by step on the post processing thread
+            self.occupancy.add('infer', time.perf_counter_ns() - stage_start)
+
+            # blocks while the queue is full, time waiting for the post processing is not busy time
+            while not self.__infer_stop__.is_set():
+                try:
+                    self.__work_queue__.put(work, timeout=0.1)
+                    break
+                except Full:
+                    continue
+            self.occupancy.sample('queue', self.__work_queue__.qsize(), self.pipeline_depth)
+
+            if work is None or isinstance(work, Exception):
+                break
+
+    def step(self) -> DetectResult:
+        """
+            process the next frame, returns None once the capture has no more frames.
+        """
+        self.__apply_config__()
+
+        if self.__work_queue__ is None:
+            stage_start = time.perf_counter_ns()
+            work = self.__infer__()
+            self.occupancy.add('infer', time.perf_counter_ns() - stage_start)
+        else:
+            work = self.__work_queue__.get()
+            if isinstance(work, Exception):
+                raise work
+
+        if work is None:
+            return None
+
+        stage_start = time.perf_counter_ns()
+        result = self.__post__(work)
+        self.occupancy.add('post', time.perf_counter_ns() - stage_start)
+
+        if self.first_frame_seconds is None and result.valid_body_count > 0:
+            self.first_frame_seconds = (time.perf_counter_ns() - self.__start_ns__) / 1e9
+            if self.headless:
+                click.echo(self.format_startup())
+
+        return result
+
+    def format_startup(self) -> str:
+        first_frame = f'{self.first_frame_seconds:.2f}s' if self.first_frame_seconds is not None else 'not yet'
+        return f'Time to first valid frame: {first_frame} (warm-up {self.warmup_seconds:.2f}s)'
+
+    def memory_usage(self) -> dict:
+        """
+            sizes of the caches kept across frames, sampled by the memory monitor.
+        """
+        face_recg = self.face_recg
+        return {
+            'gallery': len(face_recg.labels) if face_recg else 0,
+            'face_files': len(face_recg.__faces__) if face_recg else 0,
+            'filters': len(self.width_mfilt.org_vals) + len(self.height_mfilt.org_vals),
+            'serial_queues': len(self.serial_conn._queues) if self.serial_conn else 0,
+            'frame_buffers': sum(buffers.nbytes for buffers in self.buffer_slots),
+            'queued_frames': self.__work_queue__.qsize() if self.__work_queue__ else 0,
+        }
+
+    def echo(self, result: DetectResult) -> None:
+        unit = self.unit
+        click.echo(f'Face: Detected={result.faces_count}, Known={result.known_faces_count}')
+        click.echo(f'Body: Detected={result.body_count}, Valid={result.valid_body_count}')
+        click.echo('-'*64)
+        click.echo(f'Result: Width={result.person_width:.2f}{unit}, Height={result.person_height:.2f}{unit}, label={result.person_label}')
+        click.echo(f'Last Valid Result: Width={self.last_person_width_read:.2f}{unit}, Height={self.last_person_height_read:.2f}{unit}, label={self.last_person_label_read}')
+        click.echo(f'Frame buffers: {sum(buffers.nbytes for buffers in self.buffer_slots)} bytes, {self.buffers.frame_bytes} bytes allocated this frame')
+        click.echo(f'Stage occupancy: {self.occupancy.format()}')
+        click.echo(self.format_startup())
+        if self.face_quality:
+            click.echo(f'Face quality: {self.face_quality.passed} faces encoded, {self.face_quality.skipped} skipped')
+        embedder = self.face_recg.embedder
+        click.echo(f'Face encoding ({embedder.name}): {embedder.faces} faces, {embedder.throughput():.1f} faces/s')
+        if self.motion_gate:
+            click.echo(f'{"Idle" if result.idle else "Active"}: {self.motion_gate.format()}, motion={self.motion_gate.motion:.4f}')
+
+    def show(self, result: DetectResult, metrics_report='', echo=True) -> bool:
+        """
+            logs the result and shows the frame, returns False if quit (q) is pressed.
+        """
+        frame = result.frame
+
+        # log FPS
+        cv.putText(
+            frame,
+            text=f'FPS:{self.fps.value():.2f}',
+            fontFace=cv.FONT_HERSHEY_PLAIN,
+            org=(0, 16),
+            color=(0, 255, 0),
+            fontScale=1,
+            thickness=2,
+        )
+
+        # echo logs
+        if echo:
+            click.clear()
+            self.echo(result)
+            if metrics_report:
+                click.echo('-'*64)
+                click.echo(metrics_report)
+
+        if result.idle:
+            cv.putText(
+                frame,
+                text='IDLE',
+                fontFace=cv.FONT_HERSHEY_PLAIN,
+                org=(0, 32),
+                color=(0, 165, 255),
+                fontScale=1,
+                thickness=2,
+            )
+
+        # draw crosshairs
+        Draw.crosshairs(frame, color=Draw.ORANGE)
+        # draw ruler
+        # Draw.ruler(frame, org=(64, REF_LINE_Y_AXIS), gap=10)
+
+        # show image
+        cv.imshow(self.name, frame)
+        self.__window_open__ = True
+
+        key = cv.waitKey(1)
+        return key != ord('q')
+
+    def stop(self) -> None:
+        # cleaning
+        if self.__infer_thread__ is not None:
+            self.__infer_stop__.set()
+            self.__infer_thread__.join()
+            self.__infer_thread__ = None
+        for watcher in self.watchers:
+            watcher.release()
+        if self.ser and self.__owns_serial__:
+            self.ser.close()
+        if self.face_recg and self.__owns_face_recg__:
+            self.face_recg.release()
+        if self.results_log and self.__owns_results_log__:
+            self.results_log.close()
+        if self.replay_log and self.__owns_replay_log__:
+            self.replay_log.close()
+        self.cap.release()
+        if self.__window_open__:
+            # other cameras of a MultiDetectPipeline keep their windows
+            cv.destroyWindow(self.name)
+            self.__window_open__ = False
+
+    def summary(self) -> str:
+        unit = self.unit
+        return '\n'.join([
+            f'Processed {self.fps.frames} frames in {self.fps.elapsed():.2f}s ({self.fps.average():.2f} FPS)',
+            f'Last Valid Result: Width={self.last_person_width_read:.2f}{unit}, Height={self.last_person_height_read:.2f}{unit}, label={self.last_person_label_read}',
+            f'Frame buffers: {sum(buffers.nbytes for buffers in self.buffer_slots)} bytes, {sum(buffers.total_bytes for buffers in self.buffer_slots) / max(sum(buffers.frames for buffers in self.buffer_slots), 1):.0f} bytes allocated per frame',
+            f'Stage occupancy: {self.occupancy.format()}',
+        ] + ([
+            # headless runs log it as soon as it is known
+            self.format_startup(),
+        ] if not self.headless or self.first_frame_seconds is None else []) + ([
+            f'Face quality: {self.face_quality.passed} faces encoded, {self.face_quality.skipped} skipped',
+        ] if self.face_quality else []) + ([
+            f'Motion gate: {self.motion_gate.format()}',
+        ] if self.motion_gate else []) + ([
+            f'Results log: {self.results_log.format()}',
+        ] if self.results_log else []) + ([
+            f'Replay log: {self.replay_log.format()}',
+        ] if self.replay_log else []))
+
+    def run(self) -> None:
+        metrics_log_interval = self.config[cf.MT_LOG_INTERVAL]
+        metrics_report = ''
+
+        self.start()
+        try:
+            while True:
+                result = self.step()
+                if result is None:
+                    break
+
+                if metrics.report_due(metrics_log_interval):
+                    metrics_report = metrics.format()
+                    if self.headless:
+                        click.echo(metrics_report)
+
+                # no display nor per frame logs on headless, run as fast as possible
+                if not self.headless and not self.show(result, metrics_report):
+                    break
+        finally:
+            self.stop()
+
+        if self.headless and self.fps.frames:
+            click.echo(self.summary())
+            click.echo(metrics.format())
+
+
+class MultiDetectPipeline:
+    """
+        Runs a DetectPipeline per camera within one process.
+
+        The pose model, face gallery, builts and serial port are loaded once and shared, each camera
+        keeps its own capture thread, filters, aruco ref and serial consensus state.
+        Cameras are stepped round-robin, a camera whose capture has no new frame yet gives its turn
+        to the next one so a slow camera doesn't hold the others back.
+
+        usage:
+            pipeline = MultiDetectPipeline(cf.snapshot(), cameras=(0, 2, 'clip.mp4'))
+            pipeline.start()
+            while (results := pipeline.step()) is not None:
+                for (camera_pipeline, result) in results:
+                    ...
+            pipeline.stop()
+    """
+
+    def __init__(self, config: dict, cameras) -> None:
+        self.config = config
+        self.cameras = cameras
+        self.headless = config[cf.CAM_HEADLESS]
+
+        self.ser = None
+        self.face_recg = None
+        self.results_log = None
+        self.replay_log = None
+        self.watchers = []
+        self.pipelines = []
+        self.__last_frame_ids__ = []
+
+    def __camera_config__(self, camera, warm_up=False) -> dict:
+        camera_config = dict(self.config)
+        if isinstance(camera, int):
+            camera_config[cf.CAM_TARGET] = camera
+            camera_config[cf.CAM_SOURCE] = ''
+        else:
+            camera_config[cf.CAM_SOURCE] = camera
+        # cameras are stepped in turns on one thread, their frames are not pipelined
+        camera_config[cf.RT_PIPELINE_DEPTH] = 0
+        # models are shared, warming them up once is enough
+        if not warm_up:
+            camera_config[cf.INF_WARMUP_FRAMES] = 0
+        return camera_config
+
+    def start(self) -> None:
+        torch.set_default_device(self.config[cf.RT_DEVICE])
+
+        # models shared by every camera
+        pose_yolo = load_pose_model(self.config)
+        self.face_recg = face_recg = FaceRecognition(
+            self.config[cf.PATH_FACES],
+            workers=self.config[cf.RT_FACE_WORKERS],
+            embedder=load_face_embedder(self.config),
+            pool_slots=self.config[cf.CAM_RING_SLOTS],
+            device=self.config[cf.RT_DEVICE],
+        )
+        builtM = BuiltManager(self.config[cf.PATH_BUILTS], tolerance=self.config[cf.TH_BUILT_TOLERANCE])
+        builtM.load()
+
+        if self.config[cf.RT_RELOAD_INTERVAL] > 0:
+            self.watchers = [
+                GalleryWatcher(face_recg, builtM, interval=self.config[cf.RT_RELOAD_INTERVAL]),
+                ConfigWatcher(self.update_config, interval=self.config[cf.RT_RELOAD_INTERVAL]),
+            ]
+            for watcher in self.watchers:
+                watcher.begin()
+
+        self.ser = connect_serial(self.config)
+
+        if self.config[cf.PATH_RESULTS_LOG]:
+            # one log for every camera, records are told apart by their camera column
+            self.results_log = open_results_log(self.config)
+
+        if self.config[cf.PATH_REPLAY_LOG]:
+            self.replay_log = open_replay_log(self.config)
+
+        for (i, camera) in enumerate(self.cameras):
+            pipeline = DetectPipeline(
+                self.__camera_config__(camera, warm_up=i == 0),
+                pose_yolo=pose_yolo,
+                face_recg=face_recg,
+                builtM=builtM,
+                ser=self.ser,
+                results_log=self.results_log,
+                replay_log=self.replay_log,
+                name=f'{WINDOW_NAME} ({camera})',
+            )
+            pipeline.start()
+            self.pipelines.append(pipeline)
+
+        self.__last_frame_ids__ = [None] * len(self.pipelines)
+
+    def update_config(self, changes: dict) -> None:
+        # every camera validates the changes first so none is left with a partial update
+        for pipeline in self.pipelines:
+            if pipeline:
+                Thresholds.from_config({**pipeline.config, **changes})
+
+        for pipeline in self.pipelines:
+            if pipeline:
+                pipeline.update_config(changes)
+
+    def step(self) -> list:
+        """
+            one round over the cameras, returns the (pipeline, result) of each processed camera
+            or None once every capture has no more frames.
+        """
+        results = []
+        for (i, pipeline) in enumerate(self.pipelines):
+            if pipeline is None:
+                continue
+
+            # skip until the capture thread got a new frame, file captures are always ready
+            frame_id = getattr(pipeline.cap, 'frame_id', None)
+            if frame_id is not None and frame_id == self.__last_frame_ids__[i]:
+                continue
+            self.__last_frame_ids__[i] = frame_id
+
+            result = pipeline.step()
+            if result is None:
+                # this camera has ended, keep the others running
+                pipeline.stop()
+                self.pipelines[i] = None
+                continue
+
+            results.append((pipeline, result))
+
+        if not any(self.pipelines):
+            return None
+
+        if not results:
+            time.sleep(0.001) # no camera had a new frame
+
+        return results
+
+    def memory_usage(self) -> dict:
+        """
+            sizes of the caches of every camera, the shared gallery is counted once.
+        """
+        usage = {}
+        for pipeline in list(self.pipelines):
+            if pipeline:
+                for (name, size) in pipeline.memory_usage().items():
+                    usage[name] = usage.get(name, 0) + size
+
+        if self.face_recg:
+            usage['gallery'] = len(self.face_recg.labels)
+            usage['face_files'] = len(self.face_recg.__faces__)
+
+        return usage
+
+    def show(self, results: list, metrics_report='') -> bool:
+        """
+            logs the results of every camera and shows their frames, returns False if quit (q) is pressed.
+        """
+        if not results:
+            return True
+
+        click.clear()
+        running = True
+        for (pipeline, result) in results:
+            click.echo(f'[{pipeline.name}] FPS: {pipeline.fps.value():.2f}')
+            pipeline.echo(result)
+            click.echo('='*64)
+            running = pipeline.show(result, echo=False) and running
+
+        if metrics_report:
+            click.echo(metrics_report)
+
+        return running
+
+    def stop(self) -> None:
+        for pipeline in self.pipelines:
+            if pipeline:
+                pipeline.stop()
+        for watcher in self.watchers:
+            watcher.release()
+        if self.face_recg:
+            self.face_recg.release()
+        if self.results_log:
+            self.results_log.close()
+        if self.replay_log:
+            self.replay_log.close()
+        if self.ser:
+            self.ser.close()
+
+    def run(self) -> None:
+        metrics_log_interval = self.config[cf.MT_LOG_INTERVAL]
+        metrics_report = ''
+
+        self.start()
+        pipelines = list(self.pipelines) # kept to log the summary of ended cameras
+        try:
+            while True:
+                results = self.step()
+                if results is None:
+                    break
+
+                if metrics.report_due(metrics_log_interval):
+                    metrics_report = metrics.format()
+                    if self.headless:
+                        click.echo(metrics_report)
+
+                if not self.headless and not self.show(results, metrics_report):
+                    break
+        finally:
+            self.stop()
+
+        if self.headless:
+            for pipeline in pipelines:
+                click.echo(f'[{pipeline.name}]')
+                click.echo(pipeline.summary())
+            click.echo(metrics.format())
+
+
+def echo_memory(memory_monitor: MemoryMonitor) -> None:
+    click.echo(memory_monitor.format())
+    if memory_monitor.growth:
+        click.echo('Top growing allocation sites:')
+        click.echo(memory_monitor.format_growth())
+
+
+def run(config: dict) -> None:
+    """
+        run the detection of the `bfal detect` command.
+    """
+    # stage latencies
+    metrics.window = config[cf.MT_WINDOW]
+    metrics.reset()
+
+    cameras = config[cf.CAM_CAMERAS]
+    pipeline = MultiDetectPipeline(config, cameras) if cameras else DetectPipeline(config)
+
+    # memory of long runs, sampled on a background thread
+    memory_monitor = None
+    if config[cf.MT_MEMORY_INTERVAL] > 0:
+        memory_monitor = MemoryMonitor(
+            interval=config[cf.MT_MEMORY_INTERVAL],
+            top=config[cf.MT_MEMORY_TOP],
+            trace=config[cf.MT_MEMORY_TRACE],
+            on_sample=echo_memory,
+        )
+        memory_monitor.add_sources({'detect': pipeline.memory_usage})
+        memory_monitor.begin()
+
+    metrics_server = None
+    if config[cf.MT_PORT]:
+        metrics_server = MetricsServer(metrics, port=config[cf.MT_PORT], host=config[cf.MT_HOST], memory=memory_monitor)
+        metrics_server.begin()
+        click.echo(f'Serving metrics on {config[cf.MT_HOST]}:{config[cf.MT_PORT]}')
+
+    try:
+        pipeline.run()
+    finally:
+        if metrics_server:
+            metrics_server.release()
+        if memory_monitor:
+            memory_monitor.release()
+            if memory_monitor.samples:
+                echo_memory(memory_monitor)
@@ -0,0 +1,170 @@
+import numpy as np
+import torch
+import click
+import json
+import platform
+import sys
+import time
+from datetime import datetime
+from itertools import cycle
+
+from bfal.specs import (
+    FaceSpec,
+    BodySpec,
+    BuiltSpec,
+)
+
+from bfal.specs.body_parts import *
+
+from bfal.utils import (
+    curveness_difference,
+    find_intersection,
+    normalize_vector,
+    get_distance_of_2_points,
+    synthetic_person,
+    synthetic_pose_output,
+    LatencyWindow,
+    MedianFilter,
+)
+
+from bfal.scripts.core import (
+    decode_pose_output,
+    BuiltManager,
+)
+
+import bfal.config as cf
+
+"""
+    Microbenchmarks of the helpers and specs called per person per frame.
+
+    Inputs are synthetic (see bfal.utils.synthetic) so it runs on cpu without any model or camera.
+    Each benchmark calls its target `number` times per repeat and records the mean call duration
+    of every repeat, results can be saved as JSON and compared with a previous run.
+"""
+
+FRAME_SHAPE = (720, 405, 3) # 9:16 crop of the default resolution
+BUILTS_COUNT = 1024 # synthetic registry verified against
+VERIFY_BATCH = 64
+
+
+def __benchmarks__() -> dict:
+    keypoints, box, location, land_marks = synthetic_person(FRAME_SHAPE, cf.get(cf.CNFD_LINE_Y_AXIS))
+    image = np.zeros(FRAME_SHAPE, dtype=np.uint8)
+
+    body_spec = BodySpec(image=image, keypoints=keypoints, box=box)
+    face_spec = FaceSpec(location=location, land_marks=land_marks, is_known=False, label='synthetic', distance_value=1.0)
+    built_spec = BuiltSpec(bodySpec=body_spec, faceSpec=face_spec)
+
+    points = keypoints[:, :2]
+    leg = [points[YOLO_LEFT_HIP], points[YOLO_LEFT_KNEE], points[YOLO_LEFT_ANKLE]]
+    nose_eye_v = (points[YOLO_NOSE][0] - points[YOLO_LEFT_EYE][0], points[YOLO_NOSE][1] - points[YOLO_LEFT_EYE][1])
+    corners = np.array(((0, 0), (64, 0), (64, 64), (0, 64)), dtype=np.float32)
+
+    mfilter = MedianFilter(16)
+    values = cycle(np.random.default_rng(0).normal(320, 2, size=256).tolist())
+    for _ in range(16):
+        mfilter.insert(next(values))
+
+    # the onnx pose decoding is checked once before being timed
+    pose_output, pose_keypoints, pose_box = synthetic_pose_output(FRAME_SHAPE, cf.get(cf.CNFD_LINE_Y_AXIS))
+    decoded = decode_pose_output(pose_output)
+    if len(decoded) != 1 or not np.allclose(decoded.keypoints.data[0].cpu().numpy(), pose_keypoints, atol=1e-3):
+        raise RuntimeError(f'Pose output decoded to {len(decoded)} people, expected the synthetic person')
+    if not np.allclose(decoded.boxes.data[0, :4].cpu().numpy(), pose_box[:4], atol=1e-3):
+        raise RuntimeError('Pose output decoded to a box other than the synthetic person one')
+
+    # builts are verified against an empty registry (not loaded yet or an empty file) once too
+    builtM = BuiltManager('', tolerance=cf.get(cf.TH_BUILT_TOLERANCE))
+    labels = [f'person-{i:04d}' for i in range(VERIFY_BATCH)]
+    sizes = [100] * VERIFY_BATCH
+    if builtM.verify_many(labels, sizes, sizes).tolist() != [False] * VERIFY_BATCH:
+        raise RuntimeError('Builts verified against an empty registry')
+
+    builtM.columns = (
+        np.array([f'person-{i:04d}' for i in range(BUILTS_COUNT)]),
+        np.full(BUILTS_COUNT, 100.0),
+        np.full(BUILTS_COUNT, 100.0),
+    )
+
+    return {
+        'utils.curveness_difference': lambda: curveness_difference(leg),
+        'utils.find_intersection': lambda: find_intersection(corners[0], corners[2], corners[1], corners[3]),
+        'utils.normalize_vector': lambda: normalize_vector(nose_eye_v),
+        'utils.get_distance_of_2_points': lambda: get_distance_of_2_points(points[YOLO_LEFT_SHOULDER], points[YOLO_RIGHT_SHOULDER]),
+        'BodySpec.body_is_firm': body_spec.body_is_firm,
+        'BodySpec.head_is_firm': body_spec.head_is_firm,
+        'BodySpec.owns_fspec': lambda: body_spec.owns_fspec(face_spec),
+        'FaceSpec.__init__': lambda: FaceSpec(location=location, land_marks=land_marks, is_known=False, label='synthetic', distance_value=1.0),
+        'BuiltSpec.__init__': lambda: BuiltSpec(bodySpec=body_spec, faceSpec=face_spec),
+        'BuiltSpec.getBuilt': built_spec.getBuilt,
+        'MedianFilter.insert': lambda: mfilter.insert(next(values)),
+        'MedianFilter.retrieve': mfilter.retrieve,
+        'decode_pose_output': lambda: decode_pose_output(pose_output),
+        'BuiltManager.verify_many': lambda: builtM.verify_many(labels, sizes, sizes),
+    }
+
+
+def __measure__(fn, number: int, repeat: int) -> LatencyWindow:
+    window = LatencyWindow(repeat)
+
+    for _ in range(repeat):
+        start = time.perf_counter_ns()
+        for _ in range(number):
+            fn()
+        window.record((time.perf_counter_ns() - start) // number)
+
+    return window
+
+
+def run(number: int, repeat: int, device: str, only=None, output=None, baseline=None, max_regression=10.0) -> dict:
+    cf.set(cf.RT_DEVICE, device)
+    torch.set_default_device(device)
+
+    benchmarks = __benchmarks__()
+    if only:
+        benchmarks = {name: fn for (name, fn) in benchmarks.items() if only in name}
+
+    baseline_results = None
+    if baseline:
+        with open(baseline, 'r') as baseline_file:
+            baseline_results = json.load(baseline_file)
+
+    click.echo(f'Running {len(benchmarks)} microbenchmarks on {device}, {repeat}x{number} calls each...')
+    click.echo('-'*64)
+    click.echo(f'{"benchmark":<32}{"p50 us":>10}{"p95 us":>10}{"p99 us":>10}')
+
+    stats = {}
+    regressions = []
+    for (name, fn) in benchmarks.items():
+        fn() # warm-up
+        stats[name] = summary = __measure__(fn, number, repeat).summary()
+
+        line = f'{name:<32}{summary["p50_ms"] * 1000:>10.2f}{summary["p95_ms"] * 1000:>10.2f}{summary["p99_ms"] * 1000:>10.2f}'
+
+        base_summary = baseline_results['benchmarks'].get(name) if baseline_results else None
+        if base_summary:
+            delta = (summary['p50_ms'] - base_summary['p50_ms']) / base_summary['p50_ms'] * 100
+            line += f'  ({delta:+.1f}% p50)'
+            if delta > max_regression:
+                regressions.append(name)
+
+        click.echo(line)
+
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'device': device,
+        'number': number,
+        'repeat': repeat,
+        'benchmarks': stats,
+    }
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(results, output_file, indent=4)
+        click.echo(f'Results saved to {output}')
+
+    if regressions:
+        sys.exit(f'Regressed more than {max_regression}% on: {", ".join(regressions)}')
+
+    return results
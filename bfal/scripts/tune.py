@@ -0,0 +1,281 @@
+import numpy as np
+import click
+import json
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+from bfal.scripts.core import (
+    BuiltManager,
+    UNKNOWN_PERSON_LABEL,
+)
+
+from bfal.specs.body_parts import *
+
+from bfal.utils import (
+    ResultLog,
+    REPLAY_PREFIX,
+    LANDMARK_OFFSETS,
+)
+
+import bfal.config as cf
+from bfal.thresholds import Thresholds
+
+"""
+    Replays the bodies recorded by `bfal detect --record-replay` through the posture checks, the reference
+    line check, the built median filter and BuiltManager.verify for every combination of a grid of
+    thresholds, without running any model.
+
+    Everything that doesn't depend on a threshold (deviations, angles, pixel builts) is computed once for
+    all recorded bodies, each grid point is then a few comparisons of these columns. Grid points are
+    evaluated in chunks by a pool of processes, a chunk is compared at once as (points, bodies) masks.
+"""
+
+TUNABLE_THRESHOLDS = (
+    cf.TH_FACE_VISIBILITY,
+    cf.TH_BODY_VISIBILITY,
+    cf.TH_ANKLE_LINE,
+    cf.TH_SHOULDER_LINE,
+    cf.TH_HEAD_ANGLE,
+    cf.TH_KNEE_BEND,
+    cf.TH_BUILT_TOLERANCE,
+    cf.TH_ARUCO_BODY_LINE,
+)
+
+MEDIAN_WINDOW = 17 # values held by the MedianFilter(16) of the pipeline
+GRID_CHUNK = 32 # grid points per task
+
+
+def __line_deviation__(y1, y2):
+    # distance of the farthest point from their mid y axis (truncated as the pipeline does)
+    mid_y = np.trunc((y1 + y2) / 2)
+    return np.maximum(np.abs(y1 - mid_y), np.abs(y2 - mid_y))
+
+
+def __distance__(p1, p2):
+    return np.hypot(p2[..., 0] - p1[..., 0], p2[..., 1] - p1[..., 1])
+
+
+def __curveness__(p1, p2, p3):
+    return np.abs(__distance__(p1, p2) + __distance__(p2, p3) - __distance__(p1, p3))
+
+
+def features(columns: dict) -> dict:
+    """
+        threshold independent values of every recorded body, the same computations as BodySpec,
+        FaceSpec and BuiltSpec on arrays.
+    """
+    keypoints = columns['keypoints'].astype(np.float64)
+    landmarks = columns['landmarks'].astype(np.float64)
+    points = keypoints[:, :, :2]
+    visibility = keypoints[:, :, 2]
+
+    # body_is_firm
+    ankles_x = points[:, [YOLO_LEFT_ANKLE, YOLO_RIGHT_ANKLE], 0]
+    shoulders_x = points[:, [YOLO_LEFT_SHOULDER, YOLO_RIGHT_SHOULDER], 0]
+    ankle_geometry = (ankles_x[:, 0] <= shoulders_x[:, 0]) & (ankles_x[:, 1] >= shoulders_x[:, 1]) & ~(ankles_x[:, 1] > ankles_x[:, 0])
+
+    knee_bend = np.maximum(
+        __curveness__(points[:, YOLO_LEFT_HIP], points[:, YOLO_LEFT_KNEE], points[:, YOLO_LEFT_ANKLE]),
+        __curveness__(points[:, YOLO_RIGHT_HIP], points[:, YOLO_RIGHT_KNEE], points[:, YOLO_RIGHT_ANKLE]),
+    )
+
+    # head_is_firm, a nose on the mid eye point has no angle and never passes
+    mid_eye = (points[:, YOLO_LEFT_EYE] + points[:, YOLO_RIGHT_EYE]) / 2
+    nose_eye = points[:, YOLO_NOSE] - mid_eye
+    with np.errstate(invalid='ignore', divide='ignore'):
+        nose_eye = nose_eye / np.hypot(nose_eye[:, 0], nose_eye[:, 1])[:, None]
+    head_angle = np.abs(np.degrees(np.arctan2(nose_eye[:, 0], nose_eye[:, 1])))
+
+    # built points
+    chin = landmarks[:, LANDMARK_OFFSETS['chin'] + 8]
+    left_eye = landmarks[:, LANDMARK_OFFSETS['left_eye']:LANDMARK_OFFSETS['left_eye'] + 6].mean(axis=1)
+    right_eye = landmarks[:, LANDMARK_OFFSETS['right_eye']:LANDMARK_OFFSETS['right_eye'] + 6].mean(axis=1)
+    mid_lip = (landmarks[:, LANDMARK_OFFSETS['top_lip'] + 3] + landmarks[:, LANDMARK_OFFSETS['bottom_lip'] + 3]) / 2
+
+    top_y = mid_eye[:, 1] - __distance__((left_eye + right_eye) / 2, chin)
+    bottom_y = (points[:, YOLO_LEFT_ANKLE, 1] + points[:, YOLO_RIGHT_ANKLE, 1]) / 2 + __distance__(chin, mid_lip)
+
+    return {
+        'body_visibility': visibility.mean(axis=1),
+        'shoulder_line': __line_deviation__(points[:, YOLO_LEFT_SHOULDER, 1], points[:, YOLO_RIGHT_SHOULDER, 1]),
+        'ankle_line': __line_deviation__(points[:, YOLO_LEFT_ANKLE, 1], points[:, YOLO_RIGHT_ANKLE, 1]),
+        'ankle_geometry': ankle_geometry,
+        'knee_bend': knee_bend,
+        'face_visibility': visibility[:, :YOLO_LEFT_EARS + 1].min(axis=1),
+        'head_angle': head_angle,
+        'has_face': columns['has_face'] & np.isfinite(top_y) & np.isfinite(bottom_y),
+        'ref_line': np.abs(bottom_y - columns['ref_y']),
+        'width': __distance__(points[:, YOLO_LEFT_SHOULDER], points[:, YOLO_RIGHT_SHOULDER]),
+        'height': np.abs(bottom_y - top_y),
+        'ratio': columns['real_distance'] / columns['ref_distance'], # nan or inf when there is no reference
+        'label': columns['face_label'],
+        'camera': columns['camera'],
+    }
+
+
+def __rolling_median__(values):
+    # median of each value with the values before it, as the pipeline MedianFilter
+    if not len(values):
+        return values
+    indexes = np.arange(len(values))[:, None] - np.arange(MEDIAN_WINDOW)[None, :]
+    window = np.where(indexes >= 0, values[np.maximum(indexes, 0)], np.nan)
+    return np.nanmedian(window, axis=1)
+
+
+# state of a worker process, set once by the pool initializer
+__worker__ = {}
+
+def __tune_worker_init__(body_features: dict, builts_path: str) -> None:
+    builtM = BuiltManager(builts_path, tolerance=0)
+    builtM.load()
+
+    __worker__['features'] = body_features
+    __worker__['builtM'] = builtM
+
+
+def __evaluate__(points: list) -> list:
+    """
+        scores of a chunk of grid points, each a dict of threshold values.
+    """
+    f = __worker__['features']
+    builtM = __worker__['builtM']
+
+    def column(key):
+        return np.array([point[key] for point in points], dtype=np.float64)[:, None]
+
+    # (points, bodies) masks of the whole chunk at once, same comparisons as the pipeline
+    valid = (
+        (f['body_visibility'] >= column(cf.TH_BODY_VISIBILITY))
+        & (f['shoulder_line'] <= column(cf.TH_SHOULDER_LINE))
+        & (f['knee_bend'] <= column(cf.TH_KNEE_BEND))
+        & (f['ankle_line'] <= column(cf.TH_ANKLE_LINE))
+        & f['ankle_geometry']
+        & (f['face_visibility'] > column(cf.TH_FACE_VISIBILITY))
+        & (f['head_angle'] <= column(cf.TH_HEAD_ANGLE))
+        & f['has_face']
+        & (f['ref_line'] <= column(cf.TH_ARUCO_BODY_LINE))
+    )
+
+    measurable = np.isfinite(f['ratio']) & (f['ratio'] > 0)
+    known = f['label'] != UNKNOWN_PERSON_LABEL
+    cameras = np.unique(f['camera'])
+
+    scores = []
+    for (point, point_valid) in zip(points, valid):
+        widths = np.full(len(point_valid), np.nan)
+        heights = np.full(len(point_valid), np.nan)
+
+        # each camera has its own filters
+        for camera in cameras:
+            indexes = np.flatnonzero(point_valid & (f['camera'] == camera))
+            widths[indexes] = __rolling_median__(f['width'][indexes]) * f['ratio'][indexes]
+            heights[indexes] = __rolling_median__(f['height'][indexes]) * f['ratio'][indexes]
+
+        measured = point_valid & measurable
+        builtM.tolerance = point[cf.TH_BUILT_TOLERANCE]
+        verified = np.zeros(len(measured), dtype=bool)
+        if measured.any():
+            verified[measured] = builtM.verify_many(f['label'][measured], widths[measured], heights[measured])
+
+        known_measured = measured & known
+        heights_std = [
+            float(np.std(heights[known_measured & (f['label'] == label)]))
+            for label in np.unique(f['label'][known_measured])
+        ]
+
+        scores.append({
+            'thresholds': point,
+            'valid': int(point_valid.sum()),
+            'measured': int(measured.sum()),
+            'known_measured': int(known_measured.sum()),
+            'verified': int(verified.sum()),
+            'verify_rate': float(verified.sum() / known_measured.sum()) if known_measured.any() else 0.0,
+            'height_std': float(np.mean(heights_std)) if heights_std else None,
+        })
+
+    return scores
+
+
+def parse_grid(grid: tuple, base: Thresholds) -> dict:
+    """
+        {key: values} of `key=v1,v2,...` or `key=start:stop:num` (num values evenly spaced) entries,
+        values are validated as thresholds.
+    """
+    values = {}
+    for entry in grid:
+        key, _, spec = entry.partition('=')
+        key = key.strip()
+        if key not in TUNABLE_THRESHOLDS:
+            raise ValueError(f'{key!r} can not be tuned, expected one of {", ".join(TUNABLE_THRESHOLDS)}')
+
+        if ':' in spec:
+            start, stop, num = spec.split(':')
+            key_values = np.linspace(float(start), float(stop), int(num)).tolist()
+        else:
+            key_values = [float(value) for value in spec.split(',')]
+
+        # whole numbers for the integer thresholds, raises if not valid
+        values[key] = [getattr(base.replace(**{key: value}), key) for value in key_values]
+
+    return values
+
+
+def run(replay_path: str, grid: tuple, workers=0, top=10, output=None) -> list:
+    columns = ResultLog.read(replay_path, prefix=REPLAY_PREFIX)
+    if not columns:
+        raise click.ClickException(f'No replay found in {replay_path}, record one with `bfal detect --record-replay`')
+
+    builts_path = cf.get(cf.PATH_BUILTS)
+    if not builts_path:
+        raise click.ClickException('No builts file given, the replayed builts are verified against it')
+
+    base = Thresholds.from_config(cf.snapshot())
+    grid_values = parse_grid(grid, base)
+    keys = list(grid_values)
+
+    points = []
+    for values in product(*grid_values.values()):
+        point = {key: getattr(base, key) for key in TUNABLE_THRESHOLDS}
+        point.update(zip(keys, values))
+        points.append(point)
+
+    body_features = features(columns)
+    chunks = [points[i:i + GRID_CHUNK] for i in range(0, len(points), GRID_CHUNK)]
+    click.echo(f'Replaying {len(columns["frame"])} bodies over {len(points)} threshold combinations...')
+
+    if workers:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context('spawn'),
+            initializer=__tune_worker_init__,
+            initargs=(body_features, builts_path),
+        ) as pool:
+            scores = [score for chunk_scores in pool.map(__evaluate__, chunks) for score in chunk_scores]
+    else:
+        __tune_worker_init__(body_features, builts_path)
+        scores = [score for chunk in chunks for score in __evaluate__(chunk)]
+
+    # most verified first, then most measurements and steadiest heights
+    scores.sort(key=lambda score: (-score['verify_rate'], -score['measured'], score['height_std'] or 0.0))
+
+    click.echo('-'*64)
+    for score in scores[:top]:
+        tuned = ', '.join(f'{key}={score["thresholds"][key]}' for key in keys)
+        click.echo(
+            f'{tuned}: verified {score["verified"]}/{score["known_measured"]} ({score["verify_rate"] * 100:.1f}%), '
+            f'{score["measured"]} measured, {score["valid"]} valid'
+        )
+    click.echo('-'*64)
+
+    if scores:
+        click.echo('Best [THRESHOLDS]:')
+        for key in keys:
+            click.echo(f'{key} = {scores[0]["thresholds"][key]}')
+
+    if output:
+        with open(output, 'w') as output_file:
+            json.dump(scores, output_file, indent=4)
+        click.echo(f'Results saved to {output}')
+
+    return scores
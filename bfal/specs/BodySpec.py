@@ -1,5 +1,5 @@
 import cv2 as cv
-import torch
+from bfal.lazy import lazy_import
 
 from bfal.utils import (
     points_aligned_by_axis,
@@ -8,29 +8,38 @@ from bfal.utils import (
     extend_line_to_y,
     midpoint,
     Draw,
+    timed,
 )
 
 from bfal.specs.body_parts import *
 from bfal.specs import FaceSpec
 
 import bfal.config as cf
+from bfal.thresholds import Thresholds
+
+torch = lazy_import('torch')
+
+HEAD_REGION_MARGIN = 0.25
 
-TOTAL_BODY_VISIBILITY = cf.get(cf.TH_BODY_VISIBILITY)
-ANKLE_LINE_TH = cf.get(cf.TH_ANKLE_LINE)
-SHOULDER_LINE_TH = cf.get(cf.TH_SHOULDER_LINE)
-FACE_VISIBILITY = cf.get(cf.TH_FACE_VISIBILITY)
-HEAD_ANGLE = cf.get(cf.TH_HEAD_ANGLE)
-KNEE_BEND = cf.get(cf.TH_KNEE_BEND)
 
 class BodySpec:
 
-    def __init__(self, image, keypoints, box, imageLog=None, verbose=False) -> None:
+    def __init__(self, image, keypoints, box, imageLog=None, verbose=False, thresholds=None) -> None:
         self.image = image
         self.keypoints = keypoints
         self.box = box
         self.imageLog = imageLog
         self.verbose = verbose
 
+        # thresholds snapshot of the pipeline, defaults to current config
+        th = Thresholds.from_config(cf.snapshot()) if thresholds is None else thresholds
+        self.body_visibility_th = th.body_visibility
+        self.ankle_line_th = th.ankle_line
+        self.shoulder_line_th = th.shoulder_line
+        self.face_visibility_th = th.face_visibility
+        self.head_angle_th = th.head_angle
+        self.knee_bend_th = th.knee_bend
+
     def get_body_point(self, part: int, incV=False):
 
         if not incV:
@@ -50,8 +59,8 @@ class BodySpec:
         left_straightness = curveness_difference([left_hip, self.get_body_point(YOLO_LEFT_KNEE), self.get_body_point(YOLO_LEFT_ANKLE)])
         right_straightness = curveness_difference([right_hip, self.get_body_point(YOLO_RIGHT_KNEE), self.get_body_point(YOLO_RIGHT_ANKLE)])
 
-        is_left_aligned = left_straightness <= KNEE_BEND
-        is_right_aligned = right_straightness <= KNEE_BEND
+        is_left_aligned = left_straightness <= self.knee_bend_th
+        is_right_aligned = right_straightness <= self.knee_bend_th
 
         # image draw logging
         if self.verbose:
@@ -110,7 +119,7 @@ class BodySpec:
 
         mid_angkle_p_y = int((left_ankle_p[1] + right_ankle_p[1]) / 2)
 
-        is_aligned = points_aligned_by_axis([left_ankle_p, right_ankle_p], mid_angkle_p_y, th=ANKLE_LINE_TH)
+        is_aligned = points_aligned_by_axis([left_ankle_p, right_ankle_p], mid_angkle_p_y, th=self.ankle_line_th)
         is_aligned = is_aligned and left_ankle_within_shoulder_x and right_ankle_within_shoulder_x and not ankles_crossed
 
         # draw ankle alignment log
@@ -121,8 +130,8 @@ class BodySpec:
             Draw.draw_line(
                 image=self.imageLog,
                 points=[
-                    (line_left, mid_angkle_p_y + ANKLE_LINE_TH),
-                    (line_right, mid_angkle_p_y + ANKLE_LINE_TH),
+                    (line_left, mid_angkle_p_y + self.ankle_line_th),
+                    (line_right, mid_angkle_p_y + self.ankle_line_th),
                 ],
                 color=Draw.BLUE,
                 thickness=1,
@@ -130,8 +139,8 @@ class BodySpec:
             Draw.draw_line(
                 image=self.imageLog,
                 points=[
-                    (line_left, mid_angkle_p_y - ANKLE_LINE_TH),
-                    (line_right, mid_angkle_p_y - ANKLE_LINE_TH),
+                    (line_left, mid_angkle_p_y - self.ankle_line_th),
+                    (line_right, mid_angkle_p_y - self.ankle_line_th),
                 ],
                 color=Draw.BLUE,
                 thickness=1,
@@ -155,7 +164,7 @@ class BodySpec:
 
         mid_angkle_p_y = int((left_shoulder_p[1] + right_shoulder_p[1]) / 2)
 
-        is_aligned = points_aligned_by_axis([left_shoulder_p, right_shoulder_p], mid_angkle_p_y, th=SHOULDER_LINE_TH)
+        is_aligned = points_aligned_by_axis([left_shoulder_p, right_shoulder_p], mid_angkle_p_y, th=self.shoulder_line_th)
 
         # draw logs
         if self.verbose:
@@ -166,10 +175,10 @@ class BodySpec:
             Draw.draw_line(
                 image=self.imageLog,
                 points=[
-                    (line_left, mid_angkle_p_y + SHOULDER_LINE_TH),
-                    (line_right, mid_angkle_p_y + SHOULDER_LINE_TH),
-                    (line_left, mid_angkle_p_y - SHOULDER_LINE_TH),
-                    (line_right, mid_angkle_p_y - SHOULDER_LINE_TH),
+                    (line_left, mid_angkle_p_y + self.shoulder_line_th),
+                    (line_right, mid_angkle_p_y + self.shoulder_line_th),
+                    (line_left, mid_angkle_p_y - self.shoulder_line_th),
+                    (line_right, mid_angkle_p_y - self.shoulder_line_th),
                 ],
                 color=Draw.BLUE,
                 thickness=1,
@@ -188,6 +197,7 @@ class BodySpec:
 
         return is_aligned
 
+    @timed('body_firm')
     def body_is_firm(self) -> bool:
         """
             Examine if detected body from result given is standing.
@@ -201,7 +211,7 @@ class BodySpec:
 
         # condition 1
         body_visibility = self.all_keypoints_visibility_mean()
-        is_visible = body_visibility >= TOTAL_BODY_VISIBILITY
+        is_visible = body_visibility >= self.body_visibility_th
 
         # draw visibility log
         if self.verbose:
@@ -248,7 +258,7 @@ class BodySpec:
 
         # nose head angle from mid eye point
         head_line_angle = torch.rad2deg(torch.atan2(*nose_meye_v))
-        head_line_is_aligned = torch.abs(head_line_angle) <= HEAD_ANGLE
+        head_line_is_aligned = torch.abs(head_line_angle) <= self.head_angle_th
 
         # check if nose y is above ears mid y
         # nose_below_ears = ears_mid_y < nose_p[1]
@@ -309,12 +319,13 @@ class BodySpec:
 
         return head_line_is_aligned
 
+    @timed('head_firm')
     def head_is_firm(self):
         # check face keypoints visibility
         all_face_keypoints_visible = True
 
         for (*_, v) in self.keypoints[:4]: # face points only 0-4
-            if v <= FACE_VISIBILITY:
+            if v <= self.face_visibility_th:
                 all_face_keypoints_visible = False
                 break
 
@@ -370,6 +381,21 @@ class BodySpec:
         return [self.get_mid_point()[0], mid_ankle_p[1]]
     
 
+    def get_head_region(self, margin=HEAD_REGION_MARGIN) -> tuple:
+        """
+            (x1, y1, x2, y2) of the head, from the top of the body box down to the shoulders and across the
+            visible head and shoulder points, widened by `margin` of its width on each side.
+        """
+        points = self.keypoints[:YOLO_RIGHT_SHOULDER + 1]
+        points = points[points[:, 2] > self.face_visibility_th][:, :2]
+
+        x1, x2 = float(points[:, 0].min()), float(points[:, 0].max())
+        y2 = float(points[:, 1].max())
+        y1 = float(self.box[1])
+        pad = (x2 - x1) * margin
+
+        return (int(x1 - pad), int(y1 - pad), int(x2 + pad), int(y2))
+
     def owns_fspec(self, fspec: FaceSpec) -> bool:
         """
             > the location here assumes that is came for face_recognition location
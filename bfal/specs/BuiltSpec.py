@@ -1,4 +1,4 @@
-import torch
+from bfal.lazy import lazy_import
 from bfal.utils import (
     get_distance_of_2_points,
     midpoint,
@@ -10,6 +10,8 @@ from bfal.specs.body_parts import (
     YOLO_RIGHT_SHOULDER,
 )
 
+torch = lazy_import('torch')
+
 class BuiltSpec:
 
     def __init__(self, bodySpec, faceSpec) -> None:
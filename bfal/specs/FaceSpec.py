@@ -1,5 +1,5 @@
 import cv2 as cv
-import torch
+from bfal.lazy import lazy_import
 from bfal.utils import (
     get_distance_of_2_points,
     midpoint,
@@ -10,6 +10,8 @@ from bfal.specs import (
     BodySpec,
 )
 
+torch = lazy_import('torch')
+
 LABEL_YGAP_AMOUNT = 3 # how high to put the label above the box location
 
 BOTTOM_CHIN_INX = 8
@@ -31,12 +33,13 @@ TOP_LIP_TOP_INDX = 3
 
 class FaceSpec:
 
-    def __init__(self, location, land_marks, is_known, label, distance_value) -> None:
+    def __init__(self, location, land_marks, is_known, label, distance_value, device=None) -> None:
         self.location = location
         self.land_marks = land_marks
         self.is_known = is_known
         self.label = label
         self.distance_value = distance_value
+        self.device = device # of the landmark tensors, the torch default device when None
 
         self.top_lip_top = land_marks.get(TOP_LIP)[TOP_LIP_TOP_INDX]
         self.bottom_lip_cottom = land_marks.get(BOTTOM_LIP)[BOTTOM_LIP_BOTTOM_INDX]
@@ -85,25 +88,25 @@ class FaceSpec:
         # )
 
     def getBottomChinEyeLineDistance(self) -> float:
-        left_eye_center_p = center_of_circular_point(self.land_marks.get(LEFT_EYE))
-        right_eye_center_p = center_of_circular_point(self.land_marks.get(RIGHT_EYE))
+        left_eye_center_p = center_of_circular_point(self.land_marks.get(LEFT_EYE), device=self.device)
+        right_eye_center_p = center_of_circular_point(self.land_marks.get(RIGHT_EYE), device=self.device)
 
         mid_eye_p = midpoint(left_eye_center_p, right_eye_center_p)
 
         return get_distance_of_2_points(
             pt1=mid_eye_p,
-            pt2=torch.tensor(self.land_marks.get(CHIN)[BOTTOM_CHIN_INX]).to('cuda'),
+            pt2=torch.tensor(self.land_marks.get(CHIN)[BOTTOM_CHIN_INX], device=self.device),
         )
 
     def getBottomChinNoseTipDistance(self) -> float:
         return get_distance_of_2_points(
-            pt1=torch.tensor(self.land_marks.get(CHIN)[BOTTOM_CHIN_INX]).to('cuda'),
-            pt2=torch.tensor(self.land_marks.get(NOSE_TIP)[BOTTOM_NOSE_TIP_INX]).to('cuda'),
+            pt1=torch.tensor(self.land_marks.get(CHIN)[BOTTOM_CHIN_INX], device=self.device),
+            pt2=torch.tensor(self.land_marks.get(NOSE_TIP)[BOTTOM_NOSE_TIP_INX], device=self.device),
         )
     
     def getBottomChinMidLipDistance(self) -> float:
         return get_distance_of_2_points(
-            pt1=torch.tensor(self.land_marks.get(CHIN)[BOTTOM_CHIN_INX]).to('cuda'),
+            pt1=torch.tensor(self.land_marks.get(CHIN)[BOTTOM_CHIN_INX], device=self.device),
             pt2=self.mid_lip,
         )
     
@@ -0,0 +1,84 @@
+import bfal.config as cf
+
+# key: (type, minimum, maximum), None when unbounded
+THRESHOLDS_SPEC = {
+    cf.TH_FACE_VISIBILITY: (float, 0.0, 1.0),
+    cf.TH_BODY_VISIBILITY: (float, 0.0, 1.0),
+    cf.TH_ANKLE_LINE: (int, 0, None),
+    cf.TH_SHOULDER_LINE: (float, 0.0, None),
+    cf.TH_HEAD_ANGLE: (float, 0.0, 180.0),
+    cf.TH_KNEE_BEND: (float, 0.0, None),
+    cf.TH_BUILT_TOLERANCE: (int, 0, None),
+    cf.TH_ARUCO_LINE: (int, 0, None),
+    cf.TH_ARUCO_BODY_LINE: (int, 0, None),
+    cf.TH_SERIAL_CONSISTENCY_REQ: (int, 1, None),
+    cf.TH_SERIAL_WINDOW: (int, 0, None),
+    cf.TH_FACE_MIN_SIZE: (int, 0, None),
+    cf.TH_FACE_MIN_SHARPNESS: (float, 0.0, None),
+    cf.TH_FACE_MAX_YAW: (float, 0.0, None),
+}
+
+class Thresholds:
+    """
+        Validated, immutable snapshot of the [THRESHOLDS] config, attributes are named after the config keys.
+
+        Read as plain attributes on the hot paths instead of config lookups, a changed config gives a new
+        snapshot that replaces the previous one as a whole.
+
+        usage:
+            th = Thresholds.from_config(cf.snapshot())
+            th.knee_bend
+            th = th.replace(knee_bend=0.4)
+    """
+
+    __slots__ = tuple(THRESHOLDS_SPEC.keys())
+
+    def __init__(self, **values) -> None:
+        missing = set(self.__slots__) - set(values)
+        unknown = set(values) - set(self.__slots__)
+        if missing or unknown:
+            raise ValueError(f'Thresholds missing: {sorted(missing)}, unknown: {sorted(unknown)}')
+
+        for (key, value) in values.items():
+            object.__setattr__(self, key, Thresholds.__validate__(key, value))
+
+    @staticmethod
+    def __validate__(key: str, value):
+        kind, minimum, maximum = THRESHOLDS_SPEC[key]
+
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError(f'Threshold {key} must be a number, got {value!r}')
+
+        if kind is int:
+            if value != int(value):
+                raise ValueError(f'Threshold {key} must be a whole number, got {value!r}')
+            value = int(value)
+        else:
+            value = float(value)
+
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            raise ValueError(f'Threshold {key} must be within [{minimum}, {maximum if maximum is not None else "inf"}], got {value!r}')
+
+        return value
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(**{key: config[key] for key in cls.__slots__})
+
+    def replace(self, **changes):
+        values = {key: getattr(self, key) for key in self.__slots__}
+        values.update(changes)
+        return Thresholds(**values)
+
+    def __setattr__(self, key, value) -> None:
+        raise AttributeError('Thresholds are immutable, use replace()')
+
+    def __delattr__(self, key) -> None:
+        raise AttributeError('Thresholds are immutable, use replace()')
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Thresholds) and all(getattr(self, key) == getattr(other, key) for key in self.__slots__)
+
+    def __repr__(self) -> str:
+        values = ', '.join(f'{key}={getattr(self, key)!r}' for key in self.__slots__)
+        return f'Thresholds({values})'
@@ -4,15 +4,19 @@ import time
 
 class AsyncVideoCapture:
 
-    def __init__(self, target=0) -> None:
+    def __init__(self, target=0, pace=0.05) -> None:
 
         self.cap = cv.VideoCapture(target)
         self.ret, self.frame = False, None
+        self.pace = pace
+        self.frame_id = 0 # incremented on each captured frame
 
     def __start_capture__(self) -> None:
         while self.cap.isOpened():
             self.ret, self.frame = self.cap.read()
-            time.sleep(0.05) # wait for 50000 nanoseconds
+            self.frame_id += 1
+            if self.pace:
+                time.sleep(self.pace) # wait for 50 milliseconds by default
 
         return self
 
@@ -21,6 +25,7 @@ class AsyncVideoCapture:
 
     def begin(self) -> None:
         self.ret, self.frame = self.cap.read()
+        self.frame_id += 1
         self.__thread__ = Thread(target=self.__start_capture__)
         self.__thread__.start()
     
@@ -30,5 +35,5 @@ class AsyncVideoCapture:
     def set(self, propId: int, value: float) -> None:
         self.cap.set(propId=propId, value=value)
 
-    def get(self, propId: int) -> None:
-        self.cap.get(propId=propId)
+    def get(self, propId: int) -> float:
+        return self.cap.get(propId=propId)
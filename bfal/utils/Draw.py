@@ -1,10 +1,12 @@
 import cv2 as cv
 import bfal.config as cf
-import torch
+from bfal.lazy import lazy_import
 from bfal.utils import (
     get_distance_of_2_points,
 )
 
+torch = lazy_import('torch')
+
 BLUE = (255, 0, 0)
 GREEN = (0, 255, 0)
 RED = (0, 0, 255)
@@ -1,32 +1,52 @@
-import datetime
+import time
+from collections import deque
 
 class FPS:
-	def __init__(self):
+	def __init__(self, window=120):
 		# store the start time, end time, and total number of frames
 		# that were examined between the start and end intervals
 		self._start = None
 		self._end = None
 		self._numFrames = 0
+		# monotonic timestamps (ns) of the last frames for the rolling frame rate
+		self._frameTimes = deque(maxlen=window)
 
 	def init(self):
 		# start the timer
-		self._start = datetime.datetime.now()
+		self._start = time.perf_counter_ns()
+		self._frameTimes.clear()
+		self._frameTimes.append(self._start)
 		return self
 	
 	def stop(self):
 		# stop the timer
-		self._end = datetime.datetime.now()
+		self._end = time.perf_counter_ns()
 
 	def update(self):
 		# increment the total number of frames examined during the
 		# start and end intervals
 		self._numFrames += 1
+		self._frameTimes.append(time.perf_counter_ns())
 
 	def elapsed(self):
 		# return the total number of seconds between the start and
 		# end interval
-		return (self._end - self._start).total_seconds()
+		return (self._end - self._start) / 1e9
+
+	def average(self):
+		# compute the (approximate) frames per second since start
+		return self._numFrames / self.elapsed()
 	
 	def value(self):
-		# compute the (approximate) frames per second
-		return self._numFrames / self.elapsed()
\ No newline at end of file
+		# compute the frames per second over the last frames window
+		# so slowdowns after long runs are not hidden by the average
+		if len(self._frameTimes) < 2:
+			return self.average() if self._numFrames else 0.0
+
+		elapsed = (self._frameTimes[-1] - self._frameTimes[0]) / 1e9
+		return (len(self._frameTimes) - 1) / elapsed if elapsed else 0.0
+
+	@property
+	def frames(self):
+		# total number of frames counted since start
+		return self._numFrames
\ No newline at end of file
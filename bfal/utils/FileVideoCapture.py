@@ -0,0 +1,78 @@
+import cv2 as cv
+import glob
+from os import path
+from imutils import paths
+from bfal.utils.AsyncVideoCapture import AsyncVideoCapture
+
+class FileVideoCapture:
+    """
+        Reads frames from a recorded video file or an image sequence as fast as possible.
+
+        Unlike AsyncVideoCapture there is no capture thread nor sleep pacing, each read returns
+        the next frame so no frame is dropped or repeated and runs are reproducible.
+
+        source can be:
+            - a video file, or a printf style image sequence pattern (e.g. frames/%04d.png)
+            - a directory of images, read in sorted order
+            - a glob pattern of images (e.g. frames/*.jpg), read in sorted order
+    """
+
+    def __init__(self, source: str) -> None:
+        self.source = source
+        self.cap = None
+        self.images = None
+        self.__index__ = 0
+
+        if path.isdir(source):
+            self.images = sorted(paths.list_images(source))
+        elif glob.has_magic(source):
+            self.images = sorted(glob.glob(source))
+        else:
+            self.cap = cv.VideoCapture(source)
+
+    def isOpened(self) -> bool:
+        if self.images is not None:
+            return self.__index__ < len(self.images)
+        return self.cap.isOpened()
+
+    def read(self):
+        if self.images is None:
+            return self.cap.read()
+
+        if self.__index__ >= len(self.images):
+            return (False, None)
+
+        frame = cv.imread(self.images[self.__index__])
+        self.__index__ += 1
+
+        return (frame is not None, frame)
+
+    def begin(self) -> None:
+        pass
+
+    def release(self) -> None:
+        if self.cap is not None:
+            self.cap.release()
+
+    def set(self, propId: int, value: float) -> None:
+        # recorded frames keep their own resolution
+        pass
+
+    def get(self, propId: int) -> float:
+        if self.cap is not None:
+            return self.cap.get(propId)
+
+        if propId == cv.CAP_PROP_FRAME_COUNT:
+            return len(self.images)
+        
+        return 0
+
+
+def open_video_capture(source: str, target=0):
+    """
+        returns a FileVideoCapture if a recorded source is given, otherwise a live AsyncVideoCapture of the target camera.
+    """
+    if source:
+        return FileVideoCapture(source)
+
+    return AsyncVideoCapture(target)
@@ -0,0 +1,51 @@
+import cv2 as cv
+import numpy as np
+
+class FrameBuffers:
+    """
+        Named buffers reused from frame to frame, a buffer is only allocated again when the frame shape changes.
+
+        usage:
+            buffers.next_frame()
+            rgb_frame = buffers.cvt_color('rgb', frame, cv.COLOR_BGR2RGB)
+            ...
+            buffers.frame_bytes # bytes allocated on this frame, 0 once the buffers are allocated
+    """
+
+    def __init__(self) -> None:
+        self.buffers = {}
+        self.frames = 0
+        self.frame_bytes = 0 # allocated on the current frame
+        self.total_bytes = 0 # allocated since start
+
+    def next_frame(self) -> None:
+        self.frames += 1
+        self.frame_bytes = 0
+
+    def get(self, name: str, shape: tuple, dtype=np.uint8):
+        buffer = self.buffers.get(name)
+        if buffer is None or buffer.shape != shape or buffer.dtype != dtype:
+            buffer = self.buffers[name] = np.empty(shape, dtype=dtype)
+            self.frame_bytes += buffer.nbytes
+            self.total_bytes += buffer.nbytes
+        return buffer
+
+    def cvt_color(self, name: str, image, code: int, channels=3):
+        dst = self.get(name, image.shape[:2] + (channels, ), image.dtype)
+        return cv.cvtColor(image, code, dst=dst)
+
+    def copy(self, name: str, image):
+        """
+            copy of the image, only needed when a stage mutates an image another stage still reads.
+        """
+        dst = self.get(name, image.shape, image.dtype)
+        np.copyto(dst, image)
+        return dst
+
+    @property
+    def nbytes(self) -> int:
+        # held by the buffers
+        return sum(buffer.nbytes for buffer in self.buffers.values())
+
+    def bytes_per_frame(self) -> float:
+        return self.total_bytes / self.frames if self.frames else 0.0
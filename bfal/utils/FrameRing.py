@@ -0,0 +1,109 @@
+import cv2 as cv
+import numpy as np
+from multiprocessing import shared_memory
+
+# header fields before the sequence number of each slot
+HEADER_WRITE_SEQ = 0
+HEADER_SLOTS = 1
+HEADER_SHAPE = 2 # height, width, channels
+HEADER_FIELDS = 5
+
+EMPTY_SEQ = -1
+WRITING_SEQ = -2
+
+class FrameRing:
+    """
+        Ring of preallocated frame slots on shared memory, to hand frames between processes without pickling.
+
+        A single writer puts each frame on the next slot and stamps the slot with the frame sequence number,
+        readers get numpy views of the slots (no copy). A view stays valid until the writer comes back to its
+        slot, `slots - 1` frames later, read(seq) is None once it was overwritten.
+
+        The frame shape and number of slots are kept within the shared memory so other processes only need its name.
+        The face workers (see FacePool) read the frames they encode from a ring, by sequence number.
+
+        usage:
+            ring = FrameRing(frame.shape, slots=4)
+            seq = ring.write(frame)
+
+            # on another process, given ring.name and seq
+            ring = FrameRing.attach(name)
+            frame = ring.read(seq)
+    """
+
+    def __init__(self, shape, slots=4, name=None) -> None:
+        create = name is None
+
+        if create:
+            frame_size = int(np.prod(shape))
+            self.shm = shared_memory.SharedMemory(create=True, size=(HEADER_FIELDS + slots) * 8 + slots * frame_size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+
+        self.__owner__ = create
+
+        fields = np.ndarray((HEADER_FIELDS, ), dtype=np.int64, buffer=self.shm.buf)
+        if create:
+            fields[HEADER_WRITE_SEQ] = EMPTY_SEQ
+            fields[HEADER_SLOTS] = slots
+            fields[HEADER_SHAPE:HEADER_FIELDS] = shape
+
+        self.slots = int(fields[HEADER_SLOTS])
+        self.shape = tuple(int(size) for size in fields[HEADER_SHAPE:HEADER_FIELDS])
+
+        self.header = np.ndarray((HEADER_FIELDS + self.slots, ), dtype=np.int64, buffer=self.shm.buf)
+        self.slot_seqs = self.header[HEADER_FIELDS:]
+        self.frames = np.ndarray((self.slots, *self.shape), dtype=np.uint8, buffer=self.shm.buf, offset=self.header.nbytes)
+
+        if create:
+            self.slot_seqs[:] = EMPTY_SEQ
+
+    @classmethod
+    def attach(cls, name: str):
+        return cls(shape=None, name=name)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def write_seq(self) -> int:
+        return int(self.header[HEADER_WRITE_SEQ])
+
+    def write(self, frame) -> int:
+        """
+            copies the frame on the next slot, resized if not of the ring shape, returns its sequence number.
+        """
+        seq = self.write_seq + 1
+        slot = seq % self.slots
+
+        # readers ignore the slot while it is written
+        self.slot_seqs[slot] = WRITING_SEQ
+        if frame.shape == self.shape:
+            np.copyto(self.frames[slot], frame)
+        else:
+            cv.resize(frame, (self.shape[1], self.shape[0]), dst=self.frames[slot])
+        self.slot_seqs[slot] = seq
+
+        self.header[HEADER_WRITE_SEQ] = seq
+        return seq
+
+    def read(self, seq: int):
+        """
+            view of the frame of the sequence number, None if not written yet or already overwritten.
+        """
+        if seq < 0:
+            return None
+
+        slot = seq % self.slots
+        if self.slot_seqs[slot] != seq:
+            return None
+
+        return self.frames[slot]
+
+    def close(self) -> None:
+        # views of the slots must not be used after closing
+        del self.header, self.slot_seqs, self.frames
+        self.shm.close()
+        if self.__owner__:
+            self.shm.unlink()
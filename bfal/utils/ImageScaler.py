@@ -27,6 +27,8 @@ class ImageScaler:
             self.scaled_image = self.original_image.copy()
         else:
             self.scaled_image = imutils.resize(self.original_image, width=int(self.original_image.shape[1] * self.scale_factor))
+            # actual factor of the rounded width, to map coordinates back exactly
+            self.scale_factor = self.scaled_image.shape[1] / self.original_image.shape[1]
 
     def get_scaled_image(self):
         """
@@ -66,3 +68,46 @@ class ImageScaler:
         x_original = int(x / self.scale_factor)
         y_original = int(y / self.scale_factor)
         return x_original, y_original
+
+    def transform_points(self, points):
+        """
+        Transform an array of points from the scaled image to the original image.
+
+        :param points: Array or tensor of shape (..., 2+) whose first two columns are x, y in the scaled image, other columns are kept.
+        :return: A copy of the points with x, y in the original image.
+        """
+        original_points = points.clone() if hasattr(points, 'clone') else points.copy()
+        original_points[..., :2] = original_points[..., :2] / self.scale_factor
+        return original_points
+
+    def transform_box(self, boxes):
+        """
+        Transform boxes from the scaled image to the original image.
+
+        :param boxes: Array or tensor of shape (..., 4+) whose first four columns are x1, y1, x2, y2 in the scaled image, other columns are kept.
+        :return: A copy of the boxes in the original image.
+        """
+        original_boxes = boxes.clone() if hasattr(boxes, 'clone') else boxes.copy()
+        original_boxes[..., :4] = original_boxes[..., :4] / self.scale_factor
+        return original_boxes
+
+    def transform_location(self, location):
+        """
+        Transform a face location from the scaled image to the original image.
+
+        :param location: A tuple (top, right, bottom, left) in the scaled image.
+        :return: A tuple (top, right, bottom, left) in the original image.
+        """
+        return tuple(int(value / self.scale_factor) for value in location)
+
+    def transform_landmarks(self, land_marks):
+        """
+        Transform face landmarks from the scaled image to the original image.
+
+        :param land_marks: A dict of lists of (x, y) points in the scaled image.
+        :return: A dict of lists of (x, y) points in the original image.
+        """
+        return {
+            part: [self.transform_coordinates(point) for point in points]
+            for (part, points) in land_marks.items()
+        }
@@ -14,5 +14,8 @@ class MedianFilter:
         
         self.org_vals.append(value)
 
+    def clear(self) -> None:
+        self.org_vals = []
+
     def retrieve(self) -> float:
         return np.median(self.org_vals)
\ No newline at end of file
@@ -0,0 +1,187 @@
+import os
+import sys
+import time
+import tracemalloc
+from collections import deque
+from threading import (
+    Event,
+    Thread,
+)
+
+MEMORY_HISTORY = 1024 # rss samples kept for the growth rate
+
+# allocations of the monitoring itself are not reported
+TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+def rss_bytes() -> int:
+    """
+        resident set size of the process, its peak where /proc is not available, 0 if neither is.
+    """
+    try:
+        with open('/proc/self/statm', 'r') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource
+    except ImportError:
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macos, kilobytes on linux
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+def format_bytes(size: float) -> str:
+    for unit in ('B', 'KB', 'MB'):
+        if abs(size) < 1024:
+            return f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GB'
+
+
+class MemoryMonitor:
+    """
+        Samples the memory of a long running process on a background thread.
+
+        Each sample reads the rss, the size of the registered caches (callables returning a count, bytes
+        or a dict of named sizes) and, when tracing, a tracemalloc snapshot compared to the first one:
+        the allocation sites that grew the most since are the ones to look at for a leak. The first sample
+        is taken after `interval` seconds so what is loaded on start is not reported as growth.
+
+        Tracing keeps `trace_frames` frames per allocation (1 is the allocating line). It slows every
+        allocation and a snapshot holds the GIL while it copies the traces, so it is off by default and
+        meant for hunting a leak. Without tracing only the rss and caches are sampled, at almost no cost.
+
+        usage:
+            monitor = MemoryMonitor(interval=300, on_sample=lambda monitor: print(monitor.format()))
+            monitor.add_sources({'gallery': lambda: len(face_recg.labels), 'detect': pipeline.memory_usage})
+            monitor.begin()
+            ...
+            monitor.release()
+    """
+
+    def __init__(self, interval=300.0, top=10, trace=False, trace_frames=1, on_sample=None) -> None:
+        self.interval = interval
+        self.top = top
+        self.trace = trace
+        self.trace_frames = trace_frames
+        self.on_sample = on_sample
+        self.sources = {} # name -> callable returning the size of a cache or a dict of sizes
+
+        self.rss_history = deque(maxlen=MEMORY_HISTORY) # (perf counter seconds, rss bytes)
+        self.start_rss = rss_bytes()
+        self.traced = 0 # bytes traced by tracemalloc at the last sample
+        self.caches = {}
+        self.growth = [] # (site, size diff, count diff) of the last sample, largest first
+        self.samples = 0
+        self.last_error = None
+
+        self.__baseline__ = None
+        self.__owns_tracing__ = False
+        self.__stop__ = Event()
+        self.__thread__ = None
+
+    def add_sources(self, sources: dict) -> None:
+        self.sources.update(sources)
+
+    def begin(self) -> None:
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(self.trace_frames)
+            self.__owns_tracing__ = True
+
+        self.__thread__ = Thread(target=self.__sample_loop__, daemon=True)
+        self.__thread__.start()
+
+    def sample(self) -> None:
+        rss = rss_bytes()
+        self.rss_history.append((time.perf_counter(), rss))
+        caches = {}
+        for (name, source) in list(self.sources.items()):
+            size = source()
+            if isinstance(size, dict):
+                caches.update(size)
+            else:
+                caches[name] = size
+        self.caches = caches
+
+        if tracemalloc.is_tracing():
+            self.traced = tracemalloc.get_traced_memory()[0]
+            snapshot = tracemalloc.take_snapshot().filter_traces(TRACE_FILTERS)
+            if self.__baseline__ is None:
+                self.__baseline__ = snapshot
+            else:
+                stats = snapshot.compare_to(self.__baseline__, 'lineno')
+                self.growth = [
+                    (str(stat.traceback[0]), stat.size_diff, stat.count_diff)
+                    for stat in stats[:self.top] if stat.size_diff > 0
+                ]
+
+        self.samples += 1
+
+    def __sample_loop__(self) -> None:
+        while not self.__stop__.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                # kept for the logs, the detection goes on without the sample
+                self.last_error = e
+                continue
+
+            if self.on_sample:
+                self.on_sample(self)
+
+    def release(self) -> None:
+        if self.__thread__ is None:
+            return
+
+        self.__stop__.set()
+        self.__thread__.join()
+        self.__thread__ = None
+
+        if self.__owns_tracing__:
+            tracemalloc.stop()
+            self.__owns_tracing__ = False
+
+    @property
+    def rss(self) -> int:
+        return self.rss_history[-1][1] if self.rss_history else self.start_rss
+
+    def growth_rate(self) -> float:
+        """
+            rss growth in bytes per hour over the kept samples.
+        """
+        if len(self.rss_history) < 2:
+            return 0.0
+
+        (first_time, first_rss), (last_time, last_rss) = self.rss_history[0], self.rss_history[-1]
+        return (last_rss - first_rss) / (last_time - first_time) * 3600
+
+    def snapshot(self) -> dict:
+        return {
+            'rss': self.rss,
+            'rss_growth': self.rss - self.start_rss,
+            'rss_growth_per_hour': self.growth_rate(),
+            'traced': self.traced,
+            'caches': dict(self.caches),
+            'growth': [{'site': site, 'size': size, 'count': count} for (site, size, count) in self.growth],
+        }
+
+    def format(self) -> str:
+        caches = ', '.join(f'{name} {size}' for (name, size) in self.caches.items())
+        return f'Memory: rss {format_bytes(self.rss)} ({format_bytes(self.rss - self.start_rss)} since start, {format_bytes(self.growth_rate())}/h)' + (
+            f', traced {format_bytes(self.traced)}' if self.traced else ''
+        ) + (
+            f', caches: {caches}' if caches else ''
+        ) + (
+            f' (last error: {self.last_error})' if self.last_error else ''
+        )
+
+    def format_growth(self) -> str:
+        return '\n'.join(
+            f'  {format_bytes(size)} in {count:+d} blocks  {site}' for (site, size, count) in self.growth
+        )
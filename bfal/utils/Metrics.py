@@ -0,0 +1,241 @@
+import json
+import time
+import numpy as np
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from threading import Thread
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+PERCENTILES = (50, 95, 99)
+
+class LatencyWindow:
+    """
+        Fixed size ring of the last `size` durations (ns) of a stage.
+
+        Recording is a single array assignment so it can stay enabled on hot paths,
+        percentiles are only computed when a report is requested.
+    """
+
+    def __init__(self, size=1024) -> None:
+        self.size = size
+        self.samples = np.zeros(size, dtype=np.int64)
+        self.count = 0 # total recorded since start
+        self.__index__ = 0
+
+    def record(self, duration_ns: int) -> None:
+        self.samples[self.__index__] = duration_ns
+        self.__index__ = (self.__index__ + 1) % self.size
+        self.count += 1
+
+    def values(self):
+        return self.samples[:min(self.count, self.size)]
+
+    def summary(self) -> dict:
+        values = self.values()
+        if values.size == 0:
+            return {'count': 0}
+
+        samples_ms = values / 1e6
+        p50, p95, p99 = np.percentile(samples_ms, PERCENTILES)
+        total_s = samples_ms.sum() / 1000
+
+        return {
+            'count': int(self.count),
+            'mean_ms': float(samples_ms.mean()),
+            'p50_ms': float(p50),
+            'p95_ms': float(p95),
+            'p99_ms': float(p99),
+            'throughput': float(values.size / total_s) if total_s else None,
+        }
+
+    def reset(self) -> None:
+        self.count = 0
+        self.__index__ = 0
+
+
+class Metrics:
+    """
+        Registry of stage latencies and rolling frame rate.
+
+        usage:
+            with metrics.stage('aruco'):
+                ...
+
+            @timed('pose')
+            def detect(self, image):
+                ...
+
+            metrics.tick() # once per frame
+    """
+
+    def __init__(self, window=1024) -> None:
+        self.window = window
+        self.enabled = True
+        self.stages = {}
+        self.__frame_times__ = deque(maxlen=window)
+        self.__last_report__ = time.monotonic()
+
+    def record(self, name: str, duration_ns: int) -> None:
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = LatencyWindow(self.window)
+        stage.record(duration_ns)
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter_ns() - start)
+
+    def tick(self) -> None:
+        # mark the end of a frame for the rolling fps
+        self.__frame_times__.append(time.perf_counter_ns())
+
+    def fps(self) -> float:
+        if len(self.__frame_times__) < 2:
+            return 0.0
+        elapsed_ns = self.__frame_times__[-1] - self.__frame_times__[0]
+        return (len(self.__frame_times__) - 1) * 1e9 / elapsed_ns if elapsed_ns else 0.0
+
+    def snapshot(self) -> dict:
+        return {
+            'fps': self.fps(),
+            'stages': {name: stage.summary() for (name, stage) in list(self.stages.items())},
+        }
+
+    def format(self) -> str:
+        lines = [f'FPS(rolling): {self.fps():.2f}']
+        for (name, stats) in self.snapshot()['stages'].items():
+            if stats['count']:
+                lines.append(f'  {name:<16} p50={stats["p50_ms"]:.2f}ms p95={stats["p95_ms"]:.2f}ms p99={stats["p99_ms"]:.2f}ms')
+        return '\n'.join(lines)
+
+    def report_due(self, interval: float) -> bool:
+        """
+            returns True once every `interval` seconds, used to log the metrics periodically.
+        """
+        if interval <= 0:
+            return False
+
+        now = time.monotonic()
+        if (now - self.__last_report__) < interval:
+            return False
+
+        self.__last_report__ = now
+        return True
+
+    def reset(self) -> None:
+        self.stages = {}
+        self.__frame_times__ = deque(maxlen=self.window)
+
+
+class StageOccupancy:
+    """
+        Share of the wall time each stage of a pipeline is busy, and the mean number of items waiting
+        within the queues between stages.
+
+        A stage close to 100% is the one the others wait for, a queue that stays full is in front of it.
+    """
+
+    def __init__(self) -> None:
+        self.busy_ns = {}
+        self.queues = {} # name -> (sum of sizes, samples, capacity)
+        self.__start__ = time.perf_counter_ns()
+
+    def add(self, stage: str, duration_ns: int) -> None:
+        self.busy_ns[stage] = self.busy_ns.get(stage, 0) + duration_ns
+
+    def sample(self, queue: str, size: int, capacity: int) -> None:
+        total, samples, _ = self.queues.get(queue, (0, 0, capacity))
+        self.queues[queue] = (total + size, samples + 1, capacity)
+
+    def snapshot(self) -> dict:
+        elapsed_ns = max(time.perf_counter_ns() - self.__start__, 1)
+        return {
+            'stages': {stage: busy_ns / elapsed_ns for (stage, busy_ns) in list(self.busy_ns.items())},
+            'queues': {queue: (total / samples if samples else 0.0, capacity) for (queue, (total, samples, capacity)) in list(self.queues.items())},
+        }
+
+    def format(self) -> str:
+        snapshot = self.snapshot()
+        parts = [f'{stage} {ratio * 100:.0f}%' for (stage, ratio) in snapshot['stages'].items()]
+        parts += [f'{queue} {mean:.1f}/{capacity}' for (queue, (mean, capacity)) in snapshot['queues'].items()]
+        return ', '.join(parts)
+
+
+# process wide registry used by the instrumented core classes
+metrics = Metrics()
+
+def timed(name: str, registry=None):
+    """
+        decorator that records the duration of each call as the `name` stage.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            target = registry or metrics
+            if not target.enabled:
+                return fn(*args, **kwargs)
+
+            start = time.perf_counter_ns()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                target.record(name, time.perf_counter_ns() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class MetricsServer:
+    """
+        Serves the metrics snapshot as JSON over http (GET /metrics) on a background thread,
+        and the last sample of a MemoryMonitor when given (GET /memory).
+    """
+
+    def __init__(self, registry: Metrics, port: int, host='127.0.0.1', memory=None) -> None:
+        self.registry = registry
+        self.memory = memory
+
+        routes = {'/metrics': registry.snapshot}
+        if memory is not None:
+            routes['/memory'] = memory.snapshot
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                route = routes.get(handler.path.rstrip('/'))
+                if route is None:
+                    handler.send_error(404)
+                    return
+
+                body = json.dumps(route()).encode()
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'application/json')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                pass # keep the terminal for the detection logs
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.__thread__ = None
+
+    def begin(self) -> None:
+        self.__thread__ = Thread(target=self.server.serve_forever, daemon=True)
+        self.__thread__.start()
+
+    def release(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,108 @@
+import time
+import cv2 as cv
+import numpy as np
+
+MOTION_WIDTH = 160 # of the downscaled gray frame
+MOTION_BLUR = (5, 5)
+MOTION_IDLE_ALPHA = 0.05 # weight of a frame on the running background while idle
+MOTION_ACTIVE_ALPHA = 0.002 # slower while active so a person standing still is not learned as background
+
+class MotionGate:
+    """
+        Cheap motion detector deciding if the expensive stages should run on a frame.
+
+        Each frame is downscaled to a small gray frame and compared to a running average background,
+        there is motion when more than `min_area` of the region pixels differ by more than `threshold`.
+        The gate opens after `wake_frames` frames with motion and closes after `idle_frames` frames
+        without, so a single noisy frame neither wakes nor idles the detection.
+
+        The gate starts open, the background is learned meanwhile.
+
+        usage:
+            gate = MotionGate(region=(0.25, 0.0, 0.75, 1.0))
+            if gate.update(frame):
+                ... # run the detection
+            gate.idle_seconds, gate.active_seconds
+    """
+
+    def __init__(self, region=None, threshold=25, min_area=0.005, wake_frames=3, idle_frames=90) -> None:
+        self.region = tuple(region) if region else None # (x1, y1, x2, y2) fractions of the frame
+        self.threshold = threshold # gray level difference of a moving pixel
+        self.min_area = min_area # ratio of moving pixels of the region
+        self.wake_frames = wake_frames
+        self.idle_frames = idle_frames
+
+        self.active = True
+        self.motion = 0.0 # moving pixels ratio of the last frame
+        self.background = None
+        self.__streak__ = 0 # frames in a row contradicting the current state
+
+        self.idle_ns = 0
+        self.active_ns = 0
+        self.wakes = 0
+        self.__last_update__ = None
+
+    def __gray__(self, frame):
+        height, width = frame.shape[:2]
+        if self.region:
+            x1, y1, x2, y2 = self.region
+            frame = frame[int(y1 * height):int(y2 * height), int(x1 * width):int(x2 * width)]
+            height, width = frame.shape[:2]
+
+        scaled_width = min(MOTION_WIDTH, width)
+        scaled_height = max(int(height * scaled_width / width), 1)
+        gray = cv.cvtColor(cv.resize(frame, (scaled_width, scaled_height), interpolation=cv.INTER_AREA), cv.COLOR_BGR2GRAY)
+        return cv.GaussianBlur(gray, MOTION_BLUR, 0)
+
+    def update(self, frame) -> bool:
+        """
+            returns True if the detection should run on the bgr frame.
+        """
+        now = time.perf_counter_ns()
+        if self.__last_update__ is not None:
+            # time since the previous frame is counted in the state it was in
+            if self.active:
+                self.active_ns += now - self.__last_update__
+            else:
+                self.idle_ns += now - self.__last_update__
+        self.__last_update__ = now
+
+        gray = self.__gray__(frame)
+        if self.background is None or self.background.shape != gray.shape:
+            self.background = gray.astype(np.float32)
+            return self.active
+
+        moving = cv.absdiff(gray, cv.convertScaleAbs(self.background)) > self.threshold
+        self.motion = float(np.count_nonzero(moving)) / moving.size
+        cv.accumulateWeighted(gray, self.background, MOTION_ACTIVE_ALPHA if self.active else MOTION_IDLE_ALPHA)
+
+        # hysteresis, the state only changes after enough frames in a row say otherwise
+        if (self.motion >= self.min_area) != self.active:
+            self.__streak__ += 1
+        else:
+            self.__streak__ = 0
+
+        if self.active and self.__streak__ >= self.idle_frames:
+            self.active = False
+            self.__streak__ = 0
+        elif not self.active and self.__streak__ >= self.wake_frames:
+            self.active = True
+            self.__streak__ = 0
+            self.wakes += 1
+
+        return self.active
+
+    @property
+    def idle_seconds(self) -> float:
+        return self.idle_ns / 1e9
+
+    @property
+    def active_seconds(self) -> float:
+        return self.active_ns / 1e9
+
+    def idle_ratio(self) -> float:
+        total_ns = self.idle_ns + self.active_ns
+        return self.idle_ns / total_ns if total_ns else 0.0
+
+    def format(self) -> str:
+        return f'{self.idle_seconds:.1f}s idle, {self.active_seconds:.1f}s active ({self.idle_ratio() * 100:.0f}% idle, {self.wakes} wakes)'
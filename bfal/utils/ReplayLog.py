@@ -0,0 +1,49 @@
+import numpy as np
+
+REPLAY_PREFIX = 'replay'
+
+# face_recognition (large model) landmarks, flattened in this order on the recording
+LANDMARK_PARTS = (
+    ('chin', 17),
+    ('left_eyebrow', 5),
+    ('right_eyebrow', 5),
+    ('nose_bridge', 4),
+    ('nose_tip', 5),
+    ('left_eye', 6),
+    ('right_eye', 6),
+    ('top_lip', 12),
+    ('bottom_lip', 12),
+)
+LANDMARK_COUNT = sum(count for (_, count) in LANDMARK_PARTS)
+LANDMARK_OFFSETS = dict(zip(
+    [part for (part, _) in LANDMARK_PARTS],
+    np.cumsum([0] + [count for (_, count) in LANDMARK_PARTS]).tolist(),
+))
+
+# a body of a frame with its face (when one contains its nose) and the reference of the frame,
+# recorded by `bfal detect --record-replay` on a ResultLog and replayed by `bfal tune`
+REPLAY_COLUMNS = {
+    'time': (np.float64, np.nan),
+    'frame': (np.int64, -1),
+    'camera': ('U64', ''),
+    'keypoints': (np.float32, np.nan, (17, 3)),
+    'box': (np.float32, np.nan, (4, )),
+    'has_face': (bool, False),
+    'face_label': ('U64', ''),
+    'landmarks': (np.float32, np.nan, (LANDMARK_COUNT, 2)),
+    'ref_y': (np.float32, np.nan), # aruco line y axis, nan when not found
+    'ref_distance': (np.float32, np.nan), # filtered pixel distance of the refs
+    'real_distance': (np.float32, np.nan), # of the refs, in the unit of the builts
+}
+
+def landmarks_to_array(land_marks: dict):
+    """
+        (LANDMARK_COUNT, 2) array of the landmarks dict, nan when a part is missing or not of the large model.
+    """
+    points = np.full((LANDMARK_COUNT, 2), np.nan, dtype=np.float32)
+    for (part, count) in LANDMARK_PARTS:
+        part_points = land_marks.get(part)
+        if part_points is not None and len(part_points) == count:
+            offset = LANDMARK_OFFSETS[part]
+            points[offset:offset + count] = part_points
+    return points
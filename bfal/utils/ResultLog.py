@@ -0,0 +1,181 @@
+import glob
+import os
+import time
+import numpy as np
+from queue import (
+    Queue,
+    Full,
+    Empty,
+)
+from threading import Thread
+
+# column: (dtype, value of a missing field[, shape of a field])
+RESULT_COLUMNS = {
+    'time': (np.float64, np.nan), # epoch seconds
+    'frame': (np.int64, -1),
+    'camera': ('U64', ''),
+    'faces_count': (np.int16, 0),
+    'known_faces_count': (np.int16, 0),
+    'body_count': (np.int16, 0),
+    'valid_body_count': (np.int16, 0),
+    'person_width': (np.float32, np.nan),
+    'person_height': (np.float32, np.nan),
+    'person_label': ('U64', ''),
+    'person_is_known': (np.int8, -1), # builts verify outcome, -1 when not verified
+}
+
+class ResultChunk:
+    """
+        Preallocated columns of `size` records.
+    """
+
+    def __init__(self, columns: dict, size: int) -> None:
+        self.columns = {
+            name: np.full((size, ) + tuple(spec[2] if len(spec) > 2 else ()), spec[1], dtype=spec[0])
+            for (name, spec) in columns.items()
+        }
+        self.size = size
+        self.count = 0
+
+    def clear(self, columns: dict) -> None:
+        for (name, spec) in columns.items():
+            self.columns[name][:self.count] = spec[1]
+        self.count = 0
+
+
+class ResultLog:
+    """
+        Append only log of the per frame results, written as rotating `.npz` chunks of columns.
+
+        Records are written on preallocated columns, a full chunk is handed to a background thread
+        that saves it and gives the chunk back to be reused, so appending is a few array assignments.
+        At most `max_pending` chunks wait to be saved, chunks are dropped (and counted) rather than
+        growing memory or blocking the detection when the disk can't keep up.
+
+        Each chunk is saved as `{prefix}-{start}-{seq}.npz` (written to a temporary file then renamed) so
+        readers never see a partial chunk, use ResultLog.read to load the columns of every chunk.
+
+        usage:
+            log = ResultLog('results/')
+            log.begin()
+            log.append(frame=i, person_width=w, person_height=h, person_label=label)
+            ...
+            log.close()
+
+            columns = ResultLog.read('results/')
+    """
+
+    def __init__(self, directory: str, chunk_records=4096, max_pending=4, prefix='results', columns=RESULT_COLUMNS) -> None:
+        self.directory = directory
+        self.chunk_records = chunk_records
+        self.prefix = f'{prefix}-{time.strftime("%Y%m%d-%H%M%S")}'
+        self.column_specs = columns
+
+        # chunks waiting to be saved and saved chunks ready to be reused, bounded to max_pending chunks
+        self.__pending__ = Queue(maxsize=max_pending)
+        self.__free__ = Queue()
+        self.__chunk__ = ResultChunk(columns, chunk_records)
+        self.__thread__ = None
+        self.__seq__ = 0
+
+        self.records = 0 # appended since start
+        self.saved = 0 # records saved
+        self.dropped = 0 # records of the chunks dropped while the queue was full
+        self.chunks = 0 # files written
+        self.last_error = None
+
+    def begin(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        self.__thread__ = Thread(target=self.__flush_loop__, daemon=True)
+        self.__thread__.start()
+
+    def append(self, **values) -> None:
+        chunk = self.__chunk__
+        i = chunk.count
+        for (name, value) in values.items():
+            chunk.columns[name][i] = value
+        chunk.count += 1
+        self.records += 1
+
+        if chunk.count == chunk.size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+            hands the current records to the background thread, returns at once.
+        """
+        chunk = self.__chunk__
+        if not chunk.count:
+            return
+
+        try:
+            self.__pending__.put_nowait(chunk)
+        except Full:
+            self.dropped += chunk.count
+            chunk.clear(self.column_specs)
+            return
+
+        try:
+            self.__chunk__ = self.__free__.get_nowait()
+        except Empty:
+            self.__chunk__ = ResultChunk(self.column_specs, self.chunk_records)
+
+    def __save__(self, chunk: ResultChunk) -> None:
+        file_path = os.path.join(self.directory, f'{self.prefix}-{self.__seq__:05d}.npz')
+        tmp_path = file_path + '.tmp'
+        self.__seq__ += 1
+
+        with open(tmp_path, 'wb') as chunk_file:
+            np.savez(chunk_file, **{name: column[:chunk.count] for (name, column) in chunk.columns.items()})
+        os.replace(tmp_path, file_path)
+
+        self.saved += chunk.count
+        self.chunks += 1
+
+    def __flush_loop__(self) -> None:
+        while True:
+            chunk = self.__pending__.get()
+            if chunk is None:
+                break
+
+            try:
+                self.__save__(chunk)
+            except Exception as e:
+                # kept for the logs, the detection goes on without the chunk
+                self.dropped += chunk.count
+                self.last_error = e
+
+            chunk.clear(self.column_specs)
+            self.__free__.put(chunk)
+
+    def close(self) -> None:
+        """
+            saves the remaining records and waits for the pending chunks to be written.
+        """
+        if self.__thread__ is None:
+            return
+
+        self.flush()
+        self.__pending__.put(None)
+        self.__thread__.join()
+        self.__thread__ = None
+
+    def format(self) -> str:
+        return f'{self.records} records, {self.saved} saved in {self.chunks} chunks, {self.dropped} dropped' + (
+            f' (last error: {self.last_error})' if self.last_error else ''
+        )
+
+    @staticmethod
+    def read(directory: str, prefix='results') -> dict:
+        """
+            returns the columns of every chunk of the directory, concatenated in the order they were written.
+        """
+        chunks = []
+        for file_path in sorted(glob.glob(os.path.join(directory, f'{prefix}-*.npz'))):
+            with np.load(file_path) as chunk:
+                chunks.append({name: chunk[name] for name in chunk.files})
+
+        if not chunks:
+            return {}
+
+        return {name: np.concatenate([chunk[name] for chunk in chunks if name in chunk]) for name in chunks[0]}
@@ -0,0 +1,59 @@
+import math
+
+class RunningStats:
+    """
+        Running mean and variance of a stream of values (Welford's algorithm).
+
+        Used to estimate a value from noisy samples and tell how tight the estimate is
+        without keeping the samples around.
+
+        Consecutive values of a video are not independent, the noise of a frame carries to the next ones,
+        so the confidence interval of their mean would be far too narrow. With `block` > 1 every `block`
+        values are averaged into one sample first, count, mean and variance are those of the block means
+        (values of an unfinished block are not counted yet).
+    """
+
+    def __init__(self, block=1) -> None:
+        self.block = block
+        self.count = 0
+        self.mean = 0.0
+        self.__m2__ = 0.0
+        self.__block_sum__ = 0.0
+        self.__block_count__ = 0
+
+    def insert(self, value: float) -> None:
+        if self.block > 1:
+            self.__block_sum__ += value
+            self.__block_count__ += 1
+            if self.__block_count__ < self.block:
+                return
+
+            value = self.__block_sum__ / self.__block_count__
+            self.__block_sum__ = 0.0
+            self.__block_count__ = 0
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.__m2__ += delta * (value - self.mean)
+
+    def variance(self) -> float:
+        if self.count < 2:
+            return math.inf
+        return self.__m2__ / (self.count - 1)
+
+    def std(self) -> float:
+        return math.sqrt(self.variance())
+
+    def ci_half_width(self, z=1.96) -> float:
+        # half width of the confidence interval of the mean (z=1.96 ~ 95%)
+        if self.count < 2:
+            return math.inf
+        return z * self.std() / math.sqrt(self.count)
+
+    def reset(self) -> None:
+        self.count = 0
+        self.mean = 0.0
+        self.__m2__ = 0.0
+        self.__block_sum__ = 0.0
+        self.__block_count__ = 0
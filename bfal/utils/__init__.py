@@ -1,5 +1,15 @@
 from .AsyncVideoCapture import AsyncVideoCapture
+from .FileVideoCapture import FileVideoCapture, open_video_capture
 from .FPS import FPS
+from .FrameBuffers import FrameBuffers
+from .FrameRing import FrameRing
 from .ImageScaler import ImageScaler
 from .MedianFilter import MedianFilter
-from .utils import *
\ No newline at end of file
+from .MemoryMonitor import MemoryMonitor
+from .MotionGate import MotionGate
+from .RunningStats import RunningStats
+from .ResultLog import ResultLog, RESULT_COLUMNS
+from .ReplayLog import REPLAY_COLUMNS, REPLAY_PREFIX, LANDMARK_PARTS, LANDMARK_COUNT, LANDMARK_OFFSETS, landmarks_to_array
+from .Metrics import Metrics, MetricsServer, LatencyWindow, StageOccupancy, metrics, timed
+from .utils import *
+from .synthetic import synthetic_person, synthetic_pose_output
\ No newline at end of file
@@ -0,0 +1,92 @@
+from bfal.lazy import lazy_import
+import numpy as np
+
+torch = lazy_import('torch')
+
+"""
+    Synthetic inputs shaped like the pose and face results, used by the benchmarks
+    to exercise the specs without any model or camera.
+"""
+
+def __ring_points__(cx, cy, rx, ry, count, start=0.0, end=2 * np.pi) -> list:
+    return [(int(cx + rx * np.cos(a)), int(cy + ry * np.sin(a))) for a in np.linspace(start, end, count, endpoint=False)]
+
+def synthetic_person(frame_shape, line_y=None):
+    """
+        builds the keypoints (17x3), box, face location and face landmarks of a person
+        standing straight on the reference line, facing the camera.
+
+        returns (keypoints, box, location, land_marks)
+    """
+    height, width = frame_shape[:2]
+    foot_y = min(line_y if line_y else height - 8, height - 8)
+    body_h = foot_y * 0.8
+    top_y = foot_y - body_h
+    cx = width / 2
+
+    # (x offset, y offset) ratios of the body height, left parts are on the right side of the image
+    parts = (
+        (0.0, 0.06), # nose
+        (0.02, 0.045), (-0.02, 0.045), # eyes
+        (0.04, 0.05), (-0.04, 0.05), # ears
+        (0.11, 0.18), (-0.11, 0.18), # shoulders
+        (0.13, 0.33), (-0.13, 0.33), # elbows
+        (0.13, 0.46), (-0.13, 0.46), # wrists
+        (0.07, 0.52), (-0.07, 0.52), # hips
+        (0.07, 0.74), (-0.07, 0.74), # knees
+        (0.07, 0.96), (-0.07, 0.96), # ankles
+    )
+    keypoints = torch.tensor(
+        [(cx + dx * body_h, top_y + dy * body_h, 0.99) for (dx, dy) in parts],
+        dtype=torch.float32,
+    )
+    box = torch.tensor((cx - 0.15 * body_h, top_y, cx + 0.15 * body_h, foot_y, 0.9, 0.0), dtype=torch.float32)
+
+    # face_recognition location (top, right, bottom, left) and landmarks
+    face_top = int(top_y)
+    face_bottom = int(top_y + 0.12 * body_h)
+    face_left = int(cx - 0.05 * body_h)
+    face_right = int(cx + 0.05 * body_h)
+    location = (face_top, face_right, face_bottom, face_left)
+
+    unit = 0.01 * body_h
+    eye_y = top_y + 0.045 * body_h
+    mouth_y = top_y + 0.09 * body_h
+    land_marks = {
+        'chin': __ring_points__(cx, top_y + 0.06 * body_h, 4.5 * unit, 5.5 * unit, 17, start=0.0, end=np.pi * 17 / 16),
+        'left_eyebrow': __ring_points__(cx + 2 * unit, eye_y - 1.5 * unit, 1.2 * unit, 0.3 * unit, 5),
+        'right_eyebrow': __ring_points__(cx - 2 * unit, eye_y - 1.5 * unit, 1.2 * unit, 0.3 * unit, 5),
+        'nose_bridge': [(int(cx), int(eye_y + i * unit)) for i in range(4)],
+        'nose_tip': __ring_points__(cx, top_y + 0.075 * body_h, 0.8 * unit, 0.2 * unit, 5),
+        'left_eye': __ring_points__(cx + 2 * unit, eye_y, 0.8 * unit, 0.3 * unit, 6),
+        'right_eye': __ring_points__(cx - 2 * unit, eye_y, 0.8 * unit, 0.3 * unit, 6),
+        'top_lip': __ring_points__(cx, mouth_y - 0.3 * unit, 1.5 * unit, 0.3 * unit, 12),
+        'bottom_lip': __ring_points__(cx, mouth_y + 0.3 * unit, 1.5 * unit, 0.3 * unit, 12),
+    }
+
+    return (keypoints, box, location, land_marks)
+
+def synthetic_pose_output(frame_shape, line_y=None, anchors=8400, duplicates=3):
+    """
+        builds a raw (1, 56, anchors) output of the exported pose model holding the synthetic person,
+        predicted by `duplicates` neighbouring anchors as a real model does (NMS keeps one).
+        coordinates are the frame ones, as if the frame was the unpadded model input.
+
+        returns (output, keypoints, box)
+    """
+    keypoints, box, _, _ = synthetic_person(frame_shape, line_y)
+    keypoints, box = keypoints.cpu().numpy(), box.cpu().numpy()
+
+    x1, y1, x2, y2 = box[:4]
+    prediction = np.concatenate((
+        ((x1 + x2) / 2, (y1 + y2) / 2, x2 - x1, y2 - y1, 0.9),
+        keypoints.reshape(-1),
+    )).astype(np.float32)
+
+    output = np.zeros((1, prediction.size, anchors), dtype=np.float32)
+    for i in range(duplicates):
+        output[0, :, i] = prediction
+        output[0, 0, i] += i # shifted by a pixel, still overlapping
+        output[0, 4, i] -= i * 0.01
+
+    return (output, keypoints, box)
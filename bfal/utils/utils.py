@@ -1,6 +1,8 @@
-import torch
+from bfal.lazy import lazy_import
 import numpy as np
 
+torch = lazy_import('torch')
+
 def points_aligned_by_axis(points, axis_value, y_axis=True, th=0.5):
     
     for (x, y, *_) in points:
@@ -84,7 +86,7 @@ def midpoint(point1, point2):
     return (mid_x, mid_y)
 
 
-def center_of_circular_point(points):
+def center_of_circular_point(points, device=None):
     sum_x = 0.0
     sum_y = 0.0
 
@@ -97,7 +99,8 @@ def center_of_circular_point(points):
     mean_x = sum_x / len(points)
     mean_y = sum_y / len(points)
 
-    return torch.tensor((mean_x, mean_y)).to('cuda')
+    # on the torch default device when no device is given
+    return torch.tensor((mean_x, mean_y), device=device)
 
 def find_intersection(point1, point2, point3, point4):
     # Convert points to NumPy arrays
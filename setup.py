@@ -19,6 +19,12 @@ setup(
         'face-recognition>=1.3.0',
         'ultralytics>=8.0.184',
     ],
+    extras_require={
+        'onnx': [
+            'onnx>=1.14.0',
+            'onnxruntime>=1.16.0',
+        ],
+    },
     package_data={
         'configs': ['config.ini', 'yolov8-pose.pt'],
     },